@@ -1,3 +1,7 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import Category, MenuItem
+
+admin.site.register(Category)
+admin.site.register(MenuItem)
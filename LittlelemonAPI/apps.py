@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittlelemonAPI'
+
+    def ready(self):
+        from . import signals  # noqa: F401  registers the model signal receivers
@@ -0,0 +1,94 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .events import order_events
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+#Order archival.
+#Orders older than ORDER_ARCHIVE_AFTER_DAYS are moved, in batches, from Order/OrderItem into
+#ArchivedOrder/ArchivedOrderItem by `manage.py archive_orders`, so the hot tables every order listing
+#reads stay small. Each batch is copied and deleted in one transaction: an order is always in exactly one
+#of the two places. Archived orders stay readable through /api/orders/<id> and /api/orders/archive.
+
+ORDER_VALUES = ('id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date')
+ORDER_ITEM_VALUES = ('id', 'order_id', 'menuitem_id', 'quantity', 'unit_price', 'price')
+
+
+#moves the orders placed before `before` into the archive, `batch_size` orders per transaction;
+#yields the number of orders moved by every batch
+def archive_orders(before, batch_size=500):
+    while True:
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update().filter(date__lt=before).order_by('date', 'id').values(*ORDER_VALUES)[:batch_size]
+            )
+            if not orders:
+                return
+            ids = [order['id'] for order in orders]
+            archived_at = timezone.now()
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(archived_at=archived_at, **order) for order in orders])
+            ArchivedOrderItem.objects.bulk_create([
+                ArchivedOrderItem(**item) for item in OrderItem.objects.filter(order_id__in=ids).values(*ORDER_ITEM_VALUES)
+            ])
+            #the order items go with their orders (on_delete=CASCADE); the orders are moved, not deleted, so no
+            #order_deleted events
+            with order_events.suppressed():
+                Order.objects.filter(id__in=ids).delete()
+        yield len(ids)
+
+
+#the order with primary key `pk`, looked up in the hot table first and in the archive second;
+#OrderSerializer renders either, the archived model has the same fields
+def get_order_or_archived(pk):
+    order = Order.objects.select_related('user', 'delivery_crew').filter(pk=pk).first()
+    if order is None:
+        order = ArchivedOrder.objects.select_related('user', 'delivery_crew').filter(pk=pk).first()
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    return order
+
+
+async def aget_order_or_archived(pk):
+    order = await Order.objects.select_related('user', 'delivery_crew').filter(pk=pk).afirst()
+    if order is None:
+        order = await ArchivedOrder.objects.select_related('user', 'delivery_crew').filter(pk=pk).afirst()
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    return order
+
+
+#(aware datetime, whether `value` was a bare date) for a ?from= / ?to= value
+def _parse_bound(name, value):
+    #dates first: parse_datetime also accepts a bare date, as midnight
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        moment = day = None
+    if moment is None and day is None:
+        raise ValidationError({name: ['Use the YYYY-MM-DD or ISO 8601 date-time format.']})
+    if moment is None:
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, day is not None
+
+
+#filters `orders` to the ?from= / ?to= range; both bounds are optional and inclusive, a bare date
+#covers the whole day
+def filter_date_range(orders, query_params):
+    if query_params.get('from'):
+        start, _ = _parse_bound('from', query_params['from'])
+        orders = orders.filter(date__gte=start)
+    if query_params.get('to'):
+        end, is_date = _parse_bound('to', query_params['to'])
+        if is_date:
+            orders = orders.filter(date__lt=end + timedelta(days=1))
+        else:
+            orders = orders.filter(date__lte=end)
+    return orders
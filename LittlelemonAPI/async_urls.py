@@ -0,0 +1,22 @@
+from django.urls import path
+
+from . import async_views, urls, views
+
+#The URLconf ASGI requests are resolved against (see async_views.asgi_urlconf_middleware): the routes
+#of urls.py, with the read-heavy views swapped for their async variants.
+
+ASYNC_VIEWS = {
+    views.item_category: async_views.item_category,
+    views.category_single: async_views.category_single,
+    views.menu_snapshot: async_views.menu_snapshot,
+    views.menu_items: async_views.menu_items,
+    views.menu_single: async_views.menu_single,
+    views.order_management: async_views.order_management,
+    views.order_detail: async_views.order_detail,
+    views.order_event_stream: async_views.order_event_stream,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.callback, pattern.callback))
+    for pattern in urls.urlpatterns
+]
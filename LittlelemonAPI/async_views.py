@@ -0,0 +1,245 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, Throttled
+
+from . import views
+from .archive import aget_order_or_archived
+from .authentication import aauthenticate_token
+from .conditional import category_validators, menu_item_validators, not_modified, order_validators, validator_headers
+from .events import MANAGERS, event_stream, order_events, user_channel
+from .fast_serializers import MENU_ITEM_VALUES, ORDER_VALUES, serialize_menu_items, serialize_orders
+from .filters import order_menu_items
+from .menu_cache import MENU_CACHE_TIMEOUT, etag_matches, listing_cache_key
+from .menu_snapshot import peek_menu_snapshot, publish_menu_snapshot, snapshot_etag
+from .models import Category, MenuItem
+from .renderers import FastJSONRenderer
+from .pagination import CURSOR_PARAM, apaginate_by_cursor, parse_page_size
+from .profiling import serializer_data
+from .roles import aget_roles, is_delivery_crew, is_manager
+from .serializers import CategorySerializer, MenuItemSerializer, OrderSerializer
+
+#Async variants of the read-heavy views, served under ASGI.
+#Under uvicorn every @api_view function runs on the sync-to-async thread bridge. The views below answer
+#token-authenticated JSON GETs on the event loop with the async ORM instead, and render exactly what the
+#DRF views render. Everything else (writes, session or anonymous requests, bad tokens, the browsable API)
+#is handed to the DRF view, so those requests behave as before. asgi_urlconf_middleware routes ASGI
+#requests to these views through ASGI_URLCONF; WSGI requests never see them.
+#The order event stream (order_event_stream, see events.py) is only served here.
+
+_renderer = FastJSONRenderer()
+
+
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response):
+    if not iscoroutinefunction(get_response):
+        #built for a WSGI handler, nothing to route
+        return get_response
+
+    async def middleware(request):
+        urlconf = getattr(settings, 'ASGI_URLCONF', None)
+        if urlconf:
+            request.urlconf = urlconf
+        return await get_response(request)
+
+    return middleware
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json', headers=headers)
+
+
+#the response DRF's exception handler gives for `exc`
+def exception_response(exc):
+    if isinstance(exc, Http404):
+        exc = NotFound(*exc.args)
+    headers = {}
+    if getattr(exc, 'auth_header', None):
+        headers['WWW-Authenticate'] = exc.auth_header
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = '%d' % exc.wait
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return json_response(data, exc.status_code, headers)
+
+
+def _wants_browsable_api(request):
+    return 'format' in request.GET or 'text/html' in request.headers.get('Accept', '')
+
+
+def _check_throttles(request, view_class):
+    durations = []
+    for throttle_class in view_class.throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            durations.append(throttle.wait())
+    if durations:
+        raise Throttled(max((duration for duration in durations if duration is not None), default=None))
+
+
+#the async GET handler of `sync_view`, applying the DRF view's permission and throttle classes
+def async_read_view(sync_view):
+    view_class = sync_view.cls
+    allow = ', '.join(view_class().allowed_methods)
+    fallback = sync_to_async(sync_view)
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET' or _wants_browsable_api(request):
+                return await fallback(request, *args, **kwargs)
+            authenticated = await aauthenticate_token(request)
+            if authenticated is None:
+                return await fallback(request, *args, **kwargs)
+            request.user, request.auth = authenticated
+            if not all(permission().has_permission(request, None) for permission in view_class.permission_classes):
+                return await fallback(request, *args, **kwargs)
+            try:
+                _check_throttles(request, view_class)
+                response = await handler(request, *args, **kwargs)
+            except (APIException, Http404) as exc:
+                response = exception_response(exc)
+            response['Allow'] = allow
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+        #DRF views do their own CSRF checks (SessionAuthentication), the fallback included
+        view.csrf_exempt = True
+        return view
+
+    return decorator
+
+
+#conditional.conditional_get for the async views
+def _conditional_response(request, validators, render):
+    if not_modified(request, validators):
+        return json_response(None, status.HTTP_304_NOT_MODIFIED, headers=validator_headers(validators))
+    return json_response(render(), headers=validator_headers(validators))
+
+
+async def _aget_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+#endpoint:/api/category
+@async_read_view(views.item_category)
+async def item_category(request):
+    categories = [category async for category in Category.objects.aiterator()]
+    return json_response(serializer_data(CategorySerializer(categories, many=True)))
+
+
+#endpoint: /api/category/{categoryItem}
+@async_read_view(views.category_single)
+async def category_single(request, id):
+    item = await _aget_or_404(Category.objects.all(), pk=id)
+    return _conditional_response(request, category_validators(item), lambda: serializer_data(CategorySerializer(item)))
+
+
+#endpoint:/api/menu-items
+@async_read_view(views.menu_items)
+async def menu_items(request):
+    cache_key, etag = listing_cache_key(request.GET)
+    if etag_matches(request, etag):
+        return json_response(None, status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    data = cache.get(cache_key)
+    if data is not None:
+        return json_response(data, headers={'ETag': etag})
+
+    items, ordering, perpage, page = views.menu_listing(request.GET)
+    if CURSOR_PARAM in request.GET:
+        if ordering not in (None, 'price', '-price'):
+            return json_response({"message": "Cursor pagination only supports ordering by price or -price."}, status.HTTP_400_BAD_REQUEST)
+        items, next_link = await apaginate_by_cursor(request, items.values(*MENU_ITEM_VALUES), ordering or 'price', perpage)
+        data = {'results': serialize_menu_items(items), 'next': next_link}
+    else:
+        items = order_menu_items(items, ordering).values(*MENU_ITEM_VALUES)
+        paginator = Paginator(items, per_page=perpage)
+        #count is a cached_property, filling it in keeps page() from running the COUNT synchronously
+        paginator.count = await items.acount()
+        try:
+            items = [item async for item in paginator.page(number=page).object_list.aiterator()]
+        except EmptyPage:
+            items = []
+        except PageNotAnInteger:
+            return json_response({"page": ["A valid integer is required."]}, status.HTTP_400_BAD_REQUEST)
+        data = serialize_menu_items(items)
+    cache.set(cache_key, data, MENU_CACHE_TIMEOUT)
+    return json_response(data, headers={'ETag': etag})
+
+
+#endpoint: /api/menu
+@async_read_view(views.menu_snapshot)
+async def menu_snapshot(request):
+    name, error = views.menu_snapshot_slice(request.GET)
+    if error:
+        return json_response({"message": error}, status.HTTP_400_BAD_REQUEST)
+    version, snapshot = peek_menu_snapshot()
+    if snapshot is None:
+        #only an unpublished version reaches the ORM; the build runs on the thread bridge
+        snapshot = await sync_to_async(publish_menu_snapshot)(version)
+    etag = snapshot_etag(version, name)
+    if etag_matches(request, etag):
+        return json_response(None, status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return HttpResponse(snapshot.get(name, b'[]'), content_type='application/json', headers={'ETag': etag})
+
+
+# endpoint: /api/menu-items/{menuItem}
+@async_read_view(views.menu_single)
+async def menu_single(request, id):
+    item = await _aget_or_404(MenuItem.objects.select_related('category'), pk=id)
+    return _conditional_response(request, menu_item_validators(item), lambda: serializer_data(MenuItemSerializer(item)))
+
+
+#endpoint: /api/orders
+@async_read_view(views.order_management)
+async def order_management(request):
+    await aget_roles(request.user)
+    orders = views.orders_for(request.user)
+    if CURSOR_PARAM in request.GET:
+        ordering = request.GET.get('ordering')
+        if ordering not in (None, 'date', '-date'):
+            return json_response({"message": "Cursor pagination only supports ordering by date or -date."}, status.HTTP_400_BAD_REQUEST)
+        perpage = parse_page_size(request.GET.get('perpage', default=20))
+        orders, next_link = await apaginate_by_cursor(request, orders.values(*ORDER_VALUES), ordering or 'date', perpage)
+        return json_response({'results': serialize_orders(orders), 'next': next_link})
+    orders = [order async for order in orders.values(*ORDER_VALUES).aiterator()]
+    return json_response(serialize_orders(orders))
+
+
+#endpoint: /api/orders/{orderID}
+@async_read_view(views.order_detail)
+async def order_detail(request, orderId):
+    order = await aget_order_or_archived(orderId)
+    current_user = request.user
+    await aget_roles(current_user)
+    if order.user == current_user or is_manager(current_user):
+        return _conditional_response(request, order_validators(order), lambda: serializer_data(OrderSerializer(order)))
+    if is_delivery_crew(current_user):
+        if order.delivery_crew == current_user:
+            return _conditional_response(request, order_validators(order), lambda: serializer_data(OrderSerializer(order)))
+        return json_response({"error": "This order is not assigned to you."}, status.HTTP_403_FORBIDDEN)
+    return json_response({"error": "Permission denied."}, status.HTTP_403_FORBIDDEN)
+
+
+#endpoint: /api/orders/events
+#managers get every order's events, customers and delivery crew the events of their own orders
+@async_read_view(views.order_event_stream)
+async def order_event_stream(request):
+    await aget_roles(request.user)
+    channel = MANAGERS if is_manager(request.user) else user_channel(request.user.pk)
+    #subscribed before the response starts, so nothing committed from here on is missed
+    subscription = order_events.subscribe(channel)
+    response = StreamingHttpResponse(event_stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    #keeps nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,102 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+#Token authentication without the Token + User query on every request.
+#Recently seen tokens are kept in a bounded, per-process LRU with a TTL. Deleting a token or saving
+#its user (deactivation, permission changes) evicts the entries through signals (see signals.py);
+#other worker processes pick such changes up once the TTL expires.
+
+
+class TokenCache:
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, user, token)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_user(self, user_pk):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1].pk == user_pk]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            #raises AuthenticationFailed for unknown tokens and inactive users, which are never cached
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            cached = (user, token)
+        return _request_copies(*cached)
+
+
+#CachedTokenAuthentication for the async views. Returns (user, token), or None when the request carries no
+#token or one that is unknown or belongs to an inactive user; the caller then hands the request to the
+#DRF view, which answers it exactly as before.
+async def aauthenticate_token(request):
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != CachedTokenAuthentication.keyword.lower():
+        return None
+    key = auth[1]
+    cached = token_cache.get(key)
+    if cached is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        if not token.user.is_active:
+            return None
+        token_cache.set(key, token.user, token)
+        cached = (token.user, token)
+    return _request_copies(*cached)
+
+
+#every request gets its own copies, so per-request state set on the user never leaks into the cache
+def _request_copies(user, token):
+    user, token = copy.copy(user), copy.copy(token)
+    token.user = user
+    return user, token
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from .authentication import token_cache
+from .cart_summary import rebuild_cart_summaries
+from .models import Cart, Category, MenuItem, Order, OrderItem
+from .profiling import percentile
+from .rollups import rebuild_rollups
+from .throttling import throttle_store
+
+#Helpers shared by the bench_* management commands.
+#Benchmarks never touch the configured database: they run against a throwaway test database created
+#next to it (a temporary file for SQLite, so WAL and locking behave as in production, test_<NAME> for
+#PostgreSQL) with throttling switched off, and drop it afterwards. The host-wide stores a running server
+#shares (throttle state, order events, file-based caches) are swapped for private ones in a temporary directory as well.
+
+
+#settings pointing the stores shared by the worker processes of a host at files in `directory`, so they
+#can be cleared without touching a running server's
+def private_stores(directory):
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        config = dict(config)
+        if config['BACKEND'].endswith('FileBasedCache'):
+            config['LOCATION'] = os.path.join(directory, f'cache-{alias}')
+        else:
+            config['LOCATION'] = f'littlelemon-private-{alias}'
+        caches[alias] = config
+    return override_settings(
+        CACHES=caches,
+        THROTTLE_STORE_PATH=os.path.join(directory, 'throttle.sqlite3'),
+        ORDER_EVENTS_STORE_PATH=os.path.join(directory, 'events.sqlite3'),
+    )
+
+
+@contextmanager
+def benchmark_environment(throttling=False):
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    tmpdir = tempfile.mkdtemp(prefix='littlelemon-bench-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    stores = private_stores(tmpdir)
+    stores.enable()
+    cache.clear()
+    token_cache.clear()
+    throttle_store.clear()
+    rates = SimpleRateThrottle.THROTTLE_RATES if throttling else {'anon': None, 'user': None}
+    try:
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates):
+            yield
+    finally:
+        stores.disable()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(tmpdir)
+
+
+#seeds a restaurant of the requested size with bulk inserts and returns the users and rows the
+#benchmarks drive the API with; every user gets an API token and the password 'lemon'
+def seed_database(categories=10, menu_items=200, customers=50, cart_items=5, orders=500, crew=5):
+    admin = User.objects.create_superuser('admin', 'admin@littlelemon.com', 'lemon')
+    password = make_password('lemon')
+    manager = User.objects.create(username='manager', password=password)
+    crew_members = User.objects.bulk_create([User(username=f'crew{i}', password=password) for i in range(crew)])
+    customer_list = User.objects.bulk_create([User(username=f'customer{i}', password=password) for i in range(customers)])
+    Group.objects.create(name='manager').user_set.add(manager)
+    Group.objects.create(name='delivery-crew').user_set.add(*crew_members)
+    Token.objects.bulk_create([
+        Token(key=Token.generate_key(), user=user) for user in [admin, manager, *crew_members, *customer_list]
+    ])
+
+    category_list = Category.objects.bulk_create([
+        Category(title=f'Category {i}', slug=f'category-{i}') for i in range(categories)
+    ])
+    item_list = MenuItem.objects.bulk_create([
+        MenuItem(title=f'Dish {i}', price=Decimal(5 + i % 40), featured=i % 5 == 0, category=category_list[i % categories])
+        for i in range(menu_items)
+    ])
+    Cart.objects.bulk_create([
+        Cart(user=customer, menuitem=item, quantity=2, unit_price=item.price, price=2 * item.price)
+        for customer in customer_list for item in item_list[:cart_items]
+    ])
+    rebuild_cart_summaries()
+    order_list = Order.objects.bulk_create([
+        Order(
+            user=customer_list[i % customers],
+            delivery_crew=crew_members[i % crew] if crew else None,
+            status=i % 3 == 0,
+            total=Decimal(0),
+            date=timezone.now() - timedelta(minutes=i),
+        )
+        for i in range(orders)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, menuitem=item_list[(i + j) % menu_items], quantity=1,
+                  unit_price=item_list[(i + j) % menu_items].price, price=item_list[(i + j) % menu_items].price)
+        for i, order in enumerate(order_list) for j in range(3)
+    ])
+    rebuild_rollups()
+    return {
+        'admin': admin,
+        'manager': manager,
+        'crew': crew_members,
+        'customers': customer_list,
+        'categories': category_list,
+        'menu_items': item_list,
+        'orders': order_list,
+    }
+
+
+def token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get(user=user).key}')
+    return client
+
+
+#sends `requests` requests built by prepare(i) -> (method, path, data) and returns their latencies and query counts;
+#prepare runs outside the timed section, so routes that consume rows (DELETE, checkout) can create them first.
+#Streaming responses are read to the end, their queries run while the body is produced
+def drive(client, prepare, requests):
+    latencies, queries, statuses = [], [], Counter()
+    counter = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    for i in range(requests):
+        method, path, data = prepare(i)
+        counter[0] = 0
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latencies.append(time.perf_counter() - started)
+        queries.append(counter[0])
+        statuses[response.status_code] += 1
+    return latencies, queries, statuses
+
+
+#sends `requests` GETs of `path` to the ASGI application `app` from one event loop, at most `concurrency` at a
+#time, the way a single uvicorn worker receives them; returns the latencies, the statuses and the wall time
+async def drive_asgi(app, path, headers, requests, concurrency):
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'headers': [(b'host', b'testserver')] + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    latencies, statuses = [], Counter()
+    pending = iter(range(requests))
+
+    async def request():
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            #the client never disconnects; the handler cancels this wait once the response is sent
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses[message['status']] += 1
+
+        started = time.perf_counter()
+        await app(dict(scope), receive, send)
+        latencies.append(time.perf_counter() - started)
+
+    async def worker():
+        for _ in pending:
+            await request()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def summarize(latencies, queries, statuses):
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'requests_per_second': round(len(latencies) / total, 1) if total else None,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
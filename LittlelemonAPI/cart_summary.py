@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Cart, CartSummary
+
+#Incremental maintenance of CartSummary.
+#Every cart write locks the user's summary row first (lock_cart_summary, creating it from the cart rows if it
+#is missing), then applies the change it made (quantity and price deltas) as a single UPDATE with F()
+#expressions, inside the same transaction as the cart write itself. Concurrent writes of one user queue on
+#the lock, so the summary stays equal to the sum over the cart rows. The summary is a cache for the cart
+#badge and headers: checkout totals the cart rows themselves.
+
+
+def get_cart_summary(user):
+    summary = CartSummary.objects.filter(user=user).first()
+    return summary or CartSummary(user=user, item_count=0, subtotal=Decimal('0.00'))
+
+
+#the user's summary row, locked until the transaction ends; a missing one is created from the user's cart
+#rows first. Call inside transaction.atomic(), before the cart write it guards
+def lock_cart_summary(user_id):
+    summary = CartSummary.objects.select_for_update().filter(user_id=user_id).first()
+    if summary is not None:
+        return summary
+    totals = Cart.objects.filter(user_id=user_id).aggregate(item_count=Sum('quantity'), subtotal=Sum('price'))
+    try:
+        with transaction.atomic():
+            CartSummary.objects.create(
+                user_id=user_id, item_count=totals['item_count'] or 0, subtotal=totals['subtotal'] or Decimal('0.00'),
+            )
+    except IntegrityError:
+        #another request created it first
+        pass
+    return CartSummary.objects.select_for_update().get(user_id=user_id)
+
+
+def apply_cart_delta(user_id, item_count, subtotal):
+    if not item_count and not subtotal:
+        return
+    updated = CartSummary.objects.filter(user_id=user_id).update(
+        item_count=F('item_count') + item_count,
+        subtotal=F('subtotal') + subtotal,
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                CartSummary.objects.create(user_id=user_id, item_count=item_count, subtotal=subtotal)
+        except IntegrityError:
+            #another request created the row first, add to it instead
+            CartSummary.objects.filter(user_id=user_id).update(
+                item_count=F('item_count') + item_count,
+                subtotal=F('subtotal') + subtotal,
+            )
+
+
+#(quantity, price) totals of the given cart rows, read with their row locks where the backend has them
+#(FOR UPDATE cannot be combined with an aggregate, so the rows are summed here)
+def cart_rows_totals(cart_items):
+    rows = list(cart_items.select_for_update().values_list('quantity', 'price'))
+    return sum(quantity for quantity, _ in rows), sum((price for _, price in rows), Decimal('0.00'))
+
+
+def clear_cart_summary(user_id):
+    CartSummary.objects.filter(user_id=user_id).update(item_count=0, subtotal=Decimal('0.00'))
+
+
+#recomputes the summaries of all users (or of `user_ids`) from their cart rows in one pass; used after
+#cart rows were written in bulk outside the request path (seeding, imports), never on the request path
+def rebuild_cart_summaries(user_ids=None):
+    carts = Cart.objects.all()
+    summaries = CartSummary.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+    totals = carts.values('user_id').annotate(item_count=Sum('quantity'), subtotal=Sum('price'))
+    with transaction.atomic():
+        summaries.delete()
+        CartSummary.objects.bulk_create([
+            CartSummary(user_id=row['user_id'], item_count=row['item_count'], subtotal=row['subtotal'])
+            for row in totals
+        ])
@@ -0,0 +1,82 @@
+import gzip
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+#Response compression.
+#Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with the coding the client prefers among the
+#available ones (Accept-Encoding q-values, brotli before gzip on a tie); smaller ones, whose savings would not
+#pay for the compression time, are sent as they are. Streaming responses (exports, the order event stream)
+#are never compressed: buffering them would defeat the streaming. A compressed response's strong ETag is made
+#weak, as the bytes differ from the uncompressed representation's (conditional.if_match accepts it back).
+
+COMPRESSION_MIN_SIZE = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+GZIP_LEVEL = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+BROTLI_QUALITY = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+CODECS = {'gzip': lambda content: gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    CODECS['br'] = lambda content: brotli.compress(content, quality=BROTLI_QUALITY)
+#on equal q-values, the first one wins
+PREFERENCE = ('br', 'gzip')
+
+
+#the content coding to answer `accept_encoding` with, or None for none
+def negotiate_encoding(accept_encoding):
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    best = None
+    for coding in PREFERENCE:
+        if coding not in CODECS:
+            continue
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, coding)
+    return best[1] if best else None
+
+
+def compress_response(request, response):
+    if response.streaming or response.has_header('Content-Encoding') or len(response.content) < COMPRESSION_MIN_SIZE:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    coding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if coding is None:
+        return response
+    compressed = CODECS[coding](response.content)
+    if len(compressed) >= len(response.content):
+        return response
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = coding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = f'W/{etag}'
+    return response
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+    return middleware
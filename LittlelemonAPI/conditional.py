@@ -0,0 +1,91 @@
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .menu_cache import etag_matches
+from .models import ArchivedOrder
+
+#Conditional requests for single resources.
+#menu_single, category_single and order_detail (and their async variants) derive an ETag and a Last-Modified
+#date from the updated_at column of the rows a representation is built from, a menu item's category included
+#(archived orders never change, their archived_at is used). A GET whose If-None-Match (or, without one,
+#If-Modified-Since) still matches is answered 304 before anything is serialized. A PUT, PATCH or DELETE with
+#If-Match is checked against the row re-read and locked for the rest of its transaction, and answered 412 if
+#someone changed it in the meantime, so one manager cannot silently overwrite another's change.
+#Writes that bypass Model.save() (QuerySet.update(), bulk_update()) must set updated_at themselves.
+#The users an order renders (customer, delivery crew member) are not covered: renaming a user does not
+#change the ETag of their orders.
+
+
+#(ETag, last modified) of the resource `kind`/`pk` whose rows were last saved at `timestamps`
+def resource_validators(kind, pk, *timestamps):
+    modified = max(timestamps)
+    return f'"{kind}-{pk}-{round(modified.timestamp() * 1_000_000)}"', modified
+
+
+def category_validators(category):
+    return resource_validators('category', category.pk, category.updated_at)
+
+
+#the item's category has to be loaded (select_related), it is part of the representation
+def menu_item_validators(item):
+    return resource_validators('menuitem', item.pk, item.updated_at, item.category.updated_at)
+
+
+def order_validators(order):
+    if isinstance(order, ArchivedOrder):
+        return resource_validators('order', order.pk, order.archived_at)
+    return resource_validators('order', order.pk, order.updated_at)
+
+
+def validator_headers(validators):
+    etag, modified = validators
+    return {'ETag': etag, 'Last-Modified': http_date(modified.timestamp())}
+
+
+#whether the client's copy is current; If-Modified-Since only counts without If-None-Match and, like
+#Last-Modified, has a resolution of one second
+def not_modified(request, validators):
+    etag, modified = validators
+    if request.headers.get('If-None-Match'):
+        return etag_matches(request, etag)
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return since is not None and int(modified.timestamp()) <= since
+
+
+def not_modified_response(validators):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(validators))
+
+
+#the response to a GET of a resource: 304 if the client's copy is current, else 200 with `render()`
+def conditional_get(request, validators, render):
+    if not_modified(request, validators):
+        return not_modified_response(validators)
+    return Response(render(), status=status.HTTP_200_OK, headers=validator_headers(validators))
+
+
+#`instance`, re-read from `queryset` and locked until the transaction ends if the request has If-Match, so the
+#ETag it is checked against cannot change before the write; call inside transaction.atomic(). Only the
+#instance's own row is locked, the rows joined by select_related may be on the nullable side of an outer join
+def for_update(request, queryset, instance):
+    if not request.headers.get('If-Match'):
+        return instance
+    return queryset.select_for_update(of=('self',)).get(pk=instance.pk)
+
+
+#whether the current ETag satisfies If-Match; requests without the header always do. The weak form a
+#compressed response carries (see compression.py) is accepted too: these ETags name a row version, not bytes
+def if_match(request, validators):
+    header = request.headers.get('If-Match')
+    if not header:
+        return True
+    etags = parse_etags(header)
+    return '*' in etags or validators[0] in [tag.removeprefix('W/') for tag in etags]
+
+
+def precondition_failed_response(validators):
+    return Response(
+        {"message": "This resource was changed since you read it."},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+        headers=validator_headers(validators),
+    )
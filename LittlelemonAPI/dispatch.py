@@ -0,0 +1,96 @@
+import heapq
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .events import order_event, order_events
+from .models import Order
+from .roles import DELIVERY_CREW
+from .rollups import record_crew_assignments
+
+#Delivery dispatch.
+#Unassigned, undelivered orders form a queue, oldest first, read from the partial order_dispatch_queue_idx
+#index. Orders leave it either by being claimed by a crew member (claim_orders, pull) or by being handed out
+#by dispatch_orders to the least loaded crew members (push); nobody holds more than
+#DISPATCH_MAX_OPEN_DELIVERIES open orders: the crew members' user rows are locked (in id order) before their
+#open deliveries are counted, so concurrent claims and dispatches of one crew member count one after another.
+#Queue rows are locked with SKIP LOCKED where the backend has it,
+#so concurrent claimers take different orders instead of queueing behind each other; SQLite serializes
+#the write transactions instead (transaction_mode IMMEDIATE in settings).
+
+MAX_OPEN_DELIVERIES = getattr(settings, 'DISPATCH_MAX_OPEN_DELIVERIES', 5)
+QUEUE_ORDERING = ('date', 'id')
+
+
+def dispatch_queue():
+    return Order.objects.filter(delivery_crew__isnull=True, status=False).order_by(*QUEUE_ORDERING)
+
+
+#the first `count` orders of the queue as (id, date, status, user_id) rows, locked until the transaction ends
+def _take(count):
+    queue = dispatch_queue()
+    if connection.features.has_select_for_update_skip_locked:
+        queue = queue.select_for_update(skip_locked=True)
+    return list(queue.values_list('id', 'date', 'status', 'user_id')[:count])
+
+
+def _assign(rows, crew_id):
+    #QuerySet.update() skips auto_now, the ETags of the orders (see conditional.py) have to change
+    Order.objects.filter(id__in=[row[0] for row in rows]).update(delivery_crew_id=crew_id, updated_at=timezone.now())
+    record_crew_assignments([(date, delivered, crew_id) for _, date, delivered, _ in rows])
+    #and sends no signals
+    order_events.publish_on_commit([order_event(pk, user_id, crew_id, delivered) for pk, _, delivered, user_id in rows])
+
+
+def open_deliveries(user):
+    return Order.objects.filter(delivery_crew=user, status=False)
+
+
+#locks the user rows of `crew` (a User queryset) until the transaction ends; returns their ids
+def _lock_crew(crew):
+    return list(crew.select_for_update(of=('self',)).order_by('pk').values_list('pk', flat=True))
+
+
+#gives up to `count` of the oldest queued orders to `user`, never past MAX_OPEN_DELIVERIES open ones;
+#returns the ids of the claimed orders
+def claim_orders(user, count=1):
+    with transaction.atomic():
+        _lock_crew(User.objects.filter(pk=user.pk))
+        count = min(count, MAX_OPEN_DELIVERIES - open_deliveries(user).count())
+        rows = _take(count) if count > 0 else []
+        if rows:
+            _assign(rows, user.pk)
+    return [row[0] for row in rows]
+
+
+def active_crew():
+    return User.objects.filter(groups__name__iexact=DELIVERY_CREW, is_active=True)
+
+
+#active members of the delivery crew group as {user id: open deliveries}
+def crew_loads():
+    crew = active_crew().annotate(load=Count('delivery_crew', filter=Q(delivery_crew__status=False), distinct=True))
+    return dict(crew.values_list('id', 'load'))
+
+
+#hands out up to `limit` queued orders (all that fit by default), each to the crew member with the fewest
+#open deliveries at that point; returns {crew member id: [order ids]}
+def dispatch_orders(limit=None):
+    with transaction.atomic():
+        _lock_crew(active_crew())
+        loads = [(load, pk) for pk, load in crew_loads().items() if load < MAX_OPEN_DELIVERIES]
+        capacity = sum(MAX_OPEN_DELIVERIES - load for load, _ in loads)
+        rows = _take(capacity if limit is None else min(limit, capacity)) if capacity else []
+        heapq.heapify(loads)
+        assignments = {}
+        for row in rows:
+            load, pk = heapq.heappop(loads)
+            assignments.setdefault(pk, []).append(row)
+            if load + 1 < MAX_OPEN_DELIVERIES:
+                heapq.heappush(loads, (load + 1, pk))
+        for pk, assigned in assignments.items():
+            _assign(assigned, pk)
+    return {pk: [row[0] for row in assigned] for pk, assigned in assignments.items()}
@@ -0,0 +1,285 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .sqlite_files import SharedSQLiteFile
+
+#Order event stream.
+#Every order change (saves and deletes through signals.py, crew assignments in dispatch.py) is published
+#once its transaction commits as a small event: the order's id, status and delivery crew member. The
+#broker of each process fans events out to the open /api/orders/events connections (server-sent events,
+#served under ASGI only), so clients stop polling order_detail and order_management. Customers and crew
+#members subscribe to their own channel, managers to the channel every event goes to. An idle connection
+#is a queue and a suspended coroutine, with no database access, thread or timer of its own beyond a
+#keepalive comment every KEEPALIVE_SECONDS.
+#How events travel between the worker processes is up to ORDER_EVENTS_BACKEND: LocalEventBackend only
+#reaches the subscribers of the publishing process, SQLiteEventBackend appends events to a small SQLite
+#file (ORDER_EVENTS_STORE_PATH) that one thread per process polls, reaching every process on the host.
+#LocalEventBackend is the default, which is enough for a single ASGI worker; deployments running several
+#ASGI workers on a host set ORDER_EVENTS_BACKEND to SQLiteEventBackend.
+#Deployments without ASGI workers have nobody to stream to and set ORDER_EVENTS_BACKEND to None: order changes
+#then publish nothing. Moving orders to the archive is not a change either, archive.py publishes nothing.
+
+logger = logging.getLogger(__name__)
+
+MANAGERS = 'managers'
+KEEPALIVE_SECONDS = 15
+#reconnection delay suggested to EventSource clients, in milliseconds
+RETRY_MILLISECONDS = 3000
+#events a slow subscriber may have waiting; past that it is told to resync instead
+MAX_PENDING = 100
+DEFAULT_BACKEND = 'LittlelemonAPI.events.LocalEventBackend'
+
+_suppressed = ContextVar('order_events_suppressed', default=False)
+
+
+def user_channel(pk):
+    return f'user:{pk}'
+
+
+#the event of a changed (or deleted) order, for its customer, its crew member (the previous one too
+#when it was reassigned) and the managers
+def order_event(order_id, user_id, crew_id, status, previous_crew_id=None, deleted=False):
+    channels = {MANAGERS, user_channel(user_id)}
+    channels.update(user_channel(pk) for pk in (crew_id, previous_crew_id) if pk is not None)
+    return {
+        'event': 'order_deleted' if deleted else 'order',
+        'data': {'id': order_id, 'status': bool(status), 'delivery_crew': crew_id},
+        'channels': sorted(channels),
+    }
+
+
+def render_event(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+
+    def __init__(self, broker, channel, loop):
+        self.broker = broker
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(MAX_PENDING)
+        self.lost = False
+
+    #runs on the subscriber's event loop
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lost = True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class OrderEventBroker:
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+
+    #without a configured backend (ORDER_EVENTS_BACKEND = None) subscriptions stay idle
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = import_string(getattr(settings, 'ORDER_EVENTS_BACKEND', DEFAULT_BACKEND) or DEFAULT_BACKEND)(self)
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        self._backend = backend
+
+    #a subscription to `channel` delivering to the running event loop
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, asyncio.get_running_loop())
+        with self._lock:
+            self._channels[channel].add(subscription)
+        self.backend.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    #whether order changes made here are published: a backend is configured and they are not suppressed
+    @property
+    def publishing(self):
+        return getattr(settings, 'ORDER_EVENTS_BACKEND', DEFAULT_BACKEND) is not None and not _suppressed.get()
+
+    #order changes made inside the block publish nothing
+    @contextmanager
+    def suppressed(self):
+        token = _suppressed.set(True)
+        try:
+            yield
+        finally:
+            _suppressed.reset(token)
+
+    #sends `events` (see order_event) to every process; call publish_on_commit from inside transactions
+    def publish(self, events):
+        if events:
+            self.backend.publish(events)
+
+    #an event store that cannot be written must not fail the request whose changes just committed
+    def publish_on_commit(self, events):
+        if self.publishing:
+            transaction.on_commit(lambda: self.publish(events), robust=True)
+
+    #hands an event (with its id) to the subscribers of its channels in this process; thread-safe
+    def dispatch(self, event):
+        with self._lock:
+            subscriptions = [
+                subscription for channel in event['channels'] for subscription in self._channels.get(channel, ())
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                #its event loop is closed
+                self.unsubscribe(subscription)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+
+class LocalEventBackend:
+    #events reach the subscribers of the publishing process only
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._ids = itertools.count(1)
+
+    def start(self):
+        pass
+
+    def publish(self, events):
+        for event in events:
+            self.broker.dispatch({**event, 'id': next(self._ids)})
+
+
+_SCHEMA = '''CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, created REAL NOT NULL, payload TEXT NOT NULL
+)'''
+
+
+class SQLiteEventBackend:
+    #events are appended to a SQLite file shared by the processes of the host and dispatched at once in the
+    #publishing process; every other process reads them within POLL_SECONDS. Rows older than
+    #RETENTION_SECONDS are purged every PURGE_EVERY publishes.
+    POLL_SECONDS = 0.2
+    RETENTION_SECONDS = 60
+    PURGE_EVERY = 1000
+
+    #without a path, the backend follows the ORDER_EVENTS_STORE_PATH setting
+    def __init__(self, broker, path=None):
+        self.broker = broker
+        self._file = SharedSQLiteFile(path, 'ORDER_EVENTS_STORE_PATH', 'littlelemon-events.sqlite3', _SCHEMA)
+        self._instance = uuid.uuid4().hex
+        self._published = 0
+        self._poller = self._poller_pid = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._file.path
+
+    #who published an event: this backend in this process (workers forked from one parent share the instance)
+    @property
+    def origin(self):
+        return f'{self._instance}:{os.getpid()}'
+
+    def _connection(self):
+        return self._file.connection()
+
+    def publish(self, events):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN')
+            ids = [
+                connection.execute(
+                    'INSERT INTO order_events (origin, created, payload) VALUES (?, ?, ?) RETURNING id',
+                    (self.origin, now, json.dumps(event)),
+                ).fetchone()[0]
+                for event in events
+            ]
+        for event_id, event in zip(ids, events):
+            self.broker.dispatch({**event, 'id': event_id})
+        self._published += 1
+        if self._published % self.PURGE_EVERY == 0:
+            connection.execute('DELETE FROM order_events WHERE created < ?', (now - self.RETENTION_SECONDS,))
+
+    #starts the polling thread of this process with the first subscription
+    def start(self):
+        with self._start_lock:
+            if self._poller is not None and self._poller.is_alive() and self._poller_pid == os.getpid():
+                return
+            self._stopping.clear()
+            last = self._connection().execute('SELECT coalesce(max(id), 0) FROM order_events').fetchone()[0]
+            self._poller = threading.Thread(target=self._poll, args=(last,), name='order-events', daemon=True)
+            self._poller_pid = os.getpid()
+            self._poller.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def _poll(self, last):
+        origin = self.origin
+        while not self._stopping.wait(self.POLL_SECONDS):
+            try:
+                rows = self._connection().execute(
+                    'SELECT id, origin, payload FROM order_events WHERE id > ? ORDER BY id', (last,)
+                ).fetchall()
+            except sqlite3.Error:
+                logger.exception('Could not read order events from %s', self.path)
+                continue
+            for event_id, row_origin, payload in rows:
+                #the publishing process dispatched its own events already
+                if row_origin != origin:
+                    self.broker.dispatch({**json.loads(payload), 'id': event_id})
+                last = event_id
+
+
+order_events = OrderEventBroker()
+
+
+#the text/event-stream body of `subscription`: its events, a keepalive comment when idle, and a resync
+#event when events were dropped because the client fell behind (it should refetch /api/orders)
+async def event_stream(subscription, keepalive=KEEPALIVE_SECONDS):
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if subscription.lost:
+                subscription.lost = False
+                yield 'event: resync\ndata: {}\n\n'
+            yield render_event(event)
+    finally:
+        subscription.close()
@@ -0,0 +1,128 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.exceptions import ValidationError
+
+from .archive import filter_date_range
+from .fast_serializers import render_datetime, render_money
+from .models import OrderItem
+
+#Streaming order export.
+#The export never holds more than one chunk of orders: orders are read with QuerySet.iterator() in id
+#order, chunk by chunk, the items of a chunk are read with one IN query, and every chunk is written out as
+#soon as it is encoded. Memory stays flat whatever the number of orders, at one items query per
+#EXPORT_CHUNK_SIZE orders.
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_ORDER_VALUES = (
+    'id', 'user_id', 'user__username', 'delivery_crew_id', 'delivery_crew__username', 'status', 'total', 'date',
+)
+EXPORT_ITEM_VALUES = ('order_id', 'menuitem_id', 'menuitem__title', 'quantity', 'unit_price', 'price')
+CSV_HEADER = (
+    'order_id', 'user_id', 'username', 'delivery_crew_id', 'delivery_crew', 'status', 'total', 'date',
+    'menuitem_id', 'title', 'quantity', 'unit_price', 'price',
+)
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+_STATUSES = {'0': False, 'false': False, '1': True, 'true': True}
+
+
+#filters `orders` to the ?from= / ?to= range (see archive.filter_date_range) and the ?status= (0/1) of the export
+def filter_export(orders, query_params):
+    orders = filter_date_range(orders, query_params)
+    if query_params.get('status'):
+        value = query_params['status'].lower()
+        if value not in _STATUSES:
+            raise ValidationError({'status': ['Must be one of: 0, 1.']})
+        orders = orders.filter(status=_STATUSES[value])
+    return orders
+
+
+#(orders, their items) for every chunk of `orders`; the orders are fetched chunk_size rows at a time
+def _chunks(orders, chunk_size=None):
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    rows = orders.order_by('id').values(*EXPORT_ORDER_VALUES).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        items = {row['id']: [] for row in chunk}
+        for item in OrderItem.objects.filter(order_id__in=items).order_by('order_id', 'menuitem_id').values(*EXPORT_ITEM_VALUES):
+            items[item['order_id']].append(item)
+        yield chunk, items
+
+
+def _order_line(order, items):
+    return json.dumps({
+        'id': order['id'],
+        'user': {'id': order['user_id'], 'username': order['user__username']},
+        'delivery_crew': None if order['delivery_crew_id'] is None else {
+            'id': order['delivery_crew_id'], 'username': order['delivery_crew__username']},
+        'status': order['status'],
+        'total': render_money(order['total']),
+        'date': render_datetime(order['date']),
+        'items': [
+            {
+                'menuitem': item['menuitem_id'],
+                'title': item['menuitem__title'],
+                'quantity': item['quantity'],
+                'unit_price': render_money(item['unit_price']),
+                'price': render_money(item['price']),
+            }
+            for item in items
+        ],
+    }, separators=(',', ':')) + '\n'
+
+
+#one JSON object per order, its items nested
+def export_ndjson(orders, chunk_size=None):
+    for chunk, items in _chunks(orders, chunk_size):
+        yield ''.join(_order_line(order, items[order['id']]) for order in chunk)
+
+
+class _Echo:
+    #csv.writer target that hands every written line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+#one row per order item, the order's columns repeated; an order without items gets one row with empty item columns
+def export_csv(orders, chunk_size=None):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for chunk, items in _chunks(orders, chunk_size):
+        lines = []
+        for order in chunk:
+            columns = [
+                order['id'], order['user_id'], order['user__username'],
+                order['delivery_crew_id'] or '', order['delivery_crew__username'] or '',
+                int(order['status']), render_money(order['total']), render_datetime(order['date']),
+            ]
+            for item in items[order['id']] or [None]:
+                if item is None:
+                    lines.append(writer.writerow(columns + [''] * 5))
+                else:
+                    lines.append(writer.writerow(columns + [
+                        item['menuitem_id'], item['menuitem__title'], item['quantity'],
+                        render_money(item['unit_price']), render_money(item['price']),
+                    ]))
+        yield ''.join(lines)
+
+
+#StreamingHttpResponse content for `request`: under ASGI a synchronous iterator would be read into a list
+#before the first byte is sent, so the chunks are pulled one by one from the thread the view ran in
+def streaming_content(request, chunks):
+    if isinstance(request, ASGIRequest):
+        return _aiterate(iter(chunks))
+    return chunks
+
+
+async def _aiterate(chunks):
+    pull = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await pull(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
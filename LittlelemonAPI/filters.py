@@ -0,0 +1,83 @@
+import sys
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+
+#Filtering, prefix search and ordering for the menu_items listing.
+#Only combinations backed by an index on MenuItem are accepted (see MenuItem.Meta.indexes):
+#  category           -> (category, price)
+#  featured           -> (featured, price)
+#  from_price/to_price -> price
+#  search             -> lower(title), as a range on SQLite (BINARY collation), as LIKE 'prefix%' on PostgreSQL
+#                        (text_pattern_ops index, see migration 0014), so it stays an index search on both
+#  ordering           -> price or title, with id as tie breaker
+
+MENU_ORDERINGS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+}
+DEFAULT_MENU_ORDERING = 'price'
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def parse_price(name, value):
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: ['A valid number is required.']})
+    if not price.is_finite():
+        raise ValidationError({name: ['A valid number is required.']})
+    return price
+
+
+#[prefix, prefix with its last character incremented): every string starting with prefix and nothing
+#else under code point ordering (SQLite's BINARY collation; not a locale collation). None when the
+#increment has no valid character to land on (past U+10FFFF or in the surrogate range)
+def prefix_range(prefix):
+    following = ord(prefix[-1]) + 1
+    if following > sys.maxunicode or 0xD800 <= following <= 0xDFFF:
+        return None
+    return prefix, prefix[:-1] + chr(following)
+
+
+def filter_menu_items(items, query_params):
+    category_name = query_params.get('category')
+    featured = query_params.get('featured')
+    from_price = query_params.get('from_price')
+    to_price = query_params.get('to_price')
+    search = query_params.get('search')
+
+    if category_name:
+        items = items.filter(category__title=category_name) #double underscore is used to filter linked models
+    if featured:
+        if featured.lower() not in BOOLEAN_VALUES:
+            raise ValidationError({'featured': ['Must be true or false.']})
+        #featured=True compiles to a bare `WHERE featured`, which no index can serve; IN (...) keeps it a comparison
+        items = items.filter(featured__in=[BOOLEAN_VALUES[featured.lower()]])
+    if from_price:
+        items = items.filter(price__gte=parse_price('from_price', from_price))
+    if to_price:
+        items = items.filter(price__lte=parse_price('to_price', to_price))
+    if search:
+        #case-insensitive prefix match served by the lower(title) index; PostgreSQL compares text under the
+        #database's collation, where a range does not match prefixes (en_US sorts 'dish 1' before 'dish '
+        #ignoring the space), so it gets LIKE, which its text_pattern_ops index serves
+        bounds = None if connections[items.db].vendor == 'postgresql' else prefix_range(search.lower())
+        items = items.alias(title_lower=Lower('title'))
+        if bounds is None:
+            items = items.filter(title_lower__startswith=search.lower())
+        else:
+            items = items.filter(title_lower__gte=bounds[0], title_lower__lt=bounds[1])
+    return items
+
+
+def order_menu_items(items, ordering):
+    ordering = ordering or DEFAULT_MENU_ORDERING
+    if ordering not in MENU_ORDERINGS:
+        raise ValidationError({'ordering': [f'Must be one of: {", ".join(MENU_ORDERINGS)}.']})
+    return items.order_by(*MENU_ORDERINGS[ordering])
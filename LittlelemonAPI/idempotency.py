@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+#Idempotent requests.
+#A client that retries a request after a timeout sends the same Idempotency-Key header with every attempt.
+#The key is claimed by inserting its (user, key) row in the same transaction as the request's own writes,
+#and the response is stored on that row before the transaction commits. A retry, or a concurrent attempt,
+#therefore either waits on the unique index until the first attempt commits and replays its stored
+#response, or (if the first attempt failed and rolled back) runs the request itself. Keys are per user and
+#are replayed for IDEMPOTENCY_KEY_TTL seconds; `manage.py purge_idempotency_keys` deletes the expired ones.
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+#what a key is bound to: the same key sent with another method, path or body is a client error
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _fresh(stored):
+    return stored if stored is not None and stored.created_at > timezone.now() - key_ttl() else None
+
+
+#the stored row of (user, key) if another request already used the key, or None once this request holds it
+def _claim(user, key, fingerprint):
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint)
+            return None
+        except IntegrityError:
+            stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if _fresh(stored) is not None:
+                return stored
+            if stored is not None:
+                #expired: the key is free again
+                stored.delete()
+    raise IntegrityError(f'Could not claim {IDEMPOTENCY_HEADER} {key!r}.')
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return Response(
+            {"message": f"This {IDEMPOTENCY_HEADER} was used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored.response, status=stored.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+#runs `handler()` (which returns a Response) once per Idempotency-Key of request.user; requests without
+#the header run as usual. Responses of failed requests (exceptions) are not stored, the key stays free.
+def idempotent(request, handler):
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return handler()
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        return Response(
+            {IDEMPOTENCY_HEADER: [f'Must be 1 to {MAX_KEY_LENGTH} characters.']}, status=status.HTTP_400_BAD_REQUEST
+        )
+    fingerprint = request_fingerprint(request)
+    #retries of a finished request are answered from one read, without taking the write lock
+    stored = _fresh(IdempotencyKey.objects.filter(user=request.user, key=key).first())
+    if stored is not None:
+        return _replay(stored, fingerprint)
+    with transaction.atomic():
+        stored = _claim(request.user, key, fingerprint)
+        if stored is None:
+            response = handler()
+            IdempotencyKey.objects.filter(user=request.user, key=key).update(
+                status_code=response.status_code, response=response.data
+            )
+            return response
+    return _replay(stored, fingerprint)
+
+
+#deletes the keys older than IDEMPOTENCY_KEY_TTL; returns how many
+def purge_expired_keys():
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lte=timezone.now() - key_ttl()).delete()
+    return deleted
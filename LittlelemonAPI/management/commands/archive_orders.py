@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from LittlelemonAPI.archive import archive_orders
+from LittlelemonAPI.models import Order
+
+
+class Command(BaseCommand):
+    help = ('Moves orders older than ORDER_ARCHIVE_AFTER_DAYS (or --days) with their items from the Order/OrderItem '
+            'tables into the archive tables, in batches of one transaction each. Archived orders stay readable '
+            'through /api/orders/<id> and /api/orders/archive.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365),
+                            help='Archive orders placed more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be archived.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be 0 or more and --batch-size at least 1.')
+        before = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{Order.objects.filter(date__lt=before).count()} orders placed before {before.isoformat()} would be archived.')
+            return
+
+        total = 0
+        for moved in archive_orders(before, options['batch_size']):
+            total += moved
+            self.stdout.write(f'archived {total} orders', ending='\r')
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} orders placed before {before.isoformat()}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlelemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the daily sales rollups behind /api/reports from the order tables, archived orders included. '
+            'Run it once after migrating; afterwards every order write keeps the rollups up to date. The rebuild '
+            'runs in one transaction, so the reports keep showing the old rollups until it commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Order ids aggregated per query.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        total = rebuild_rollups(options['batch_size'], progress=lambda counted: self.stdout.write(f'counted {counted} orders', ending='\r'))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the daily rollups from {total} orders.'))
@@ -0,0 +1,193 @@
+import json
+import platform
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from LittlelemonAPI.benchmark import benchmark_environment, drive, seed_database, summarize, token_client
+from LittlelemonAPI.cart_summary import rebuild_cart_summaries
+from LittlelemonAPI.models import Cart, Category, MenuItem, Order
+
+
+class Command(BaseCommand):
+    help = ('Drives every LittlelemonAPI route through the test client against a seeded throwaway database '
+            'and reports p50/p95/p99 latency, queries per request and requests per second as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--menu-items', type=int, default=200)
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--cart-items', type=int, default=5, help='Cart rows seeded per customer.')
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--crew', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=50, help='Requests sent to every route.')
+        parser.add_argument('--route', action='append', default=[], help='Only run routes containing this text.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        seed_options = {name: options[name] for name in ('categories', 'menu_items', 'customers', 'cart_items', 'orders', 'crew')}
+        results = {}
+        with benchmark_environment():
+            seed = seed_database(**seed_options)
+            for name, role, prepare in self.routes(seed):
+                if options['route'] and not any(text in name for text in options['route']):
+                    continue
+                client = token_client(role)
+                results[name] = summarize(*drive(client, prepare, options['requests']))
+                self.stdout.write(f"{name:<40} {results[name]['p50_ms']:>9.3f} ms p50 "
+                                  f"{results[name]['p99_ms']:>9.3f} ms p99 "
+                                  f"{results[name]['queries_per_request']:>6} q/req "
+                                  f"{results[name]['requests_per_second']:>8} req/s")
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'profile': settings.DATABASE_PROFILE,
+            'seed': seed_options,
+            'requests_per_route': options['requests'],
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+
+    def compare(self, results, path):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['routes']
+        self.stdout.write(f"\n{'route':<40} {'p50 before':>11} {'p50 after':>11} {'change':>8}")
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before, after = baseline[name]['p50_ms'], result['p50_ms']
+            change = (after - before) / before * 100 if before else 0
+            self.stdout.write(f'{name:<40} {before:>11.3f} {after:>11.3f} {change:>+7.1f}%')
+
+    #(name, user sending the requests, prepare(i) -> (method, path, data)) for every route in LittlelemonAPI/urls.py
+    def routes(self, seed):
+        admin, manager = seed['admin'], seed['manager']
+        crew, customer = seed['crew'][0], seed['customers'][0]
+        category = seed['categories'][0]
+        item = seed['menu_items'][0]
+        order = seed['orders'][0]
+        crew_order = next(o for o in seed['orders'] if o.delivery_crew_id == crew.pk)
+        spare_customer = seed['customers'][-1]
+        claimer = seed['crew'][-1]
+
+        def fixed(method, path, data=None):
+            return lambda i: (method, path, data)
+
+        def new_category(i):
+            return Category.objects.create(title=f'Bench category {i}')
+
+        def new_menu_item(i):
+            return MenuItem.objects.create(title=f'Bench dish {i}', price=Decimal('9.50'), featured=False, category=category)
+
+        def category_delete(i):
+            return 'delete', f'/api/category/{new_category(i).pk}', None
+
+        def menu_item_delete(i):
+            return 'delete', f'/api/menu-items/{new_menu_item(i).pk}', None
+
+        def group_user_delete(i):
+            Group.objects.get(name='delivery-crew').user_set.add(spare_customer)
+            return 'delete', f'/api/groups/delivery-crew/users/{spare_customer.pk}', None
+
+        def cart_add(i):
+            Cart.objects.filter(user=customer, menuitem=item).delete()
+            rebuild_cart_summaries([customer.pk])
+            return 'post', '/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 2}
+
+        def fill_cart():
+            Cart.objects.get_or_create(user=customer, menuitem=item, defaults={'quantity': 1})
+            rebuild_cart_summaries([customer.pk])
+
+        def cart_clear(i):
+            fill_cart()
+            return 'delete', '/api/cart/menu-items', None
+
+        def checkout(i):
+            fill_cart()
+            return 'post', '/api/orders', None
+
+        #the dispatch queue is empty once every seeded order is assigned: the crew's open orders go back to it
+        def release(crew_members):
+            Order.objects.filter(delivery_crew__in=crew_members, status=False).update(delivery_crew=None)
+
+        def claim(i):
+            release([claimer])
+            return 'post', '/api/deliveries/claim', {'count': 2}
+
+        def dispatch(i):
+            release(seed['crew'])
+            return 'post', '/api/dispatch', {'limit': 10}
+
+        def order_delete(i):
+            new_order = Order.objects.create(user=customer, total=Decimal('10.00'))
+            return 'delete', f'/api/orders/{new_order.pk}', None
+
+        return [
+            ('GET throttle', customer, fixed('get', '/api/throttle')),
+            ('GET profiling', admin, fixed('get', '/api/profiling')),
+            ('GET category', customer, fixed('get', '/api/category')),
+            ('POST category', manager, lambda i: ('post', '/api/category', {'title': f'New category {i}'})),
+            ('GET category/<id>', customer, fixed('get', f'/api/category/{category.pk}')),
+            ('PUT category/<id>', manager, lambda i: ('put', f'/api/category/{category.pk}', {'title': category.title, 'slug': f'category-{i}'})),
+            ('PATCH category/<id>', manager, fixed('patch', f'/api/category/{category.pk}', {'title': category.title})),
+            ('DELETE category/<id>', manager, category_delete),
+            ('GET menu', customer, fixed('get', '/api/menu')),
+            ('GET menu category', customer, fixed('get', f'/api/menu?category={category.title}')),
+            ('GET menu-items', customer, fixed('get', '/api/menu-items/?perpage=20')),
+            ('GET menu-items filtered', customer, fixed('get', f'/api/menu-items/?category={category.title}&ordering=price&perpage=20')),
+            ('GET menu-items cursor', customer, fixed('get', '/api/menu-items/?cursor=&perpage=20')),
+            ('POST menu-items', manager, lambda i: ('post', '/api/menu-items/', {'title': f'New dish {i}', 'price': '12.00', 'featured': False, 'category_id': category.pk})),
+            ('GET menu-items/<id>', customer, fixed('get', f'/api/menu-items/{item.pk}')),
+            ('PUT menu-items/<id>', manager, fixed('put', f'/api/menu-items/{item.pk}', {'title': item.title, 'price': str(item.price), 'featured': True, 'category_id': category.pk})),
+            ('PATCH menu-items/<id>', manager, fixed('patch', f'/api/menu-items/{item.pk}', {'featured': False})),
+            ('DELETE menu-items/<id>', manager, menu_item_delete),
+            ('POST menu-items/import', manager, lambda i: ('post', '/api/menu-items/import', [
+                {'title': f'Imported dish {n}', 'price': f'{5 + (i + n) % 20}.00', 'category': f'Imported {n % 5}'} for n in range(100)
+            ])),
+            ('GET groups/<name>/users', admin, fixed('get', '/api/groups/delivery-crew/users')),
+            ('POST groups/<name>/users', admin, fixed('post', '/api/groups/delivery-crew/users', {'username': spare_customer.username})),
+            ('DELETE groups/<name>/users/<id>', admin, group_user_delete),
+            ('GET cart/menu-items', customer, fixed('get', '/api/cart/menu-items')),
+            ('GET cart/summary', customer, fixed('get', '/api/cart/summary')),
+            ('POST cart/menu-items', customer, cart_add),
+            ('DELETE cart/menu-items', customer, cart_clear),
+            ('POST cart/menu-items/batch', customer, fixed('post', '/api/cart/menu-items/batch', [
+                {'menuitem': menu_item.pk, 'quantity': 1 + n % 3} for n, menu_item in enumerate(seed['menu_items'][:10])
+            ])),
+            ('GET orders customer', customer, fixed('get', '/api/orders')),
+            ('GET orders manager', manager, fixed('get', '/api/orders')),
+            ('GET orders manager cursor', manager, fixed('get', '/api/orders?cursor=&perpage=20&ordering=-date')),
+            ('GET orders delivery-crew', crew, fixed('get', '/api/orders')),
+            ('GET orders/archive manager', manager, fixed('get', '/api/orders/archive?perpage=20')),
+            ('GET orders/export ndjson', manager, fixed('get', '/api/orders/export')),
+            ('GET orders/export csv', manager, fixed('get', '/api/orders/export?output=csv')),
+            #the test client is a WSGI request, answered 501: the stream itself is measured by bench_events
+            ('GET orders/events', customer, fixed('get', '/api/orders/events')),
+            ('POST orders', customer, checkout),
+            ('GET orders/<id>', customer, fixed('get', f'/api/orders/{order.pk}')),
+            ('PATCH orders/<id> manager', manager, fixed('patch', f'/api/orders/{order.pk}', {'delivery_crew': crew.pk})),
+            ('PUT orders/<id> manager', manager, fixed('put', f'/api/orders/{order.pk}', {'status': False})),
+            ('PATCH orders/<id> delivery-crew', crew, fixed('patch', f'/api/orders/{crew_order.pk}', {'status': 1})),
+            ('DELETE orders/<id>', manager, order_delete),
+            ('GET deliveries', crew, fixed('get', '/api/deliveries')),
+            ('POST deliveries/claim', claimer, claim),
+            ('POST dispatch', manager, dispatch),
+            ('GET reports/revenue', manager, fixed('get', '/api/reports/revenue')),
+            ('GET reports/top-items', manager, fixed('get', '/api/reports/top-items?limit=10')),
+            ('GET reports/category-mix', manager, fixed('get', '/api/reports/category-mix')),
+            ('GET reports/crew-throughput', manager, fixed('get', '/api/reports/crew-throughput')),
+            ('POST api-token-auth', customer, fixed('post', '/api/api-token-auth/', {'username': customer.username, 'password': 'lemon'})),
+        ]
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from LittlelemonAPI.benchmark import benchmark_environment, drive_asgi, seed_database
+from LittlelemonAPI.profiling import percentile
+
+
+class Command(BaseCommand):
+    help = ('Compares the sync DRF views with their async variants under the ASGI application: every read route '
+            'is driven from one event loop at high concurrency (one worker), once with ASGI_URLCONF switched off '
+            '(sync views over the thread bridge) and once with it on, and the throughput is reported as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--menu-items', type=int, default=200)
+        parser.add_argument('--customers', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--crew', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=500, help='Requests sent to every route in each mode.')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once.')
+        parser.add_argument('--route', action='append', default=[], help='Only run routes containing this text.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        seed_options = {name: options[name] for name in ('categories', 'menu_items', 'customers', 'orders', 'crew')}
+        results = {}
+        with benchmark_environment():
+            seed = seed_database(cart_items=0, **seed_options)
+            application = get_asgi_application()
+            for name, user, path in self.routes(seed):
+                if options['route'] and not any(text in name for text in options['route']):
+                    continue
+                headers = {'Authorization': f'Token {Token.objects.get(user=user).key}'}
+                results[name] = {}
+                for mode, urlconf in (('sync', None), ('async', settings.ASGI_URLCONF)):
+                    with override_settings(ASGI_URLCONF=urlconf):
+                        latencies, statuses, elapsed = asyncio.run(
+                            drive_asgi(application, path, headers, options['requests'], options['concurrency']))
+                    results[name][mode] = {
+                        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                        'requests_per_second': round(len(latencies) / elapsed, 1),
+                        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+                    }
+                sync, async_ = results[name]['sync'], results[name]['async']
+                self.stdout.write(f"{name:<28} sync {sync['requests_per_second']:>8} req/s "
+                                  f"async {async_['requests_per_second']:>8} req/s "
+                                  f"({async_['requests_per_second'] / sync['requests_per_second']:.2f}x)")
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'profile': settings.DATABASE_PROFILE,
+            'seed': seed_options,
+            'requests_per_route': options['requests'],
+            'concurrency': options['concurrency'],
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    #(name, user sending the requests, path) for every route with an async variant
+    def routes(self, seed):
+        manager, crew, customer = seed['manager'], seed['crew'][0], seed['customers'][0]
+        category = seed['categories'][0]
+        item = seed['menu_items'][0]
+        order = next(o for o in seed['orders'] if o.user_id == customer.pk)
+        return [
+            ('GET category', customer, '/api/category'),
+            ('GET category/<id>', customer, f'/api/category/{category.pk}'),
+            ('GET menu', customer, '/api/menu'),
+            ('GET menu-items', customer, '/api/menu-items/?perpage=20'),
+            ('GET menu-items/<id>', customer, f'/api/menu-items/{item.pk}'),
+            ('GET orders customer', customer, '/api/orders'),
+            ('GET orders manager cursor', manager, '/api/orders?cursor=&perpage=20&ordering=-date'),
+            ('GET orders delivery-crew', crew, '/api/orders'),
+            ('GET orders/<id>', customer, f'/api/orders/{order.pk}'),
+        ]
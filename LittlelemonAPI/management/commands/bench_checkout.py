@@ -0,0 +1,76 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from LittlelemonAPI.benchmark import benchmark_environment
+from LittlelemonAPI.cart_summary import rebuild_cart_summaries
+from LittlelemonAPI.models import Cart, Category, MenuItem
+from LittlelemonAPI.profiling import percentile
+
+
+class Command(BaseCommand):
+    help = 'Measures concurrent checkout throughput (POST /api/orders) under the active database profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200, help='Customers checking out, one checkout each.')
+        parser.add_argument('--cart-size', type=int, default=5, help='Items in every cart.')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients.')
+        parser.add_argument('--no-pragmas', action='store_true', help='SQLite baseline without SQLITE_PRAGMAS.')
+
+    def handle(self, *args, **options):
+        pragmas = {} if options['no_pragmas'] else getattr(settings, 'SQLITE_PRAGMAS', {})
+        with override_settings(SQLITE_PRAGMAS=pragmas), benchmark_environment():
+            customers = self.seed(options['customers'], options['cart_size'])
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                started = time.perf_counter()
+                results = list(pool.map(self.checkout, customers))
+                elapsed = time.perf_counter() - started
+
+        latencies = [latency for outcome, latency in results if outcome == 201]
+        report = {
+            'profile': settings.DATABASE_PROFILE,
+            'vendor': connection.vendor,
+            'pragmas': bool(pragmas) and connection.vendor == 'sqlite',
+            'threads': options['threads'],
+            'cart_size': options['cart_size'],
+            'checkouts': len(latencies),
+            'locked': sum(1 for outcome, _ in results if outcome == 'locked'),
+            'failed': sum(1 for outcome, _ in results if outcome not in (201, 'locked')),
+            'checkouts_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        }
+        self.stdout.write(json.dumps(report))
+
+    def seed(self, count, cart_size):
+        category = Category.objects.create(title='Benchmark')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Dish {i}', price=5 + i, featured=False, category=category) for i in range(cart_size)
+        ])
+        customers = User.objects.bulk_create([User(username=f'customer{i}') for i in range(count)])
+        Cart.objects.bulk_create([
+            Cart(user=customer, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+            for customer in customers for item in items
+        ])
+        rebuild_cart_summaries()
+        return customers
+
+    def checkout(self, customer):
+        client = APIClient()
+        client.force_authenticate(customer)
+        started = time.perf_counter()
+        try:
+            response = client.post('/api/orders')
+            return response.status_code, time.perf_counter() - started
+        except OperationalError:
+            #"database is locked": the writer could not get the lock within the busy timeout
+            return 'locked', time.perf_counter() - started
+        finally:
+            connections.close_all()
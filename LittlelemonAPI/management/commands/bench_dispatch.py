@@ -0,0 +1,114 @@
+import json
+import platform
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from LittlelemonAPI.benchmark import benchmark_environment, seed_database
+from LittlelemonAPI.dispatch import claim_orders
+from LittlelemonAPI.models import Order
+from LittlelemonAPI.profiling import percentile
+
+
+class Command(BaseCommand):
+    help = ('Simulates delivery crew members claiming orders from the dispatch queue concurrently, one thread and '
+            'database connection each, against a seeded throwaway database: every claimed order is delivered right '
+            'away and the crew member claims again until the queue is empty. Reports claims per second, claim '
+            'latency, failed claims and whether any order was handed out twice.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crew', type=int, nargs='+', default=[1, 4, 16], help='Concurrent crew members to measure.')
+        parser.add_argument('--orders', type=int, default=2000, help='Queued orders per run.')
+        parser.add_argument('--count', type=int, default=1, help='Orders taken per claim.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if min(options['crew']) < 1 or options['orders'] < 1 or options['count'] < 1:
+            raise CommandError('--crew, --orders and --count must be at least 1.')
+        results = []
+        with benchmark_environment():
+            seed = seed_database(orders=0, crew=max(options['crew']))
+            for crew in options['crew']:
+                self.queue_orders(seed, options['orders'])
+                result = {'crew': crew, **self.run(seed['crew'][:crew], options['count'])}
+                results.append(result)
+                self.stdout.write(
+                    f"{crew:>4} crew {result['claims_per_second']:>9.1f} claims/s {result['orders_per_second']:>9.1f} orders/s "
+                    f"p50 {result['p50_ms']:>7.2f} ms p99 {result['p99_ms']:>7.2f} ms "
+                    f"failed {result['failed']} duplicates {result['duplicates']} left {result['left_in_queue']}")
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'orders': options['orders'],
+            'count': options['count'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    #replaces every order with `orders` unassigned, undelivered ones
+    def queue_orders(self, seed, orders):
+        Order.objects.all().delete()
+        customers, now = seed['customers'], timezone.now()
+        Order.objects.bulk_create([
+            Order(user=customers[i % len(customers)], total=Decimal('10.00'), date=now - timedelta(seconds=orders - i))
+            for i in range(orders)
+        ], batch_size=1000)
+
+    def run(self, crew, count):
+        latencies, claimed, failures = [], [], Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(len(crew))
+
+        def work(member):
+            mine, times = [], []
+            try:
+                start.wait()
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        ids = claim_orders(member, count)
+                    except Exception as exc:
+                        failures[type(exc).__name__] += 1
+                        continue
+                    times.append(time.perf_counter() - started)
+                    if not ids:
+                        break
+                    mine += ids
+                    #delivered at once, so the crew member never hits the open deliveries limit
+                    Order.objects.filter(id__in=ids).update(status=True)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(times)
+                claimed.extend(mine)
+
+        threads = [threading.Thread(target=work, args=(member,)) for member in crew]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'seconds': round(elapsed, 3),
+            'claims': len(latencies),
+            'claims_per_second': round(len(latencies) / elapsed, 1),
+            'orders_per_second': round(len(claimed) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'failed': dict(failures),
+            'duplicates': len(claimed) - len(set(claimed)),
+            'left_in_queue': Order.objects.filter(delivery_crew__isnull=True, status=False).count(),
+        }
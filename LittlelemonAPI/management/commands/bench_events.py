@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlelemonAPI.events import (
+    MANAGERS, LocalEventBackend, OrderEventBroker, SQLiteEventBackend, event_stream, order_event, user_channel,
+)
+
+
+class Command(BaseCommand):
+    help = ('Measures the order event stream (LittlelemonAPI/events.py): the memory held by CONNECTIONS idle '
+            'subscribers, how long an event takes to reach its subscriber and a broadcast to reach all of them, '
+            'and the delivery delay between two processes sharing the SQLite event backend.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=10000)
+        parser.add_argument('--events', type=int, default=1000, help='Single-subscriber events to time.')
+        parser.add_argument('--shared-events', type=int, default=50, help='Events sent through the SQLite backend.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if min(options['connections'], options['events'], options['shared_events']) < 1:
+            raise CommandError('--connections, --events and --shared-events must be at least 1.')
+        results = asyncio.run(self.local(options['connections'], options['events']))
+        directory = tempfile.mkdtemp(prefix='littlelemon-events-')
+        try:
+            results['sqlite_backend'] = asyncio.run(
+                self.shared(os.path.join(directory, 'events.sqlite3'), options['shared_events'])
+            )
+        finally:
+            shutil.rmtree(directory)
+        results['environment'] = {'python': platform.python_version(), 'django': django.get_version()}
+        self.stdout.write(json.dumps(results, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    #`connections` subscribers, one per user channel, each read by a task the way the ASGI handler reads a
+    #streaming response; every received event is timestamped
+    async def local(self, connections, events):
+        broker = OrderEventBroker()
+        broker.backend = LocalEventBackend(broker)
+        received = {}
+        done = asyncio.Event()
+        expected = [0]
+
+        async def consume(pk, stream):
+            async for chunk in stream:
+                if chunk.startswith('id:'):
+                    received.setdefault(chunk, []).append(time.perf_counter())
+                    if len(received[chunk]) == expected[0]:
+                        done.set()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [broker.subscribe(user_channel(pk)) for pk in range(connections)]
+        managers = broker.subscribe(MANAGERS)
+        tasks = [asyncio.create_task(consume(pk, event_stream(subscription))) for pk, subscription in enumerate(subscriptions)]
+        tasks.append(asyncio.create_task(consume(None, event_stream(managers))))
+        await asyncio.sleep(0.1)
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        #one customer's order changes: the event reaches the customer and the managers' stream
+        latencies = []
+        for i in range(events):
+            expected[0] = 2
+            done.clear()
+            start = time.perf_counter()
+            broker.publish([order_event(i, i % connections, None, False)])
+            await done.wait()
+            latencies.append(time.perf_counter() - start)
+
+        #an event on every user channel at once
+        expected[0] = connections
+        done.clear()
+        start = time.perf_counter()
+        broker.dispatch({**order_event(0, 0, None, False), 'id': 'broadcast', 'channels': [
+            user_channel(pk) for pk in range(connections)]})
+        await done.wait()
+        broadcast = time.perf_counter() - start
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return {
+            'connections': connections,
+            'bytes_per_idle_connection': round(held / (connections + 1)),
+            'event_to_subscriber_us': {
+                'p50': round(statistics.median(latencies) * 1e6, 1),
+                'p99': round(sorted(latencies)[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+            },
+            'broadcast_to_all_ms': round(broadcast * 1000, 2),
+            'open_after_disconnect': len(broker),
+        }
+
+    #two brokers on one SQLite file stand in for two worker processes
+    async def shared(self, path, events):
+        publisher, subscriber = OrderEventBroker(), OrderEventBroker()
+        publisher.backend = SQLiteEventBackend(publisher, path)
+        subscriber.backend = SQLiteEventBackend(subscriber, path)
+        subscription = subscriber.subscribe(MANAGERS)
+        try:
+            delays, publish = [], []
+            for i in range(events):
+                start = time.perf_counter()
+                await asyncio.to_thread(publisher.publish, [order_event(i, 1, None, False)])
+                publish.append(time.perf_counter() - start)
+                await subscription.queue.get()
+                delays.append(time.perf_counter() - start)
+        finally:
+            subscription.close()
+            subscriber.backend.stop()
+        return {
+            'poll_seconds': SQLiteEventBackend.POLL_SECONDS,
+            'publish_us_p50': round(statistics.median(publish) * 1e6, 1),
+            'other_process_delay_ms': {
+                'p50': round(statistics.median(delays) * 1000, 1),
+                'max': round(max(delays) * 1000, 1),
+            },
+        }
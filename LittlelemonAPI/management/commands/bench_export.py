@@ -0,0 +1,93 @@
+import json
+import platform
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from LittlelemonAPI.benchmark import benchmark_environment, seed_database, token_client
+from LittlelemonAPI.models import Order, OrderItem
+
+SEED_BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = ('Streams /api/orders/export (NDJSON and CSV) from seeded throwaway databases of growing size and reports '
+            'throughput and the peak Python memory allocated while the response is consumed; the peak should stay '
+            'flat as the number of orders grows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Order counts to measure, three items per order.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['orders'])
+        if sizes[0] < 1:
+            raise CommandError('--orders must be at least 1.')
+        results = []
+        with benchmark_environment():
+            seed = seed_database(orders=0)
+            client = token_client(seed['manager'])
+            seeded = 0
+            for size in sizes:
+                self.add_orders(seed, seeded, size)
+                seeded = size
+                for output in ('ndjson', 'csv'):
+                    result = {'orders': size, 'output': output, **self.measure(client, f'/api/orders/export?output={output}')}
+                    results.append(result)
+                    self.stdout.write(
+                        f"{size:>9} orders {output:<6} {result['orders_per_second']:>10.0f} orders/s "
+                        f"{result['megabytes']:>8.1f} MB  peak {result['peak_kib']:>8.0f} KiB")
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    #orders [start, stop) of a restaurant seeded by seed_database, added in bulk
+    def add_orders(self, seed, start, stop):
+        customers, crew, items = seed['customers'], seed['crew'], seed['menu_items']
+        now = timezone.now()
+        for batch in range(start, stop, SEED_BATCH):
+            orders = Order.objects.bulk_create([
+                Order(user=customers[i % len(customers)], delivery_crew=crew[i % len(crew)], status=i % 3 == 0,
+                      total=Decimal(0), date=now - timedelta(minutes=i))
+                for i in range(batch, min(batch + SEED_BATCH, stop))
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menuitem=items[(i + j) % len(items)], quantity=1,
+                          unit_price=items[(i + j) % len(items)].price, price=items[(i + j) % len(items)].price)
+                for i, order in enumerate(orders, batch) for j in range(3)
+            ])
+
+    #throughput of one untraced run, then the allocation peak of a traced one; the body is counted, never kept
+    def measure(self, client, path):
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in client.get(path).streaming_content)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        try:
+            for chunk in client.get(path).streaming_content:
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        orders = Order.objects.count()
+        return {
+            'seconds': round(elapsed, 3),
+            'orders_per_second': round(orders / elapsed, 1),
+            'megabytes': round(size / 2 ** 20, 2),
+            'peak_kib': round(peak / 1024, 1),
+        }
@@ -0,0 +1,99 @@
+import gzip
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from LittlelemonAPI import compression
+from LittlelemonAPI.benchmark import benchmark_environment, seed_database, token_client
+from LittlelemonAPI.fast_serializers import ORDER_VALUES, serialize_orders
+from LittlelemonAPI.models import Order, OrderItem
+from LittlelemonAPI.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = ('Measures the rendering and the bytes on the wire of a ORDERS-order /api/orders response: DRF\'s '
+            'JSONRenderer against FastJSONRenderer (LittlelemonAPI/renderers.py) on the listing and on raw Decimal '
+            'rows, the size and cost of every compression level, and the whole request with and without '
+            'Accept-Encoding against a seeded throwaway database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best one is reported.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['repeat'] < 1:
+            raise CommandError('--orders and --repeat must be at least 1.')
+        repeat = options['repeat']
+        drf, fast = JSONRenderer(), FastJSONRenderer()
+        results = {}
+        with benchmark_environment():
+            seed = seed_database(categories=10, menu_items=200, customers=50, cart_items=0, orders=options['orders'], crew=5)
+            payloads = {
+                #what order_management sends managers: money already rendered to strings
+                'order listing': serialize_orders(Order.objects.values(*ORDER_VALUES)),
+                #Decimal-heavy rows, as a values() query hands them to a renderer
+                'order items with Decimals': list(OrderItem.objects.values('order_id', 'menuitem_id', 'quantity', 'unit_price', 'price')),
+            }
+            for name, data in payloads.items():
+                before, after = self.best(lambda: drf.render(data), repeat), self.best(lambda: fast.render(data), repeat)
+                results[name] = {
+                    'rows': len(data),
+                    'bytes': len(drf.render(data)),
+                    'identical_json': drf.render(data) == fast.render(data),
+                    'render_ms': {'JSONRenderer': before, 'FastJSONRenderer': after, 'speedup': round(before / after, 2)},
+                }
+                self.stdout.write(f"{name:<28} JSONRenderer {before:>8.2f} ms  FastJSONRenderer {after:>8.2f} ms ({before / after:.2f}x)")
+
+            content = fast.render(payloads['order listing'])
+            wire = {'identity': {'bytes': len(content), 'compress_ms': 0}}
+            for level in (1, 6, 9):
+                wire[f'gzip-{level}'] = self.compressed(lambda: gzip.compress(content, compresslevel=level, mtime=0), repeat)
+            if compression.brotli is not None:
+                for quality in (1, 5, 11):
+                    wire[f'br-{quality}'] = self.compressed(lambda: compression.brotli.compress(content, quality=quality), repeat)
+            results['bytes on the wire'] = wire
+            for coding, row in wire.items():
+                self.stdout.write(f"{coding:<10} {row['bytes']:>10} bytes  {row['compress_ms']:>8.2f} ms")
+
+            client = token_client(seed['manager'])
+            requests = {}
+            for name, headers in (('identity', {}), ('gzip', {'HTTP_ACCEPT_ENCODING': 'gzip'})):
+                latency = self.best(lambda: client.get('/api/orders', **headers), repeat)
+                response = client.get('/api/orders', **headers)
+                requests[name] = {
+                    'ms': latency, 'bytes': len(response.content), 'content_encoding': response.get('Content-Encoding'),
+                }
+                self.stdout.write(f"GET /api/orders {name:<9} {latency:>8.2f} ms {len(response.content):>10} bytes")
+            results['GET /api/orders'] = requests
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'orjson': getattr(orjson, '__version__', None),
+            'database': connection.vendor,
+            'orders': options['orders'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    #best wall time of `repeat` runs of func, in milliseconds
+    def best(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return round(min(timings) * 1000, 3)
+
+    def compressed(self, func, repeat):
+        return {'bytes': len(func()), 'compress_ms': self.best(func, repeat)}
@@ -0,0 +1,92 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from LittlelemonAPI.benchmark import benchmark_environment, seed_database
+from LittlelemonAPI.fast_serializers import (
+    CART_VALUES, MENU_ITEM_VALUES, ORDER_VALUES, serialize_cart, serialize_menu_items, serialize_orders,
+)
+from LittlelemonAPI.models import Cart, MenuItem, Order
+from LittlelemonAPI.serializers import CartSerializer, MenuItemSerializer, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = ('Microbenchmark of the list serializers: renders ROWS menu items, orders and cart rows with the model '
+            'serializers (before) and with the read-only .values() path (after) against a seeded throwaway database, '
+            'and reports rows per second for serialization alone and for query + serialization + JSON rendering.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best one is reported.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderer = JSONRenderer()
+        results = {}
+        with benchmark_environment():
+            seed = seed_database(categories=10, menu_items=rows, customers=1, cart_items=rows, orders=rows, crew=5)
+            customer = seed['customers'][0]
+            cases = [
+                ('menu items',
+                 lambda: MenuItem.objects.select_related('category').order_by('price', 'id'),
+                 lambda queryset: MenuItemSerializer(queryset, many=True).data,
+                 lambda: MenuItem.objects.order_by('price', 'id').values(*MENU_ITEM_VALUES),
+                 serialize_menu_items),
+                ('orders',
+                 lambda: Order.objects.select_related('user', 'delivery_crew'),
+                 lambda queryset: OrderSerializer(queryset, many=True).data,
+                 lambda: Order.objects.values(*ORDER_VALUES),
+                 serialize_orders),
+                ('cart',
+                 lambda: Cart.objects.filter(user=customer).select_related('user', 'menuitem__category'),
+                 lambda queryset: CartSerializer(queryset, many=True).data,
+                 lambda: Cart.objects.filter(user=customer).values(*CART_VALUES),
+                 serialize_cart),
+            ]
+            for name, instances, model_serialize, values, fast_serialize in cases:
+                loaded_instances, loaded_values = list(instances()), list(values())
+                results[name] = {
+                    'rows': len(loaded_values),
+                    'identical_json': renderer.render(model_serialize(loaded_instances)) == renderer.render(fast_serialize(loaded_values)),
+                    'serialize_rows_per_second': {
+                        'before': self.rate(lambda: model_serialize(loaded_instances), len(loaded_values), repeat),
+                        'after': self.rate(lambda: fast_serialize(loaded_values), len(loaded_values), repeat),
+                    },
+                    'end_to_end_rows_per_second': {
+                        'before': self.rate(lambda: renderer.render(model_serialize(instances())), len(loaded_values), repeat),
+                        'after': self.rate(lambda: renderer.render(fast_serialize(values())), len(loaded_values), repeat),
+                    },
+                }
+                for measure in ('serialize_rows_per_second', 'end_to_end_rows_per_second'):
+                    before, after = results[name][measure]['before'], results[name][measure]['after']
+                    results[name][measure]['speedup'] = round(after / before, 2)
+                    self.stdout.write(f'{name:<12} {measure:<28} before {before:>10.0f} after {after:>10.0f} ({after / before:.2f}x)')
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': rows,
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    #best rows per second over `repeat` runs of func
+    def rate(self, func, rows, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return round(rows / best, 1)
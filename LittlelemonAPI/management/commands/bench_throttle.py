@@ -0,0 +1,137 @@
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import django
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework import throttling as drf_throttling
+from rest_framework.throttling import SimpleRateThrottle
+
+from LittlelemonAPI import throttling
+from LittlelemonAPI.throttling import ThrottleStore
+
+
+def _request(pk):
+    return SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=pk), META={})
+
+
+class Command(BaseCommand):
+    help = ('Compares the shared GCRA throttle (LittlelemonAPI/throttling.py) with DRF\'s UserRateThrottle on the '
+            'locmem and file-based caches: the cost of one check over KEYS users, and how many requests per user '
+            'get through when several worker processes share the traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=10000)
+        parser.add_argument('--rounds', type=int, default=5, help='Requests per key in the single-process measurement.')
+        parser.add_argument('--seconds', type=float, default=30,
+                            help='Stop a single-process measurement after this long (the file-based cache lists its '
+                                 'whole directory on every write).')
+        parser.add_argument('--rate', default='20/minute', help='Throttle rate of the measured scope.')
+        parser.add_argument('--workers', type=int, default=4, help='Processes in the multi-worker measurement.')
+        parser.add_argument('--shared-keys', type=int, default=200, help='Users in the multi-worker measurement.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        if min(options['keys'], options['rounds'], options['workers'], options['shared_keys']) < 1:
+            raise CommandError('--keys, --rounds, --workers and --shared-keys must be at least 1.')
+        directory = tempfile.mkdtemp(prefix='littlelemon-throttle-')
+        rates = {'user': options['rate'], 'anon': options['rate']}
+        results = {}
+        try:
+            with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates):
+                for name, make_throttle in self.backends(directory):
+                    checks = self.measure(make_throttle, options['keys'], options['rounds'], options['seconds'])
+                    allowed = self.share(make_throttle, options['shared_keys'], options['workers'], options['rate'])
+                    results[name] = {**checks, **allowed}
+                    self.stdout.write(
+                        f"{name:<14} {checks['microseconds_per_check']:>8.1f} us/check {checks['checks_per_second']:>10.0f} checks/s  "
+                        f"{options['workers']} workers let through {allowed['max_allowed_per_key']} requests per key (limit {allowed['limit']})")
+        finally:
+            shutil.rmtree(directory)
+
+        run = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'keys': options['keys'],
+            'rate': options['rate'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+
+    def backends(self, directory):
+        locmem = LocMemCache('bench-throttle', {'OPTIONS': {'MAX_ENTRIES': 10 ** 7}})
+        filebased = FileBasedCache(os.path.join(directory, 'cache'), {'OPTIONS': {'MAX_ENTRIES': 10 ** 7}})
+        store = ThrottleStore(os.path.join(directory, 'throttle.sqlite3'))
+
+        def stock(cache):
+            throttle = type('StockThrottle', (drf_throttling.UserRateThrottle,), {'cache': cache})
+            return throttle
+
+        def shared():
+            #the throttle classes read the module's store at check time
+            throttling.throttle_store = store
+            return throttling.UserRateThrottle
+
+        return [
+            ('drf locmem', lambda: stock(locmem)),
+            ('drf filebased', lambda: stock(filebased)),
+            ('shared gcra', shared),
+        ]
+
+    #cost of `rounds` checks for each of `keys` users, interleaved as real traffic would be, within `seconds`
+    def measure(self, make_throttle, keys, rounds, seconds):
+        throttle_class = make_throttle()
+        requests = [_request(pk) for pk in range(keys)]
+        checks = 0
+        started = time.perf_counter()
+        while checks < keys * rounds and time.perf_counter() - started < seconds:
+            for request in requests[checks % keys:checks % keys + 100]:
+                throttle_class().allow_request(request, None)
+                checks += 1
+        elapsed = time.perf_counter() - started
+        return {
+            'checks': checks,
+            'microseconds_per_check': round(elapsed / checks * 10 ** 6, 2),
+            'checks_per_second': round(checks / elapsed, 1),
+        }
+
+    #`workers` forked processes each send the limit's worth of requests for every one of `keys` fresh users;
+    #a limit shared by the workers lets `limit` requests per user through in total
+    def share(self, make_throttle, keys, workers, rate):
+        limit = int(rate.split('/')[0])
+        throttle_class = make_throttle()
+        offset = 10 ** 9  #users not seen by measure()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        #forked, so the throttle class and the stores need no pickling; each worker inherits this process's state
+        processes = [
+            context.Process(target=lambda: results.put(_allowed(throttle_class, offset, keys, limit))) for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        counts = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        per_key = [sum(count[pk] for count in counts) for pk in range(keys)]
+        return {'limit': limit, 'max_allowed_per_key': max(per_key), 'mean_allowed_per_key': round(sum(per_key) / keys, 2)}
+
+
+def _allowed(throttle_class, offset, keys, limit):
+    counts = [0] * keys
+    for pk in range(keys):
+        request = _request(offset + pk)
+        for _ in range(limit):
+            counts[pk] += throttle_class().allow_request(request, None)
+    return counts
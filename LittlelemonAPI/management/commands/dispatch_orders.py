@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlelemonAPI.dispatch import MAX_OPEN_DELIVERIES, dispatch_orders
+
+
+class Command(BaseCommand):
+    help = ('Assigns the oldest unassigned, undelivered orders to the least loaded active delivery crew members, '
+            f'up to DISPATCH_MAX_OPEN_DELIVERIES ({MAX_OPEN_DELIVERIES}) open orders each, as POST /api/dispatch does. '
+            'Meant to run periodically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Assign at most this many orders.')
+
+    def handle(self, *args, **options):
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit must be at least 1.')
+        assignments = dispatch_orders(options['limit'])
+        for pk, ids in assignments.items():
+            self.stdout.write(f'crew member {pk}: {len(ids)} orders')
+        self.stdout.write(self.style.SUCCESS(f'Assigned {sum(len(ids) for ids in assignments.values())} orders.'))
@@ -0,0 +1,28 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ParseError
+
+from LittlelemonAPI.menu_import import import_menu_items, read_menu_file
+
+
+class Command(BaseCommand):
+    help = ('Imports menu items from a JSON list or a CSV file (by extension) with title, price, featured and category '
+            'columns, as POST /api/menu-items/import does: items are matched by title and categories by slug, both '
+            'created when missing, in one transaction. Invalid rows are reported and skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON or .csv file to import.')
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_menu_file(options['path'])
+            result = import_menu_items(rows)
+        except (OSError, ValueError, csv.Error, ParseError) as exc:
+            raise CommandError(f'Cannot import {options["path"]}: {exc}')
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} and updated {result['updated']} menu items, "
+            f"created {result['categories_created']} categories, skipped {len(result['errors'])} rows."))
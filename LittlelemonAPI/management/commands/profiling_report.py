@@ -0,0 +1,48 @@
+import json
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittlelemonAPI.profiling import summarize_records
+
+
+class Command(BaseCommand):
+    help = ('Prints the per-view profiling breakdown collected by ProfilingMiddleware, fetched from a running '
+            "server's /api/profiling endpoint or read from a saved dump.")
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--url', help='Profiling endpoint of a running server, e.g. http://127.0.0.1:8000/api/profiling')
+        source.add_argument('--file', help='JSON dump saved earlier with --output.')
+        parser.add_argument('--token', help='API token of an admin user, required with --url.')
+        parser.add_argument('--output', help='Save the raw records to this JSON file.')
+        parser.add_argument('--clear', action='store_true', help="Empty the server's buffer after reading it.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            records = self.fetch(options['url'], options['token'], options['clear'])
+        else:
+            with open(options['file']) as dump:
+                records = json.load(dump)['records']
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'records': records}, output, indent=2)
+
+        self.stdout.write(f"{'view':<45} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'db ms':>8} "
+                          f"{'queries':>8} {'dupes':>6} {'ser ms':>8}")
+        for view, row in summarize_records(records).items():
+            self.stdout.write(f"{view:<45} {row['requests']:>6} {row['wall_ms_p50']:>9.3f} {row['wall_ms_p95']:>9.3f} "
+                              f"{row['db_ms_avg']:>8.3f} {row['queries_avg']:>8} {row['duplicate_queries_avg']:>6} "
+                              f"{row['serialization_ms_avg']:>8.3f}")
+
+    def fetch(self, url, token, clear):
+        if not token:
+            raise CommandError('--token is required with --url.')
+        headers = {'Authorization': f'Token {token}', 'Accept': 'application/json'}
+        separator = '&' if '?' in url else '?'
+        with urlopen(Request(f'{url}{separator}raw=1', headers=headers)) as response:
+            records = json.load(response)['records']
+        if clear:
+            urlopen(Request(url, headers=headers, method='DELETE')).close()
+        return records
@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify
+
+from LittlelemonAPI.menu_snapshot import CATEGORY_PREFIX, publish_menu_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the pre-serialized menu snapshot served by /api/menu and publishes it to the cache; run it '
+            'at deploy time. With the file-based cache (LITTLELEMON_CACHE_DIR) every worker serves it at once, '
+            'with the default local-memory cache each worker builds its own copy on its first read.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Also write every slice to a JSON file in this directory.')
+
+    def handle(self, *args, **options):
+        snapshot = publish_menu_snapshot()
+        for name, body in sorted(snapshot.items()):
+            self.stdout.write(f'{name:<40} {len(body):>10} bytes')
+        if options['output']:
+            os.makedirs(options['output'], exist_ok=True)
+            for name, body in snapshot.items():
+                if name.startswith(CATEGORY_PREFIX):
+                    name = 'category-' + (slugify(name.removeprefix(CATEGORY_PREFIX)) or 'untitled')
+                with open(os.path.join(options['output'], f'{name}.json'), 'wb') as output:
+                    output.write(body)
+        self.stdout.write(self.style.SUCCESS(f'Published {len(snapshot)} menu snapshot slices.'))
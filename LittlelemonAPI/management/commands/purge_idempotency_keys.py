@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from LittlelemonAPI.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = ('Deletes the stored responses of Idempotency-Key requests older than IDEMPOTENCY_KEY_TTL. '
+            'Meant to run periodically.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Deleted {purge_expired_keys()} expired idempotency keys.'))
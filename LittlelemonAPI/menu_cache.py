@@ -0,0 +1,89 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.http import parse_etags
+
+#Response cache for the menu_items listing.
+#Every cached page is keyed by the menu version plus the normalized query params, so a single
+#bump of the version (see signals.py) makes every cached page unreachable at once instead of
+#having to find and delete them one by one. A change bumps the version at once and again when its
+#transaction commits: a reader that came in between read the old rows and cached them under the first bump.
+
+MENU_VERSION_KEY = 'littlelemon:menu:version'
+MENU_LISTING_PARAMS = ('category', 'featured', 'from_price', 'to_price', 'search', 'ordering', 'perpage', 'page', 'cursor')
+MENU_LISTING_DEFAULTS = {'perpage': '2', 'page': '1'}
+
+#cached pages only live as long as this timeout as a safety net
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+
+
+#the version key never expires in a cache the workers share; in a per-process (local-memory) one the other
+#workers never see a bump, so it expires with the pages and the ETags change at least that often
+def _version_timeout():
+    if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+        return MENU_CACHE_TIMEOUT
+    return None
+
+
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        #seeded from the clock so that a version lost to eviction or a restart never
+        #comes back with a value some stale page was cached under
+        cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=_version_timeout())
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    cache.set(MENU_VERSION_KEY, time.time_ns(), timeout=_version_timeout())
+
+
+#runs `func` once the current transaction commits, unless it is queued already from the same savepoint (which
+#is rolled back with this change or not at all), so the rows one atomic block changes run it once
+def on_commit_once(func):
+    savepoints = set(connection.savepoint_ids)
+    if any(queued is func and sids == savepoints for sids, queued, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(func)
+
+
+#call from inside the transaction that changed the menu (signals.py, menu_import.py)
+def invalidate_menu():
+    bump_menu_version()
+    on_commit_once(bump_menu_version)
+
+
+#the listing params as the view reads them: values are kept as they are (filter_menu_items matches them
+#as given, so 'dish' and 'dish ' are different listings) and only an absent param takes its default;
+#an absent param (None) and an empty one ('') are kept apart: an empty cursor selects keyset mode and an
+#empty perpage or page is refused
+def normalize_listing_params(query_params):
+    params = []
+    for name in MENU_LISTING_PARAMS:
+        value = query_params.get(name)
+        if value is None:
+            value = MENU_LISTING_DEFAULTS.get(name)
+        params.append((name, value))
+    return params
+
+
+#returns (cache key, etag) for a listing request; both change whenever the menu version does
+def listing_cache_key(query_params):
+    version = get_menu_version()
+    digest = hashlib.md5(repr(normalize_listing_params(query_params)).encode()).hexdigest()
+    key = f'littlelemon:menu:listing:{version}:{digest}'
+    etag = f'"menu-{version}-{digest[:16]}"'
+    return key, etag
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    #weak comparison, as If-None-Match requires
+    return '*' in etags or etag in [tag.removeprefix('W/') for tag in etags]
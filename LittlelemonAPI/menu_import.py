@@ -0,0 +1,110 @@
+import codecs
+import csv
+import json
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .menu_cache import invalidate_menu, on_commit_once
+from .menu_snapshot import publish_menu_snapshot
+from .models import Category, MenuItem
+from .serializers import MenuItemImportSerializer
+
+#Bulk menu import.
+#A whole menu (JSON list or CSV with a header row of title, price, featured, category) is validated row by
+#row, then written in one transaction with a fixed number of queries: categories are resolved by slug in
+#one query and the missing ones created with one bulk insert, menu items are matched by title in one query
+#and written with one bulk insert and one bulk update. Invalid rows are reported and skipped, the valid ones
+#are still imported. Bulk writes send no model signals, so the menu version is bumped here.
+
+IMPORT_BATCH_SIZE = 500
+
+
+#text/csv request bodies for the import endpoint: a list of {column: value} rows
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        try:
+            return read_csv(codecs.getreader(encoding)(stream))
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+
+#rows of a CSV file; empty cells are left out, so the row validation applies its defaults
+def read_csv(lines):
+    return [
+        {column: value for column, value in row.items() if column and value not in ('', None)}
+        for row in csv.DictReader(lines)
+    ]
+
+
+#rows of a JSON or CSV file, by extension (used by the import_menu command)
+def read_menu_file(path):
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if path.lower().endswith('.csv'):
+            return read_csv(source)
+        return json.load(source)
+
+
+#{key: row} of `queryset`; the oldest row wins where keys repeat (slugs and titles are not unique)
+def _by_key(queryset, key):
+    return {getattr(row, key): row for row in queryset.order_by('-id')}
+
+
+#validates `rows` and upserts the valid ones, menu items matched by title; returns the counts and the
+#errors of the rejected rows (numbered from 1, in input order)
+def import_menu_items(rows):
+    if not isinstance(rows, list):
+        raise ParseError('Expected a list of menu items.')
+    valid, errors, seen = [], [], set()
+    for number, row in enumerate(rows, 1):
+        serializer = MenuItemImportSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'errors': serializer.errors})
+        elif serializer.validated_data['title'] in seen:
+            errors.append({'row': number, 'errors': {'title': ['Appears more than once in this import.']}})
+        else:
+            seen.add(serializer.validated_data['title'])
+            valid.append(serializer.validated_data)
+
+    result = {'created': 0, 'updated': 0, 'categories_created': 0, 'errors': errors}
+    if not valid:
+        return result
+
+    with transaction.atomic():
+        #Category.save() slugifies the title; categories created here get the same slug
+        titles = {}
+        for row in valid:
+            titles.setdefault(slugify(row['category']), row['category'])
+        categories = _by_key(Category.objects.filter(slug__in=titles), 'slug')
+        missing = [Category(title=title, slug=slug) for slug, title in titles.items() if slug not in categories]
+        if missing:
+            Category.objects.bulk_create(missing)
+            #read back rather than relying on bulk_create setting primary keys, which not every backend does
+            categories.update(_by_key(Category.objects.filter(slug__in=[category.slug for category in missing]), 'slug'))
+
+        existing = _by_key(MenuItem.objects.filter(title__in=seen), 'title')
+        created, updated = [], []
+        #bulk_update() skips auto_now, the ETags of the items (see conditional.py) have to change
+        now = timezone.now()
+        for row in valid:
+            category = categories[slugify(row['category'])]
+            item = existing.get(row['title'])
+            if item is None:
+                created.append(MenuItem(title=row['title'], price=row['price'], featured=row['featured'], category=category))
+            elif (item.price, item.featured, item.category_id) != (row['price'], row['featured'], category.pk):
+                item.price, item.featured, item.category, item.updated_at = row['price'], row['featured'], category, now
+                updated.append(item)
+        MenuItem.objects.bulk_create(created, batch_size=IMPORT_BATCH_SIZE)
+        MenuItem.objects.bulk_update(updated, ['price', 'featured', 'category', 'updated_at'], batch_size=IMPORT_BATCH_SIZE)
+        if missing or created or updated:
+            invalidate_menu()
+            on_commit_once(publish_menu_snapshot)
+
+    result.update(created=len(created), updated=len(updated), categories_created=len(missing))
+    return result
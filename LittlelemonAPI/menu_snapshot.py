@@ -0,0 +1,81 @@
+import hashlib
+
+from django.core.cache import cache
+
+from .filters import DEFAULT_MENU_ORDERING, MENU_ORDERINGS
+from .menu_cache import MENU_CACHE_TIMEOUT, get_menu_version
+from .models import Category, MenuItem
+from .renderers import FastJSONRenderer
+from .serializers import CategorySerializer, MenuItemSerializer
+
+#Pre-serialized menu snapshot.
+#The whole menu is rendered once per menu version to the exact JSON bytes the API sends, as a set of
+#slices: the full menu, every category's items and the featured items. /api/menu answers from these
+#bytes without touching the ORM or a serializer. All slices of a version are built from the same reads
+#and stored as one cache entry, so a reader never mixes slices of two versions. A change to the menu
+#bumps the version and rebuilds the snapshot once its transaction commits (see signals.py), replacing any
+#built from the old rows while it was running; anything that bumps the version without publishing
+#(eviction) gets it rebuilt by the first read. Snapshots live in the default cache: with the local-memory
+#one, workers other than the writer keep theirs until it expires with the menu version (MENU_CACHE_TIMEOUT,
+#short for that cache, see settings.py).
+
+FULL = 'full'
+FEATURED = 'featured'
+CATEGORY_PREFIX = 'category:'
+
+_renderer = FastJSONRenderer()
+
+
+def _snapshot_key(version):
+    return f'littlelemon:menu:snapshot:{version}'
+
+
+def category_slice(title):
+    return CATEGORY_PREFIX + title
+
+
+def snapshot_etag(version, name):
+    #slice names carry category titles, which are not safe in a header
+    return f'"menu-{version}-{hashlib.md5(name.encode()).hexdigest()[:16]}"'
+
+
+#renders every slice of the current menu: {slice name: JSON bytes}
+def build_menu_snapshot():
+    categories = CategorySerializer(Category.objects.all(), many=True).data
+    items = MenuItemSerializer(
+        MenuItem.objects.select_related('category').order_by(*MENU_ORDERINGS[DEFAULT_MENU_ORDERING]), many=True).data
+
+    by_category = {category['title']: [] for category in categories}
+    for item in items:
+        by_category[item['category']['title']].append(item)
+
+    snapshot = {
+        FULL: _renderer.render({'categories': categories, 'menu_items': items}),
+        FEATURED: _renderer.render([item for item in items if item['featured']]),
+    }
+    for title, category_items in by_category.items():
+        snapshot[category_slice(title)] = _renderer.render(category_items)
+    return snapshot
+
+
+#(menu version, snapshot) of the current menu, built and published first if nobody has yet
+def get_menu_snapshot():
+    version, snapshot = peek_menu_snapshot()
+    if snapshot is None:
+        snapshot = publish_menu_snapshot(version)
+    return version, snapshot
+
+
+#(menu version, snapshot or None when it has not been published yet), never builds
+def peek_menu_snapshot():
+    version = get_menu_version()
+    return version, cache.get(_snapshot_key(version))
+
+
+#builds the snapshot of `version` (the current one by default) and stores it; the version is read
+#before the menu is, so a change made during the build leaves this snapshot under an outdated key
+def publish_menu_snapshot(version=None):
+    version = get_menu_version() if version is None else version
+    snapshot = build_menu_snapshot()
+    cache.set(_snapshot_key(version), snapshot, MENU_CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+#existing orders start out as last modified when they were placed
+def orders_modified_when_placed(apps, schema_editor):
+    Order = apps.get_model('LittlelemonAPI', 'Order')
+    Order.objects.update(updated_at=models.F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(orders_modified_when_placed, migrations.RunPython.noop),
+    ]
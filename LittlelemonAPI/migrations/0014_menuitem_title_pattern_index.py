@@ -0,0 +1,24 @@
+from django.db import migrations
+
+#PostgreSQL only: the prefix search (see filters.py) runs LIKE 'prefix%' on lower(title) there, which only an
+#index with the pattern operator class can serve whatever the database's collation
+def create_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        table = schema_editor.quote_name(apps.get_model('LittlelemonAPI', 'MenuItem')._meta.db_table)
+        schema_editor.execute(f'CREATE INDEX menuitem_title_pattern_idx ON {table} (lower("title") text_pattern_ops)')
+
+
+def drop_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS menuitem_title_pattern_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittlelemonAPI', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pattern_index, drop_pattern_index),
+    ]
@@ -2,10 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.utils import timezone
+from django.db.models.functions import Lower
 
 class Category(models.Model):
     slug = models.SlugField(blank=True)
     title = models.CharField(max_length=255, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)  # validator of conditional requests, see conditional.py
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -19,7 +21,16 @@ class MenuItem(models.Model):
     title=models.CharField(max_length=255,db_index=True)
     price=models.DecimalField(max_digits=6,decimal_places=2,db_index=True)
     featured=models.BooleanField(db_index=True)
-    category=models.ForeignKey(Category,on_delete=models.PROTECT)
+    category=models.ForeignKey(Category,on_delete=models.PROTECT,db_index=False) #covered by the (category, price) index
+    updated_at=models.DateTimeField(auto_now=True) #validator of conditional requests, see conditional.py
+
+    class Meta:
+        #back the menu_items filters and orderings, see filters.py
+        indexes=[
+            models.Index(fields=['category','price'],name='menuitem_category_price_idx'),
+            models.Index(fields=['featured','price'],name='menuitem_featured_price_idx'),
+            models.Index(Lower('title'),name='menuitem_title_lower_idx'),
+        ]
 
 
 class Cart(models.Model):
@@ -38,12 +49,29 @@ class Cart(models.Model):
         unique_together=('menuitem','user')
     
 
+#Per-user cart totals, maintained incrementally with every cart write (see cart_summary.py)
+#so the cart badge and checkout never have to aggregate over the cart rows
+class CartSummary(models.Model):
+    user=models.OneToOneField(User,on_delete=models.CASCADE,primary_key=True)
+    item_count=models.IntegerField(default=0) #sum of the quantities in the cart
+    subtotal=models.DecimalField(max_digits=6,decimal_places=2,default=0)
+    
+
 class Order(models.Model):
     user=models.ForeignKey(User,on_delete=models.CASCADE)
-    delivery_crew=models.ForeignKey(User,on_delete=models.SET_NULL,related_name="delivery_crew",null=True) #models.SET_NULL means that if a User is deleted, the delivery_crew field in the related model instances will be set to NULL.
+    delivery_crew=models.ForeignKey(User,on_delete=models.SET_NULL,related_name="delivery_crew",null=True,db_index=False) #models.SET_NULL means that if a User is deleted, the delivery_crew field in the related model instances will be set to NULL. Covered by the (delivery_crew, status) index
     status=models.BooleanField(db_index=True,default=0)
     total=models.DecimalField(max_digits=6,decimal_places=2)
     date=models.DateTimeField(default=timezone.now,db_index=True)
+    updated_at=models.DateTimeField(auto_now=True) #validator of conditional requests, see conditional.py
+
+    class Meta:
+        indexes=[
+            #a crew member's orders and open deliveries (order_management, /api/deliveries)
+            models.Index(fields=['delivery_crew','status'],name='order_crew_status_idx'),
+            #the dispatch queue, oldest first: only unassigned, undelivered orders are in it (see dispatch.py)
+            models.Index(fields=['date','id'],name='order_dispatch_queue_idx',condition=models.Q(delivery_crew__isnull=True,status=False)),
+        ]
 
 
 class OrderItem(models.Model):
@@ -58,4 +86,88 @@ class OrderItem(models.Model):
         super(OrderItem, self).save(*args, **kwargs)
 
     class Meta:
-        unique_together=('order','menuitem')
\ No newline at end of file
+        unique_together=('order','menuitem')
+
+#Orders moved out of the hot Order/OrderItem tables by `manage.py archive_orders` (see archive.py).
+#Rows keep the id they had, so /api/orders/<id> finds an order in either place.
+class ArchivedOrder(models.Model):
+    id=models.BigIntegerField(primary_key=True)
+    user=models.ForeignKey(User,on_delete=models.CASCADE,related_name='archived_orders',db_index=False) #covered by the (user, date) index
+    delivery_crew=models.ForeignKey(User,on_delete=models.SET_NULL,related_name='archived_deliveries',null=True,db_index=False) #covered by the (delivery_crew, date) index
+    status=models.BooleanField(default=0)
+    total=models.DecimalField(max_digits=6,decimal_places=2)
+    date=models.DateTimeField(db_index=True)
+    archived_at=models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        #back the date-range listing of /api/orders/archive for every role
+        indexes=[
+            models.Index(fields=['user','date'],name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew','date'],name='archivedorder_crew_date_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id=models.BigIntegerField(primary_key=True)
+    order=models.ForeignKey(ArchivedOrder,on_delete=models.CASCADE,related_name='items')
+    menuitem=models.ForeignKey(MenuItem,on_delete=models.CASCADE)
+    quantity=models.SmallIntegerField()
+    unit_price=models.DecimalField(max_digits=6,decimal_places=2)
+    price=models.DecimalField(max_digits=6,decimal_places=2)
+
+    class Meta:
+        unique_together=('order','menuitem')
+
+
+#Responses of requests sent with an Idempotency-Key header, replayed when the same user sends the key again
+#within IDEMPOTENCY_KEY_TTL (see idempotency.py)
+class IdempotencyKey(models.Model):
+    user=models.ForeignKey(User,on_delete=models.CASCADE,db_index=False) #covered by the (user, key) unique index
+    key=models.CharField(max_length=255)
+    fingerprint=models.CharField(max_length=64) #sha256 of the method, path and body the key was first used with
+    status_code=models.PositiveSmallIntegerField(null=True)
+    response=models.JSONField(null=True)
+    created_at=models.DateTimeField(default=timezone.now,db_index=True)
+
+    class Meta:
+        unique_together=('user','key')
+
+
+#Daily sales rollups behind the /api/reports endpoints, maintained with every order write (see rollups.py).
+#Everything is counted on the day the order was placed, so a rebuild from the order tables gives the same rows.
+class DailySales(models.Model):
+    day=models.DateField(primary_key=True)
+    orders=models.IntegerField(default=0)
+    items=models.IntegerField(default=0) #sum of the ordered quantities
+    revenue=models.DecimalField(max_digits=12,decimal_places=2,default=0)
+    delivered=models.IntegerField(default=0)
+
+
+class DailyMenuItemSales(models.Model):
+    day=models.DateField()
+    menuitem=models.ForeignKey(MenuItem,on_delete=models.CASCADE)
+    quantity=models.IntegerField(default=0)
+    revenue=models.DecimalField(max_digits=12,decimal_places=2,default=0)
+
+    class Meta:
+        unique_together=('day','menuitem')
+
+
+class DailyCategorySales(models.Model):
+    day=models.DateField()
+    category=models.ForeignKey(Category,on_delete=models.CASCADE)
+    quantity=models.IntegerField(default=0)
+    revenue=models.DecimalField(max_digits=12,decimal_places=2,default=0)
+
+    class Meta:
+        unique_together=('day','category')
+
+
+class DailyCrewSales(models.Model):
+    day=models.DateField()
+    delivery_crew=models.ForeignKey(User,on_delete=models.CASCADE)
+    orders=models.IntegerField(default=0) #orders assigned to the crew member
+    delivered=models.IntegerField(default=0)
+
+    class Meta:
+        unique_together=('day','delivery_crew')
@@ -0,0 +1,91 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+#Keyset (cursor) pagination.
+#Instead of COUNT(*) + OFFSET, every page is read with a range condition on an indexed column
+#plus the primary key as a tie breaker, so a page deep into the listing costs the same as the first one.
+#The cursor handed to the client is the (value, id) pair of the last row it has seen.
+
+CURSOR_PARAM = 'cursor'
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([str(value), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return field.to_python(value), int(pk)
+    except Exception:
+        raise NotFound('Invalid cursor.')
+
+
+def parse_page_size(value, name='perpage'):
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: ['A valid integer is required.']})
+    if page_size < 1:
+        raise ValidationError({name: ['Ensure this value is greater than or equal to 1.']})
+    return page_size
+
+
+#returns (rows of the page, link to the next page or None) for `queryset` ordered by (field_name, id);
+#a leading '-' on field_name walks the listing in descending order
+def paginate_by_cursor(request, queryset, field_name, page_size):
+    queryset, field = _cursor_queryset(request, queryset, field_name)
+    #one extra row tells whether there is a next page without a COUNT query
+    rows = list(queryset[:page_size + 1])
+    return _cursor_page(request, rows, field, page_size)
+
+
+#paginate_by_cursor for the async views, `request` is a plain HttpRequest
+async def apaginate_by_cursor(request, queryset, field_name, page_size):
+    queryset, field = _cursor_queryset(request, queryset, field_name)
+    rows = [row async for row in queryset[:page_size + 1].aiterator()]
+    return _cursor_page(request, rows, field, page_size)
+
+
+def _cursor_queryset(request, queryset, field_name):
+    descending = field_name.startswith('-')
+    field_name = field_name.lstrip('-')
+    field = queryset.model._meta.get_field(field_name)
+
+    if descending:
+        queryset = queryset.order_by('-' + field_name, '-id')
+    else:
+        queryset = queryset.order_by(field_name, 'id')
+
+    cursor = request.GET.get(CURSOR_PARAM)
+    if cursor:
+        value, pk = decode_cursor(cursor, field)
+        #`field >= value` keeps the condition a plain range scan on the field's index,
+        #the OR only breaks ties between rows sharing the same value
+        if descending:
+            queryset = queryset.filter(**{field_name + '__lte': value}).filter(
+                Q(**{field_name + '__lt': value}) | Q(id__lt=pk))
+        else:
+            queryset = queryset.filter(**{field_name + '__gte': value}).filter(
+                Q(**{field_name + '__gt': value}) | Q(id__gt=pk))
+    return queryset, field
+
+
+def _cursor_page(request, rows, field, page_size):
+    next_link = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            #.values() rows
+            next_cursor = encode_cursor(last[field.attname], last['id'])
+        else:
+            next_cursor = encode_cursor(field.value_from_object(last), last.pk)
+        next_link = replace_query_param(request.get_full_path(), CURSOR_PARAM, next_cursor)
+    return rows, next_link
@@ -0,0 +1,180 @@
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+#Sampled per-view profiling.
+#ProfilingMiddleware picks PROFILING_SAMPLE_RATE of the requests and records, per resolved view, wall
+#time, time spent in the database, the number of queries, how many of them repeated an earlier query of
+#the same request and the time spent building serializer data. Records are kept in an in-process ring
+#buffer of PROFILING_BUFFER_SIZE entries, read through the admin-only /api/profiling endpoint and
+#formatted by `manage.py profiling_report`. A request that is not sampled costs one random() call.
+
+_records = deque(maxlen=getattr(settings, 'PROFILING_BUFFER_SIZE', 1000))
+_current = ContextVar('littlelemon_profile', default=None)
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.queries = 0
+        self.duplicates = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+        self._seen = set()
+
+    #django.db execute wrapper: counts and times every query run while the request is profiled
+    def __call__(self, execute, sql, params, many, context):
+        key = (sql, repr(params))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+        self.queries += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+
+
+#times `func` as serialization work of the profiled request; calls made from inside another timed call
+#(nested serializers) are not counted twice
+def profiled_serialization(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.serializing:
+            return func(*args, **kwargs)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.serialization_time += time.perf_counter() - started
+            profile.serializing = False
+    return wrapper
+
+
+#the .data of a DRF serializer, timed as serialization work; the views read serializer data through it
+#(the read-only list functions in fast_serializers.py are decorated with profiled_serialization instead)
+@profiled_serialization
+def serializer_data(serializer):
+    return serializer.data
+
+
+class ProfilingMiddleware:
+    #runs in whichever mode the handler does, so ASGI requests don't take a thread hop for it
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                _wrap_connections(stack, profile)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, profile, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        #database connections belong to the thread the async ORM runs queries on, so the wrappers are
+        #installed and removed there
+        stack = ExitStack()
+        try:
+            await sync_to_async(_wrap_connections)(stack, profile)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        self.record(request, response, profile, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, profile, wall_time):
+        match = getattr(request, 'resolver_match', None)
+        _records.append({
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'time': timezone.now().isoformat(),
+            'wall_ms': round(wall_time * 1000, 3),
+            'db_ms': round(profile.db_time * 1000, 3),
+            'queries': profile.queries,
+            'duplicate_queries': profile.duplicates,
+            'serialization_ms': round(profile.serialization_time * 1000, 3),
+        })
+
+
+def _wrap_connections(stack, profile):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def get_records():
+    return list(_records)
+
+
+def clear_records():
+    _records.clear()
+
+
+#per-view aggregates of `records` (all buffered records by default)
+def summarize_records(records=None):
+    records = get_records() if records is None else records
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record['view']].append(record)
+
+    summary = {}
+    for view, view_records in sorted(by_view.items(), key=lambda entry: str(entry[0])):
+        count = len(view_records)
+        wall = [record['wall_ms'] for record in view_records]
+        summary[str(view)] = {
+            'requests': count,
+            'wall_ms_p50': percentile(wall, 50),
+            'wall_ms_p95': percentile(wall, 95),
+            'wall_ms_max': max(wall),
+            'db_ms_avg': round(sum(record['db_ms'] for record in view_records) / count, 3),
+            'queries_avg': round(sum(record['queries'] for record in view_records) / count, 2),
+            'duplicate_queries_avg': round(sum(record['duplicate_queries'] for record in view_records) / count, 2),
+            'serialization_ms_avg': round(sum(record['serialization_ms'] for record in view_records) / count, 3),
+        }
+    return summary
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: without it FastJSONRenderer is DRF's JSONRenderer
+    orjson = None
+
+#JSON rendering with orjson.
+#DRF's JSONRenderer runs the stdlib encoder, which calls back into Python for every Decimal, datetime and
+#lazy string, then copies the result twice (escaping U+2028/U+2029, encoding to UTF-8). FastJSONRenderer
+#encodes natively to UTF-8 bytes and hands only the types orjson does not know, or must not encode its own
+#way (Decimal, datetime, date, time, dataclasses), to DRF's encoder, so the bytes are the ones JSONRenderer
+#produces. Indented output (the browsable API, ?indent=) and anything orjson refuses (integers beyond 64 bits)
+#go through JSONRenderer. Not covered: non-finite floats render as null where JSONRenderer raises, and
+#floats of 1e16 and above are written without the '+' of their exponent.
+
+_OPTIONS = 0 if orjson is None else (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+
+_encoder_default = JSONEncoder().default
+
+
+#Decimals are the most common fallback by far (money in values() rows); they skip the isinstance() chain of
+#JSONEncoder.default, which renders them as floats too
+def _default(obj):
+    if type(obj) is Decimal:
+        return float(obj)
+    return _encoder_default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            #let JSONRenderer render it, or raise its error
+            return super().render(data, accepted_media_type, renderer_context)
+        #as JSONRenderer does, keep the output a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+#Role resolution.
+#A user's group names are loaded once per request (memoized on the user object) and kept for a short
+#time in the cache between requests. Group names are compared lower-cased, so the 'Manager' and
+#'manager' spellings used across the views resolve to the same role.
+
+MANAGER = 'manager'
+DELIVERY_CREW = 'delivery-crew'
+
+ROLES_VERSION_KEY = 'littlelemon:roles:version'
+ROLES_CACHE_TIMEOUT = getattr(settings, 'ROLES_CACHE_TIMEOUT', 60)
+
+
+def _roles_version():
+    version = cache.get(ROLES_VERSION_KEY)
+    if version is None:
+        cache.add(ROLES_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(ROLES_VERSION_KEY)
+    return version
+
+
+#called on any group membership change (see signals.py); every cached role set becomes unreachable
+def invalidate_roles():
+    cache.set(ROLES_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _roles_cache_key(user):
+    return f'littlelemon:roles:{_roles_version()}:{user.pk}'
+
+
+def get_roles(user):
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_littlelemon_roles', None)
+    if roles is None:
+        key = _roles_cache_key(user)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(name.lower() for name in user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+        user._littlelemon_roles = roles
+    return roles
+
+
+#get_roles for the async views; once it has run, the sync helpers below answer from the memoized set
+#without touching the database. The cache is called directly: the configured backends are in-process
+#or on local disk, and their async methods would only hand the same call to a thread.
+async def aget_roles(user):
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_littlelemon_roles', None)
+    if roles is None:
+        key = _roles_cache_key(user)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset([name.lower() async for name in user.groups.values_list('name', flat=True)])
+            cache.set(key, roles, ROLES_CACHE_TIMEOUT)
+        user._littlelemon_roles = roles
+    return roles
+
+
+def has_role(user, *roles):
+    return not get_roles(user).isdisjoint(roles)
+
+
+def is_manager(user):
+    return has_role(user, MANAGER)
+
+
+def is_delivery_crew(user):
+    return has_role(user, DELIVERY_CREW)
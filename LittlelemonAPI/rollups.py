@@ -0,0 +1,211 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, DailyCategorySales, DailyCrewSales, DailyMenuItemSales, DailySales, Order,
+    OrderItem,
+)
+
+#Daily sales rollups.
+#Every order write adds its change to the rollup rows of the day the order was placed, inside the same
+#transaction: checkout adds the order, order_detail moves it between days, crew members and statuses, and
+#deleting it takes it out again. The reports then read O(days) rows instead of O(orders).
+#`manage.py backfill_rollups` rebuilds every rollup from the order tables, archive included.
+
+ROLLUP_MODELS = (DailySales, DailyMenuItemSales, DailyCategorySales, DailyCrewSales)
+
+
+#adds `deltas` ({key tuple: {field: delta}}) to the rows of `model` identified by `key_fields`, creating
+#missing rows, in three queries however many rows change. The rows are inserted empty first and then
+#locked before they are read, so concurrent writers add to each other's totals instead of overwriting them.
+#Must run inside a transaction.
+def _increment(model, key_fields, deltas):
+    deltas = {key: {field: delta for field, delta in values.items() if delta} for key, values in deltas.items()}
+    deltas = {key: values for key, values in deltas.items() if values}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        #a single row (the day's sales, a crew member's day) is one atomic UPDATE once it exists
+        (key, values), = deltas.items()
+        match = dict(zip(key_fields, key))
+        increments = {field: F(field) + delta for field, delta in values.items()}
+        if not model.objects.filter(**match).update(**increments):
+            model.objects.bulk_create([model(**match)], ignore_conflicts=True)
+            model.objects.filter(**match).update(**increments)
+        return
+    fields = sorted({field for values in deltas.values() for field in values})
+    model.objects.bulk_create([model(**dict(zip(key_fields, key))) for key in deltas], ignore_conflicts=True)
+    lookup = {f'{field}__in': {key[i] for key in deltas} for i, field in enumerate(key_fields)}
+    rows = []
+    for row in model.objects.select_for_update().filter(**lookup):
+        values = deltas.get(tuple(getattr(row, field) for field in key_fields))
+        if values:
+            for field, delta in values.items():
+                setattr(row, field, getattr(row, field) + delta)
+            rows.append(row)
+    model.objects.bulk_update(rows, fields)
+
+
+class _Deltas:
+
+    def __init__(self):
+        self.sales = defaultdict(lambda: defaultdict(int))
+        self.menu_items = defaultdict(lambda: defaultdict(int))
+        self.categories = defaultdict(lambda: defaultdict(int))
+        self.crew = defaultdict(lambda: defaultdict(int))
+
+    #the order itself: (day, total, status, delivery_crew_id) as returned by order_state
+    def add_order(self, state, sign):
+        day, total, status, crew_id = state
+        delivered = sign if status else 0
+        sales = self.sales[(day,)]
+        sales['orders'] += sign
+        sales['revenue'] += sign * total
+        sales['delivered'] += delivered
+        if crew_id is not None:
+            crew = self.crew[(day, crew_id)]
+            crew['orders'] += sign
+            crew['delivered'] += delivered
+
+    #its items: dicts with menuitem_id, category_id, quantity and price
+    def add_items(self, day, items, sign):
+        for item in items:
+            self.sales[(day,)]['items'] += sign * item['quantity']
+            for rollup, key in ((self.menu_items, (day, item['menuitem_id'])), (self.categories, (day, item['category_id']))):
+                rollup[key]['quantity'] += sign * item['quantity']
+                rollup[key]['revenue'] += sign * item['price']
+
+    def apply(self):
+        _increment(DailySales, ('day',), self.sales)
+        _increment(DailyMenuItemSales, ('day', 'menuitem_id'), self.menu_items)
+        _increment(DailyCategorySales, ('day', 'category_id'), self.categories)
+        _increment(DailyCrewSales, ('day', 'delivery_crew_id'), self.crew)
+
+
+#what the rollups count of an order: (day, total, delivered, delivery_crew_id)
+def order_state(order):
+    return timezone.localdate(order.date), order.total, bool(order.status), order.delivery_crew_id
+
+
+#order_state of the stored order, whose row stays locked until the transaction ends; taken before
+#order_detail changes an order and passed to record_order_change, so concurrent edits cannot both
+#subtract the same old state
+def locked_order_state(order):
+    row = Order.objects.select_for_update().values('date', 'total', 'status', 'delivery_crew_id').get(pk=order.pk)
+    return timezone.localdate(row['date']), row['total'], bool(row['status']), row['delivery_crew_id']
+
+
+def _order_items(order):
+    return list(OrderItem.objects.filter(order=order).values('menuitem_id', 'quantity', 'price', category_id=F('menuitem__category_id')))
+
+
+#a new order and its `items` (dicts with menuitem_id, category_id, quantity and price)
+def record_new_order(order, items):
+    deltas = _Deltas()
+    state = order_state(order)
+    deltas.add_order(state, 1)
+    deltas.add_items(state[0], items, 1)
+    deltas.apply()
+
+
+#an order changed from `before` (its order_state) to its current state
+def record_order_change(before, order):
+    after = order_state(order)
+    if before == after:
+        return
+    deltas = _Deltas()
+    deltas.add_order(before, -1)
+    deltas.add_order(after, 1)
+    if before[0] != after[0]:
+        #its date was edited, the items move to the new day
+        items = _order_items(order)
+        deltas.add_items(before[0], items, -1)
+        deltas.add_items(after[0], items, 1)
+    deltas.apply()
+
+
+#orders that were just given to a delivery crew member, having had none, as (date, status, new delivery_crew_id);
+#only the crew rollup moves
+def record_crew_assignments(orders):
+    deltas = _Deltas()
+    for date, delivered, crew_id in orders:
+        crew = deltas.crew[(timezone.localdate(date), crew_id)]
+        crew['orders'] += 1
+        crew['delivered'] += int(bool(delivered))
+    deltas.apply()
+
+
+#an order about to be deleted
+def record_order_removal(order):
+    deltas = _Deltas()
+    state = locked_order_state(order)
+    deltas.add_order(state, -1)
+    deltas.add_items(state[0], _order_items(order), -1)
+    deltas.apply()
+
+
+#empties the rollups and recounts them from Order/OrderItem and the archive, `batch_size` order ids at a
+#time: each batch is aggregated by the database, so memory stays bounded by the batch, not the history.
+#Runs in one transaction; `progress(orders counted)` is called after every batch.
+def rebuild_rollups(batch_size=1000, progress=None):
+    counted = 0
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.all().delete()
+        for orders, items in ((Order.objects, OrderItem.objects), (ArchivedOrder.objects, ArchivedOrderItem.objects)):
+            bounds = orders.aggregate(low=Min('id'), high=Max('id'))
+            if bounds['low'] is None:
+                continue
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+                deltas = _Deltas()
+                headers = (
+                    orders.filter(id__gte=start, id__lt=start + batch_size)
+                    .annotate(day=TruncDate('date'))
+                    .values('day', 'delivery_crew_id')
+                    .annotate(orders=Count('id'), revenue=Sum('total'), delivered=Count('id', filter=Q(status=True)))
+                )
+                for row in headers:
+                    sales = deltas.sales[(row['day'],)]
+                    sales['orders'] += row['orders']
+                    sales['revenue'] += row['revenue']
+                    sales['delivered'] += row['delivered']
+                    counted += row['orders']
+                    if row['delivery_crew_id'] is not None:
+                        crew = deltas.crew[(row['day'], row['delivery_crew_id'])]
+                        crew['orders'] += row['orders']
+                        crew['delivered'] += row['delivered']
+                batch_items = (
+                    items.filter(order_id__gte=start, order_id__lt=start + batch_size)
+                    .annotate(day=TruncDate('order__date'))
+                    .values('day', 'menuitem_id', category_id=F('menuitem__category_id'))
+                    .annotate(quantity=Sum('quantity'), price=Sum('price'))
+                )
+                for row in batch_items:
+                    deltas.add_items(row['day'], [row], 1)
+                deltas.apply()
+                if progress:
+                    progress(counted)
+    return counted
+
+
+#{'day__gte': ..., 'day__lte': ...} for the ?from= / ?to= dates of a report (both optional, inclusive)
+def parse_day_range(query_params):
+    lookup = {}
+    for name, lookup_name in (('from', 'day__gte'), ('to', 'day__lte')):
+        value = query_params.get(name)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: ['Use the YYYY-MM-DD format.']})
+        lookup[lookup_name] = day
+    return lookup
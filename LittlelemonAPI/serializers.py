@@ -2,11 +2,16 @@ from rest_framework import serializers
 from .models import MenuItem  # replace YourModel with your actual model
 from .models import Category
 from .models import Cart
+from .models import CartSummary
 from .models import Order
 from .models import OrderItem
+from .models import DailySales
 from django.contrib.auth.models import User,Group
 
+from decimal import Decimal
+
 from django.db import IntegrityError
+from django.utils.text import slugify
 
 class GroupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,6 +39,19 @@ class MenuItemSerializer(serializers.ModelSerializer):
         extra_kwargs={
             'price': {'min_value': 2}
         }
+#One row of a bulk menu import (see menu_import.py): the category is given by title or slug and
+#created when no category has its slug; the price bounds are MenuItemSerializer's
+class MenuItemImportSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=2)
+    featured = serializers.BooleanField(default=False)
+    category = serializers.CharField(max_length=255)
+
+    def validate_category(self, value):
+        if not slugify(value):
+            raise serializers.ValidationError("Must contain at least one letter or digit.")
+        return value
+
 class CartSerializer(serializers.ModelSerializer):
     user=UserSerializer(read_only=True)
     # Use PrimaryKeyRelatedField for incoming data and MenuItemSerializer for outgoing data
@@ -61,7 +79,48 @@ class CartSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'non_field_errors': ["A cart item with this user and menu item already exists."]
             }) """
-    
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CartSummary
+        fields = ['item_count', 'subtotal']
+
+#Batch cart updates: a list of {menuitem, quantity} entries validated together.
+#All menu items of the batch are checked with a single IN query; quantity 0 removes the item from the cart.
+#largest value a DecimalField holds, e.g. 9999.99 for max_digits=6, decimal_places=2
+def decimal_field_max(model, name):
+    field = model._meta.get_field(name)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+CART_PRICE_MAX = decimal_field_max(Cart, 'price')
+CART_SUBTOTAL_MAX = decimal_field_max(CartSummary, 'subtotal')
+
+class CartBatchListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        ids = [entry['menuitem'] for entry in attrs]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each menu item may only appear once in a batch.")
+        prices = dict(MenuItem.objects.filter(pk__in=ids).values_list('id', 'price'))
+        missing = [menuitem for menuitem in ids if menuitem not in prices]
+        if missing:
+            raise serializers.ValidationError(f"Invalid menu items: {', '.join(map(str, missing))}.")
+        for entry in attrs:
+            entry['unit_price'] = prices[entry['menuitem']]
+        #the quantity alone is bounded by its column, the price it makes is bounded by Cart.price
+        too_expensive = [entry['menuitem'] for entry in attrs if entry['quantity'] * entry['unit_price'] > CART_PRICE_MAX]
+        if too_expensive:
+            raise serializers.ValidationError(
+                f"The price of these menu items would exceed {CART_PRICE_MAX}: {', '.join(map(str, too_expensive))}.")
+        if sum(entry['quantity'] * entry['unit_price'] for entry in attrs) > CART_SUBTOTAL_MAX:
+            raise serializers.ValidationError(f"The cart subtotal would exceed {CART_SUBTOTAL_MAX}.")
+        return attrs
+
+class CartBatchItemSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, max_value=32767)
+    class Meta:
+        list_serializer_class = CartBatchListSerializer
+
 class OrderSerializer(serializers.ModelSerializer):
     user=UserSerializer(read_only=True)
     delivery_crew = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), write_only=True,allow_null=True)
@@ -92,4 +151,37 @@ class OrderItemSerializer(serializers.ModelSerializer):
         except IntegrityError:
             raise serializers.ValidationError({
                 'non_field_errors': ["A order item with this order and menu item already exists."]
-            })
\ No newline at end of file
+            })
+
+
+#Report rows, read from the daily sales rollups (see rollups.py)
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['day', 'orders', 'items', 'revenue', 'delivered']
+
+class SalesTotalsSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    items = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    delivered = serializers.IntegerField()
+
+class TopItemSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(source='menuitem_id')
+    title = serializers.CharField(source='menuitem__title')
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class CategoryMixSerializer(serializers.Serializer):
+    category = serializers.IntegerField(source='category_id')
+    slug = serializers.CharField(source='category__slug')
+    title = serializers.CharField(source='category__title')
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    share = serializers.DecimalField(max_digits=5, decimal_places=2) #percentage of the revenue of the range
+
+class CrewThroughputSerializer(serializers.Serializer):
+    delivery_crew = serializers.IntegerField(source='delivery_crew_id')
+    username = serializers.CharField(source='delivery_crew__username')
+    orders = serializers.IntegerField()
+    delivered = serializers.IntegerField()
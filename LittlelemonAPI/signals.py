@@ -0,0 +1,101 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .menu_cache import invalidate_menu, on_commit_once
+from .menu_snapshot import publish_menu_snapshot
+from .cart_summary import apply_cart_delta
+from .events import order_event, order_events
+from .models import Cart, Category, MenuItem, Order
+from .roles import invalidate_roles
+
+
+#any change to the menu, whether it comes from the API views or the admin, invalidates the cached listings
+#(QuerySet.update() and bulk operations do not send these signals and have to call invalidate_menu() themselves)
+@receiver(post_save, sender=MenuItem, dispatch_uid='menuitem_saved')
+@receiver(post_delete, sender=MenuItem, dispatch_uid='menuitem_deleted')
+@receiver(post_save, sender=Category, dispatch_uid='category_saved')
+@receiver(post_delete, sender=Category, dispatch_uid='category_deleted')
+def invalidate_menu_cache(sender, **kwargs):
+    invalidate_menu()
+    #publish the new snapshot once the change is visible to other connections, after the version bump on
+    #commit; always rebuilt, a reader may have built one from the old rows in the meantime
+    on_commit_once(publish_menu_snapshot)
+
+
+#group membership changes (group_users, group_user_detail, the admin) and group renames or deletes
+#invalidate the cached role sets
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='user_groups_changed')
+def invalidate_role_cache_on_membership(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_roles()
+
+
+@receiver(post_save, sender=Group, dispatch_uid='group_saved')
+@receiver(post_delete, sender=Group, dispatch_uid='group_deleted')
+def invalidate_role_cache_on_group(sender, created=False, **kwargs):
+    #a brand new group has no members yet
+    if not created:
+        invalidate_roles()
+
+
+#deleted tokens stop authenticating at once, and user changes (deactivation, is_staff, ...) are picked up
+#on the next request instead of after the token cache TTL
+@receiver(post_delete, sender=Token, dispatch_uid='token_deleted')
+def evict_deleted_token(sender, instance, **kwargs):
+    token_cache.evict(instance.key)
+
+
+@receiver(post_save, sender=User, dispatch_uid='user_saved')
+@receiver(post_delete, sender=User, dispatch_uid='user_deleted')
+def evict_user_tokens(sender, instance, **kwargs):
+    token_cache.evict_user(instance.pk)
+
+
+#the SQLITE_PRAGMAS of the database file `database_name`; the development database committed to the
+#repository keeps its journal mode, WAL is recorded in the file's header
+def sqlite_pragmas(database_name):
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    tracked = getattr(settings, 'TRACKED_SQLITE_DATABASE', None)
+    if tracked is not None and os.path.abspath(str(database_name)) == os.path.abspath(str(tracked)):
+        pragmas.pop('journal_mode', None)
+    return pragmas
+
+
+#WAL journaling and the other SQLite tunings are per connection (or need an open one), so they are
+#applied as soon as Django opens it
+@receiver(connection_created, dispatch_uid='sqlite_pragmas')
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.settings_dict['NAME']).items():
+            cursor.execute(f'PRAGMA {name}={value}')
+
+
+#deleting a menu item cascades to the cart rows holding it; take them out of their users' cart summaries
+@receiver(pre_delete, sender=MenuItem, dispatch_uid='menuitem_deleting')
+def remove_menu_item_from_cart_summaries(sender, instance, **kwargs):
+    for cart_item in Cart.objects.filter(menuitem=instance).only('user_id', 'quantity', 'price'):
+        apply_cart_delta(cart_item.user_id, -cart_item.quantity, -cart_item.price)
+
+
+#order changes are pushed to the /api/orders/events subscribers once they commit; code that reassigns an
+#order's crew member sets _event_crew_id to the previous one first, so the one who lost it is told too
+@receiver(post_save, sender=Order, dispatch_uid='order_saved')
+@receiver(post_delete, sender=Order, dispatch_uid='order_deleted')
+def publish_order_event(sender, instance, signal, **kwargs):
+    if not order_events.publishing:
+        return
+    event = order_event(
+        instance.pk, instance.user_id, instance.delivery_crew_id, instance.status,
+        previous_crew_id=getattr(instance, '_event_crew_id', None), deleted=signal is post_delete,
+    )
+    instance._event_crew_id = instance.delivery_crew_id
+    order_events.publish_on_commit([event])
@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.conf import settings
+
+#Small SQLite files that every worker process of a host opens to share state outside the database:
+#the throttle store (throttling.py) and the order event log (events.py). The file is named by a setting
+#read each time a connection is checked, so tests and benchmarks can point it elsewhere, and is kept in
+#WAL mode with synchronous=NORMAL: readers never block the writer and a write costs no fsync.
+
+
+class SharedSQLiteFile:
+
+    #without a path, the file follows `setting`, then `filename` in the temp directory
+    def __init__(self, path, setting, filename, schema):
+        self._path = path
+        self.setting = setting
+        self.filename = filename
+        self.schema = schema
+        self._local = threading.local()
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, self.setting, None) or os.path.join(tempfile.gettempdir(), self.filename)
+
+    #one connection per thread, reopened in a forked worker or when the path changes
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        path = self.path
+        if connection is None or self._local.pid != os.getpid() or self._local.path != path:
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(self.schema)
+            self._local.connection, self._local.pid, self._local.path = connection, os.getpid(), path
+        return connection
@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import quote
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Group, User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.db import connection
+from django.http import QueryDict
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from .archive import archive_orders
+from .authentication import token_cache
+from .benchmark import private_stores
+from .cart_summary import rebuild_cart_summaries
+from .compression import COMPRESSION_MIN_SIZE, negotiate_encoding
+from .fast_serializers import CART_VALUES, MENU_ITEM_VALUES, ORDER_VALUES, serialize_cart, serialize_menu_items, serialize_orders
+from .dispatch import dispatch_queue
+from .events import (
+    MANAGERS, MAX_PENDING, LocalEventBackend, OrderEventBroker, SQLiteEventBackend, event_stream, order_event, order_events,
+    user_channel,
+)
+from .filters import filter_menu_items, order_menu_items
+from .menu_cache import get_menu_version
+from .menu_snapshot import peek_menu_snapshot
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Cart, CartSummary, Category, DailyCategorySales, DailyCrewSales, DailyMenuItemSales,
+    DailySales, IdempotencyKey, MenuItem, Order, OrderItem,
+)
+from .pagination import encode_cursor
+from .profiling import clear_records, get_records
+from .renderers import FastJSONRenderer
+from .rollups import ROLLUP_MODELS, rebuild_rollups
+from .roles import get_roles
+from .serializers import CART_PRICE_MAX, CartSerializer, MenuItemSerializer, OrderSerializer
+from .signals import sqlite_pragmas
+from .throttling import ThrottleStore, throttle_store
+
+
+class LittleLemonTestCase(TestCase):
+    #a small restaurant: a manager, a delivery crew member and a customer with a full cart and order history
+    ROWS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', 'manager@littlelemon.com', 'lemon')
+        cls.crew = User.objects.create_user('crew', 'crew@littlelemon.com', 'lemon')
+        cls.customer = User.objects.create_user('customer', 'customer@littlelemon.com', 'lemon')
+        Group.objects.create(name='manager').user_set.add(cls.manager)
+        Group.objects.create(name='delivery-crew').user_set.add(cls.crew)
+
+        cls.categories = [Category.objects.create(title=f'Category {i}') for i in range(3)]
+        cls.menu_items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=5 + i, featured=i % 2 == 0, category=cls.categories[i % 3])
+            for i in range(cls.ROWS)
+        ]
+        for item in cls.menu_items:
+            Cart.objects.create(user=cls.customer, menuitem=item, quantity=2)
+        rebuild_cart_summaries()
+        cls.orders = []
+        for i in range(cls.ROWS):
+            order = Order.objects.create(user=cls.customer, delivery_crew=cls.crew, total=10)
+            OrderItem.objects.create(order=order, menuitem=cls.menu_items[i], quantity=2, unit_price=5, price=10)
+            cls.orders.append(order)
+        rebuild_rollups()
+
+    @classmethod
+    def setUpClass(cls):
+        #the throttle state and cached pages live in stores of this test class only, never a running server's
+        directory = tempfile.mkdtemp(prefix='littlelemon-tests-')
+        cls.addClassCleanup(shutil.rmtree, directory)
+        cls.enterClassContext(private_stores(directory))
+        super().setUpClass()
+
+    def setUp(self):
+        #throttle histories, cached menu pages and token lookups outlive a test, keep tests independent of each other
+        cache.clear()
+        token_cache.clear()
+        throttle_store.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class QueryBudgetTests(LittleLemonTestCase):
+    #every endpoint must answer in a fixed number of queries however many rows it renders;
+    #the seeded data has ROWS rows per listing, so a single N+1 blows the budget
+
+    def assertQueryBudget(self, budget, user, method, path, data=None, expected_status=200):
+        client = self.client_for(user)
+        with self.assertNumQueries(budget):
+            response = getattr(client, method)(path, data, format='json')
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def test_category_list(self):
+        self.assertQueryBudget(1, self.customer, 'get', '/api/category')
+
+    def test_category_single(self):
+        self.assertQueryBudget(1, self.customer, 'get', f'/api/category/{self.categories[0].pk}')
+
+    def test_menu_items_list(self):
+        self.assertQueryBudget(2, self.customer, 'get', '/api/menu-items/?perpage=20&ordering=price')
+
+    def test_menu_items_cursor(self):
+        self.assertQueryBudget(1, self.customer, 'get', '/api/menu-items/?cursor=&perpage=20')
+
+    def test_menu_single(self):
+        self.assertQueryBudget(1, self.customer, 'get', f'/api/menu-items/{self.menu_items[0].pk}')
+
+    def test_cart_list(self):
+        response = self.assertQueryBudget(3, self.customer, 'get', '/api/cart/menu-items')
+        self.assertEqual(len(response.data), self.ROWS)
+
+    def test_order_list_customer(self):
+        response = self.assertQueryBudget(2, self.customer, 'get', '/api/orders')
+        self.assertEqual(len(response.data), self.ROWS)
+
+    def test_order_list_manager(self):
+        response = self.assertQueryBudget(2, self.manager, 'get', '/api/orders')
+        self.assertEqual(len(response.data), self.ROWS)
+
+    def test_order_list_delivery_crew(self):
+        response = self.assertQueryBudget(2, self.crew, 'get', '/api/orders')
+        self.assertEqual(len(response.data), self.ROWS)
+
+    def test_order_detail(self):
+        self.assertQueryBudget(1, self.customer, 'get', f'/api/orders/{self.orders[0].pk}')
+
+    def test_checkout(self):
+        #9 for the order itself, 1 for the day's sales and 3 for each of the menu item and category rollups
+        response = self.assertQueryBudget(16, self.customer, 'post', '/api/orders', expected_status=201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), self.ROWS)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+
+class RoleResolutionTests(LittleLemonTestCase):
+
+    def test_roles_are_resolved_once_per_request(self):
+        #order_detail checks the manager and delivery crew roles several times on this path:
+        #one query for the order, one for the roles, one for the update, and five to move the order
+        #in the daily rollups (savepoint, row lock, sales and crew updates, release)
+        client = self.client_for(self.crew)
+        with self.assertNumQueries(8):
+            response = client.patch(f'/api/orders/{self.orders[0].pk}', {'status': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_roles_are_cached_between_requests(self):
+        get_roles(User.objects.get(pk=self.manager.pk))
+        manager = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(0):
+            self.assertIn('manager', get_roles(manager))
+
+    def test_group_names_are_case_insensitive(self):
+        Group.objects.create(name='Manager').user_set.add(self.customer)
+        self.assertIn('manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+    def test_membership_changes_invalidate_cached_roles(self):
+        admin = User.objects.create_superuser('admin', 'admin@littlelemon.com', 'lemon')
+        self.assertNotIn('manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+        response = self.client_for(admin).post('/api/groups/manager/users', {'username': 'customer'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+        response = self.client_for(admin).delete(f'/api/groups/manager/users/{self.customer.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('manager', get_roles(User.objects.get(pk=self.customer.pk)))
+
+
+class TokenAuthenticationCacheTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.customer)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.client.get('/api/category').status_code, 200)
+        #only the categories query is left
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/category').status_code, 200)
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.client.get('/api/category').status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/category').status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get('/api/category').status_code, 200)
+        customer = User.objects.get(pk=self.customer.pk)
+        customer.is_active = False
+        customer.save()
+        self.assertEqual(self.client.get('/api/category').status_code, 401)
+
+
+class ProfilingTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_records()
+
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client_for(self.customer).get('/api/orders')
+        self.assertEqual(get_records(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_recorded_per_view(self):
+        self.client_for(self.customer).get('/api/orders')
+        [record] = get_records()
+        self.assertEqual(record['view'], 'LittlelemonAPI.views.order_management')
+        self.assertEqual(record['queries'], 2)
+        self.assertGreater(record['serialization_ms'], 0)
+
+        admin = User.objects.create_superuser('admin', 'admin@littlelemon.com', 'lemon')
+        response = self.client_for(admin).get('/api/profiling')
+        self.assertEqual(response.data['views']['LittlelemonAPI.views.order_management']['requests'], 1)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_serializer_data_is_timed_without_patching_drf(self):
+        self.client_for(self.customer).get(f'/api/orders/{self.orders[0].pk}')
+        [record] = get_records()
+        self.assertGreater(record['serialization_ms'], 0)
+        self.assertEqual(BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+
+    def test_report_is_admin_only(self):
+        self.assertEqual(self.client_for(self.manager).get('/api/profiling').status_code, 403)
+
+
+class MenuListingCacheTests(LittleLemonTestCase):
+    PATH = '/api/menu-items/?perpage=100'
+
+    def get_listing(self, **headers):
+        response = self.client_for(self.customer).get(self.PATH, **headers)
+        if response.status_code == 200:
+            return response, {item['id']: item for item in response.json()}
+        return response, None
+
+    def test_menu_writes_serve_a_fresh_listing_and_etag(self):
+        manager = self.client_for(self.manager)
+        response, items = self.get_listing()
+        etags = {response['ETag']}
+
+        created = manager.post('/api/menu-items/', {'title': 'Granita', 'price': '4.00', 'featured': False, 'category_id': self.categories[0].pk}, format='json')
+        self.assertEqual(created.status_code, 201)
+        response, items = self.get_listing()
+        self.assertNotIn(response['ETag'], etags)
+        etags.add(response['ETag'])
+        self.assertEqual(items[created.data['id']]['title'], 'Granita')
+
+        self.assertEqual(manager.patch(f"/api/menu-items/{created.data['id']}", {'price': '4.50'}, format='json').status_code, 200)
+        response, items = self.get_listing()
+        self.assertNotIn(response['ETag'], etags)
+        etags.add(response['ETag'])
+        self.assertEqual(items[created.data['id']]['price'], '4.50')
+
+        self.assertEqual(manager.delete(f"/api/menu-items/{created.data['id']}").status_code, 204)
+        response, items = self.get_listing()
+        self.assertNotIn(response['ETag'], etags)
+        self.assertNotIn(created.data['id'], items)
+        self.assertEqual(len(items), self.ROWS)
+
+        category = Category.objects.create(title='Seasonal')
+        response = manager.delete(f'/api/category/{category.pk}')
+        self.assertEqual((response.status_code, response.content), (204, b''))
+
+    def test_version_is_bumped_again_on_commit(self):
+        item = self.menu_items[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            for price in (9, 10):
+                item.price = price
+                item.save()
+        #a reader between the change and its commit caches the old rows under this version
+        version = get_menu_version()
+        self.get_listing()
+        self.assertEqual([callback.__name__ for callback in callbacks], ['bump_menu_version', 'publish_menu_snapshot'])
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_menu_version(), version)
+        response, items = self.get_listing()
+        self.assertEqual(items[item.pk]['price'], '10.00')
+        _, snapshot = peek_menu_snapshot()
+        self.assertIn(f'"id":{item.pk},"title":"Dish 0","price":"10.00"'.encode(), snapshot['full'])
+
+    def test_params_the_filters_tell_apart_are_cached_apart(self):
+        client = self.client_for(self.customer)
+        for first, second in (('category=Category%200', 'category=Category%200%20'), ('search=dish', 'search=dish%20'), ('perpage=2', 'perpage=')):
+            with self.subTest(query=second):
+                throttle_store.clear()
+                cache.clear()
+                uncached = client.get(f'/api/menu-items/?{second}')
+                cache.clear()
+                first_response = client.get(f'/api/menu-items/?{first}')
+                cached = client.get(f'/api/menu-items/?{second}')
+                self.assertEqual((cached.status_code, cached.content), (uncached.status_code, uncached.content))
+                self.assertNotEqual(first_response['ETag'], cached.get('ETag'))
+
+    def test_unchanged_listing_answers_304(self):
+        response, _ = self.get_listing()
+        response, _ = self.get_listing(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+
+class MenuFilterTests(LittleLemonTestCase):
+
+    def get_titles(self, query):
+        response = self.client_for(self.customer).get(f'/api/menu-items/?perpage=100&{query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data]
+
+    def test_prefix_search_is_case_insensitive(self):
+        MenuItem.objects.create(title='Lemon Dessert', price=7, featured=False, category=self.categories[0])
+        self.assertEqual(self.get_titles('search=lemon'), ['Lemon Dessert'])
+        self.assertEqual(len(self.get_titles('search=DISH 1')), 11)
+
+    def test_prefix_search_ending_at_the_last_code_points(self):
+        for last in ('\ud7ff', '\U0010ffff'):
+            MenuItem.objects.create(title=f'Dish {last}', price=7, featured=False, category=self.categories[0])
+            self.assertEqual(self.get_titles(f'search=dish {quote(last)}'), [f'Dish {last}'])
+
+    def test_prefix_search_is_a_like_match_on_postgresql(self):
+        #a range is only a prefix match under code point ordering, which PostgreSQL's collation need not be
+        with patch.object(connection, 'vendor', 'postgresql'):
+            sql = str(filter_menu_items(MenuItem.objects.all(), QueryDict('search=dish%20')).query)
+        self.assertIn('LIKE dish %', sql)
+        self.assertNotIn('<', sql)
+
+    def test_price_range_and_featured(self):
+        self.assertEqual(self.get_titles('from_price=6&to_price=8'), ['Dish 1', 'Dish 2', 'Dish 3'])
+        self.assertEqual(self.get_titles('featured=true&to_price=9'), ['Dish 0', 'Dish 2', 'Dish 4'])
+
+    def test_ordering_is_whitelisted(self):
+        self.assertEqual(self.get_titles('ordering=-price')[0], 'Dish 19')
+        response = self.client_for(self.customer).get('/api/menu-items/?ordering=category__slug')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_values_are_rejected(self):
+        client = self.client_for(self.customer)
+        self.assertEqual(client.get('/api/menu-items/?to_price=cheap').status_code, 400)
+        self.assertEqual(client.get('/api/menu-items/?featured=maybe').status_code, 400)
+
+
+class MenuQueryPlanTests(LittleLemonTestCase):
+    #every supported filter/search/ordering combination must reach menu items through an index;
+    #the listing is read a page at a time, so a plan that scans the whole table is a regression
+    COMBINATIONS = [
+        '',
+        'ordering=-price',
+        'ordering=title',
+        'ordering=-title',
+        'category=Category 1',
+        'category=Category 1&ordering=title',
+        'category=Category 1&to_price=9',
+        'category=Category 1&featured=true',
+        'featured=true',
+        'featured=false&ordering=-price',
+        'featured=true&from_price=6&to_price=12',
+        'featured=true&ordering=title',
+        'from_price=6',
+        'to_price=12&ordering=-price',
+        'from_price=6&to_price=12',
+        'search=dish',
+        'search=dish&ordering=price',
+        'search=dish&featured=true',
+        'search=dish&category=Category 1',
+    ]
+
+    def test_every_combination_uses_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plans are checked against SQLite')
+        for query in self.COMBINATIONS:
+            with self.subTest(query=query):
+                params = QueryDict(query)
+                items = filter_menu_items(MenuItem.objects.select_related('category'), params)
+                plan = order_menu_items(items, params.get('ordering'))[:20].explain()
+                steps = [line for line in plan.splitlines() if 'LittlelemonAPI_menuitem' in line]
+                self.assertTrue(steps, plan)
+                for step in steps:
+                    self.assertRegex(step, r'SEARCH LittlelemonAPI_menuitem USING|SCAN LittlelemonAPI_menuitem USING (COVERING )?INDEX', plan)
+
+
+class SQLitePragmaTests(LittleLemonTestCase):
+
+    def test_tracked_database_keeps_its_journal_mode(self):
+        self.assertNotIn('journal_mode', sqlite_pragmas(settings.TRACKED_SQLITE_DATABASE))
+        self.assertEqual(sqlite_pragmas(os.path.join(tempfile.gettempdir(), 'other.sqlite3'))['journal_mode'], 'WAL')
+
+
+class CursorPaginationTests(LittleLemonTestCase):
+    #pages of 3 over runs of 4 equal prices or dates, so ties straddle page boundaries
+
+    def walk(self, user, path):
+        client, ids = self.client_for(user), []
+        while path:
+            throttle_store.clear()
+            response = client.get(path)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            path = response.data['next']
+        return ids
+
+    def test_menu_items_are_walked_without_gaps_or_repeats(self):
+        for i, item in enumerate(self.menu_items):
+            MenuItem.objects.filter(pk=item.pk).update(price=5 + i // 4)
+        rows = sorted(MenuItem.objects.values_list('price', 'id'))
+        for ordering, expected in (('price', rows), ('-price', rows[::-1])):
+            with self.subTest(ordering=ordering):
+                ids = self.walk(self.customer, f'/api/menu-items/?cursor=&perpage=3&ordering={ordering}')
+                self.assertEqual(ids, [pk for _, pk in expected])
+
+    def test_orders_are_walked_without_gaps_or_repeats(self):
+        start = timezone.now()
+        for i, order in enumerate(self.orders):
+            Order.objects.filter(pk=order.pk).update(date=start + timedelta(hours=i // 4))
+        rows = sorted(Order.objects.values_list('date', 'id'))
+        for ordering, expected in (('date', rows), ('-date', rows[::-1])):
+            with self.subTest(ordering=ordering):
+                ids = self.walk(self.manager, f'/api/orders?cursor=&perpage=3&ordering={ordering}')
+                self.assertEqual(ids, [pk for _, pk in expected])
+
+    def test_invalid_cursors_are_not_found(self):
+        for user, path in ((self.customer, '/api/menu-items/'), (self.manager, '/api/orders')):
+            for cursor in ('not-a-cursor', encode_cursor('not-a-value', 1)):
+                with self.subTest(path=path, cursor=cursor):
+                    throttle_store.clear()
+                    self.assertEqual(self.client_for(user).get(path, {'cursor': cursor}).status_code, 404)
+
+
+class CartBatchTests(LittleLemonTestCase):
+
+    def test_batch_upserts_and_removes_in_fixed_queries(self):
+        items = self.menu_items
+        batch = [{'menuitem': item.pk, 'quantity': 3} for item in items[:10]]  # already in the cart
+        batch += [{'menuitem': items[10].pk, 'quantity': 0}]
+        client = self.client_for(self.customer)
+        Cart.objects.filter(user=self.customer, menuitem__in=items[:5]).delete()
+        #roles, menu item IN query, savepoint, summary lock, replaced rows, upsert, delete, summary update,
+        #release, cart listing, cart summary
+        with self.assertNumQueries(11):
+            response = client.post('/api/cart/menu-items/batch', batch, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.ROWS - 1)
+        cart = {row.menuitem_id: row for row in Cart.objects.filter(user=self.customer)}
+        self.assertNotIn(items[10].pk, cart)
+        self.assertEqual(cart[items[0].pk].quantity, 3)
+        self.assertEqual(cart[items[0].pk].price, 3 * items[0].price)
+
+    def test_invalid_batch_changes_nothing(self):
+        batch = [{'menuitem': self.menu_items[0].pk, 'quantity': 0}, {'menuitem': 999999, 'quantity': 1}]
+        response = self.client_for(self.customer).post('/api/cart/menu-items/batch', batch, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), self.ROWS)
+
+    def test_prices_that_overflow_their_columns_are_rejected(self):
+        first, second = self.menu_items[:2]
+        before = list(Cart.objects.filter(user=self.customer).values_list('menuitem', 'quantity'))
+        batches = {
+            'row price': [{'menuitem': first.pk, 'quantity': 32767}],
+            'batch subtotal': [{'menuitem': item.pk, 'quantity': int(CART_PRICE_MAX // item.price)} for item in (first, second)],
+            #fits on its own, not with the rest of the cart
+            'cart subtotal': [{'menuitem': first.pk, 'quantity': int(CART_PRICE_MAX // first.price)}],
+        }
+        client = self.client_for(self.customer)
+        for name, batch in batches.items():
+            with self.subTest(name):
+                response = client.post('/api/cart/menu-items/batch', batch, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(Cart.objects.filter(user=self.customer).values_list('menuitem', 'quantity')), before)
+
+    def test_single_item_removal(self):
+        item = self.menu_items[0]
+        response = self.client_for(self.customer).delete(f'/api/cart/menu-items?menuitem={item.pk}')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Cart.objects.filter(user=self.customer, menuitem=item).exists())
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), self.ROWS - 1)
+
+
+class CartSummaryTests(LittleLemonTestCase):
+
+    def assertSummaryMatchesCart(self, user):
+        totals = Cart.objects.filter(user=user).aggregate(item_count=Sum('quantity'), subtotal=Sum('price'))
+        summary = CartSummary.objects.get(user=user)
+        self.assertEqual(summary.item_count, totals['item_count'] or 0)
+        self.assertEqual(summary.subtotal, totals['subtotal'] or 0)
+        return summary
+
+    def test_summary_follows_every_cart_write(self):
+        client = self.client_for(self.customer)
+        first, second = self.menu_items[:2]
+
+        client.delete(f'/api/cart/menu-items?menuitem={first.pk}')
+        self.assertSummaryMatchesCart(self.customer)
+
+        client.post('/api/cart/menu-items', {'menuitem': first.pk, 'quantity': 4}, format='json')
+        self.assertSummaryMatchesCart(self.customer)
+
+        client.post('/api/cart/menu-items/batch', [{'menuitem': first.pk, 'quantity': 1}, {'menuitem': second.pk, 'quantity': 0}], format='json')
+        self.assertSummaryMatchesCart(self.customer)
+
+        admin = User.objects.create_superuser('admin', 'admin@littlelemon.com', 'lemon')
+        self.client_for(admin).delete(f'/api/menu-items/{self.menu_items[2].pk}')
+        self.assertSummaryMatchesCart(self.customer)
+
+        client.post('/api/orders')
+        self.assertEqual(self.assertSummaryMatchesCart(self.customer).item_count, 0)
+
+    def test_checkout_totals_the_cart_rows(self):
+        expected = Cart.objects.filter(user=self.customer).aggregate(total=Sum('price'))['total']
+        CartSummary.objects.filter(user=self.customer).update(item_count=1, subtotal=Decimal('1.00'))
+        response = self.client_for(self.customer).post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(pk=response.data['id']).total, expected)
+
+    def test_checkout_without_a_summary_row(self):
+        CartSummary.objects.filter(user=self.customer).delete()
+        response = self.client_for(self.customer).post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), self.ROWS)
+        self.assertEqual(self.assertSummaryMatchesCart(self.customer).item_count, 0)
+
+    def test_cart_write_without_a_summary_row(self):
+        CartSummary.objects.filter(user=self.customer).delete()
+        self.client_for(self.customer).delete(f'/api/cart/menu-items?menuitem={self.menu_items[0].pk}')
+        self.assertSummaryMatchesCart(self.customer)
+
+    def test_new_customer_gets_a_summary(self):
+        client = self.client_for(User.objects.create_user('newcomer'))
+        self.assertEqual(client.get('/api/cart/summary').data, {'item_count': 0, 'subtotal': '0.00'})
+        client.post('/api/cart/menu-items', {'menuitem': self.menu_items[1].pk, 'quantity': 3}, format='json')
+        self.assertEqual(client.get('/api/cart/summary').data, {'item_count': 3, 'subtotal': '18.00'})
+
+    def test_cart_listing_carries_the_summary(self):
+        response = self.client_for(self.customer).get('/api/cart/menu-items')
+        summary = CartSummary.objects.get(user=self.customer)
+        self.assertEqual(response['X-Cart-Item-Count'], str(summary.item_count))
+        self.assertEqual(response['X-Cart-Subtotal'], str(summary.subtotal))
+
+
+class AsyncViewTests(LittleLemonTestCase):
+    #AsyncClient requests go through the ASGI handler, so they are routed to async_views
+
+    def setUp(self):
+        super().setUp()
+        self.tokens = {user: Token.objects.create(user=user).key for user in (self.manager, self.crew, self.customer)}
+
+    def sync_get(self, user, path):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.tokens[user]}')
+        return client.get(path)
+
+    def async_get(self, user, path, **headers):
+        if user is not None:
+            headers['Authorization'] = f'Token {self.tokens[user]}'
+        return async_to_sync(AsyncClient().get)(path, headers=headers)
+
+    def test_async_views_render_what_the_sync_views_render(self):
+        item, order = self.menu_items[0], self.orders[0]
+        cases = [
+            (self.customer, '/api/category'),
+            (self.customer, f'/api/category/{self.categories[0].pk}'),
+            (self.customer, '/api/category/0'),
+            (self.customer, '/api/menu-items/?perpage=5&page=2&ordering=-price'),
+            (self.customer, f'/api/menu-items/?category={self.categories[1].title}&featured=true'),
+            (self.customer, '/api/menu-items/?perpage=5&page=9'),
+            (self.customer, '/api/menu-items/?page=x'),
+            (self.customer, '/api/menu-items/?perpage=0'),
+            (self.customer, '/api/menu-items/?cursor=&perpage=5'),
+            (self.customer, f'/api/menu-items/{item.pk}'),
+            (self.customer, '/api/menu'),
+            (self.customer, f'/api/menu?category={self.categories[2].title}'),
+            (self.customer, '/api/orders'),
+            (self.manager, '/api/orders?cursor=&perpage=5&ordering=-date'),
+            (self.crew, '/api/orders'),
+            (self.customer, f'/api/orders/{order.pk}'),
+            (self.manager, f'/api/orders/{order.pk}'),
+            (self.crew, f'/api/orders/{order.pk}'),
+            (self.crew, '/api/orders/0'),
+        ]
+        for user, path in cases:
+            with self.subTest(path=path, user=user.username):
+                cache.clear()
+                expected = self.sync_get(user, path)
+                cache.clear()
+                response = self.async_get(user, path)
+                self.assertTrue(response.resolver_match.view_name.startswith('LittlelemonAPI.async_views.'))
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+
+        Order.objects.filter(pk=order.pk).update(delivery_crew=None)
+        response = self.async_get(self.crew, f'/api/orders/{order.pk}')
+        self.assertEqual(response.json(), {'error': 'This order is not assigned to you.'})
+
+    def test_listing_etag_is_shared_with_the_sync_view(self):
+        etag = self.sync_get(self.customer, '/api/menu-items/')['ETag']
+        self.assertEqual(self.async_get(self.customer, '/api/menu-items/', if_none_match=etag).status_code, 304)
+
+    def test_other_requests_fall_back_to_the_drf_views(self):
+        self.assertEqual(self.async_get(None, '/api/menu-items/').status_code, 401)
+        self.assertEqual(async_to_sync(AsyncClient().get)('/api/category', headers={'Authorization': 'Token nope'}).status_code, 401)
+        response = async_to_sync(AsyncClient().post)(
+            '/api/category', {'title': 'Async'}, content_type='application/json',
+            headers={'Authorization': f'Token {self.tokens[self.manager]}'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_throttling_applies_to_async_views(self):
+        statuses = [self.async_get(self.customer, f'/api/menu-items/{self.menu_items[0].pk}').status_code for _ in range(11)]
+        self.assertEqual(statuses[:10], [200] * 10)
+        self.assertEqual(statuses[10], 429)
+
+
+class MenuSnapshotTests(LittleLemonTestCase):
+
+    def test_slices_match_the_listing(self):
+        client = self.client_for(self.customer)
+        listing = client.get('/api/menu-items/?perpage=100')
+        self.assertEqual(client.get('/api/menu').json(), {
+            'categories': client.get('/api/category').json(),
+            'menu_items': listing.json(),
+        })
+        for query in (f'category={self.categories[1].title}', 'featured=true'):
+            with self.subTest(query=query):
+                cache.clear()
+                self.assertEqual(client.get(f'/api/menu?{query}').content, client.get(f'/api/menu-items/?perpage=100&{query}').content)
+        self.assertEqual(client.get('/api/menu?category=Nothing').json(), [])
+        self.assertEqual(client.get('/api/menu?category=x&featured=true').status_code, 400)
+
+    def test_published_snapshot_is_served_without_queries(self):
+        call_command('publish_menu_snapshot', stdout=StringIO())
+        client = self.client_for(self.customer)
+        with self.assertNumQueries(0):
+            response = client.get('/api/menu')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/menu', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_menu_changes_publish_a_new_snapshot(self):
+        client = self.client_for(self.customer)
+        client.get('/api/menu')
+        item = self.menu_items[0]
+        item.title = 'Renamed dish'
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        with self.assertNumQueries(0):
+            response = client.get(f'/api/menu?category={item.category.title}')
+        self.assertIn('Renamed dish', [menu_item['title'] for menu_item in response.json()])
+
+
+class FastSerializerParityTests(LittleLemonTestCase):
+    #the read-only list path must render byte for byte what the model serializers render
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        odd = MenuItem.objects.create(title='Crème brûlée "special"', price=Decimal('7.5'), featured=False, category=cls.categories[0])
+        Cart.objects.create(user=cls.manager, menuitem=odd, quantity=3)
+        Order.objects.create(user=cls.manager, delivery_crew=None, status=True, total=Decimal('0.1'))
+        User.objects.filter(pk=cls.customer.pk).update(email='')
+
+    def assertSameJSON(self, fast, expected):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(expected))
+
+    def test_menu_items(self):
+        items = MenuItem.objects.order_by('id')
+        self.assertSameJSON(serialize_menu_items(items.values(*MENU_ITEM_VALUES)),
+                            MenuItemSerializer(items.select_related('category'), many=True).data)
+
+    def test_orders(self):
+        orders = Order.objects.order_by('id')
+        self.assertSameJSON(serialize_orders(orders.values(*ORDER_VALUES)),
+                            OrderSerializer(orders.select_related('user', 'delivery_crew'), many=True).data)
+
+    def test_cart(self):
+        cart = Cart.objects.order_by('id')
+        self.assertSameJSON(serialize_cart(cart.values(*CART_VALUES)),
+                            CartSerializer(cart.select_related('user', 'menuitem__category'), many=True).data)
+
+
+class OrderArchiveTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        #the first five orders are two years old, one of them no longer assigned to the crew member
+        self.old_orders = self.orders[:5]
+        for i, order in enumerate(self.old_orders):
+            Order.objects.filter(pk=order.pk).update(date=timezone.now() - timedelta(days=730 - i))
+        Order.objects.filter(pk=self.old_orders[4].pk).update(delivery_crew=None)
+
+    def archive(self):
+        call_command('archive_orders', '--batch-size', '2', stdout=StringIO())
+
+    def test_old_orders_move_to_the_archive(self):
+        self.archive()
+        old_ids = [order.pk for order in self.old_orders]
+        self.assertFalse(Order.objects.filter(pk__in=old_ids).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=old_ids).exists())
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('id', flat=True)), sorted(old_ids))
+        self.assertEqual(ArchivedOrderItem.objects.count(), 5)
+        self.assertEqual(Order.objects.count(), self.ROWS - 5)
+
+    def test_archived_orders_stay_readable(self):
+        client = self.client_for(self.customer)
+        order = self.old_orders[0]
+        before = client.get(f'/api/orders/{order.pk}')
+        self.archive()
+        after = client.get(f'/api/orders/{order.pk}')
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.content, before.content)
+        self.assertEqual(client.get(f'/api/orders/{self.orders[-1].pk}').status_code, 200)
+        self.assertEqual(client.get('/api/orders/0').json(), {'detail': 'No Order matches the given query.'})
+        response = self.client_for(self.manager).patch(f'/api/orders/{order.pk}', {'status': True}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_archive_listing_by_role_and_date_range(self):
+        self.archive()
+        def ids(user, query=''):
+            response = self.client_for(user).get(f'/api/orders/archive?perpage=2{query}')
+            self.assertEqual(response.status_code, 200)
+            found = [order['id'] for order in response.data['results']]
+            while response.data['next']:
+                response = self.client_for(user).get(response.data['next'])
+                found += [order['id'] for order in response.data['results']]
+            return found
+
+        newest_first = [order.pk for order in reversed(self.old_orders)]
+        self.assertEqual(ids(self.customer), newest_first)
+        self.assertEqual(ids(self.manager), newest_first)
+        self.assertEqual(ids(self.crew), newest_first[1:])
+        self.assertEqual(ids(User.objects.create_user('stranger')), [])
+
+        day = (timezone.now() - timedelta(days=728)).date().isoformat()
+        self.assertEqual(ids(self.customer, f'&from={day}&to={day}'), [self.old_orders[2].pk])
+        self.assertEqual(ids(self.customer, f'&from={day}&ordering=date'), [order.pk for order in self.old_orders[2:]])
+        response = self.client_for(self.customer).get('/api/orders/archive?from=2024-02-30')
+        self.assertEqual(response.status_code, 400)
+
+
+class RollupTests(LittleLemonTestCase):
+
+    def rollups(self):
+        return {
+            model.__name__: sorted(
+                tuple(value for field, value in row.items() if field != 'id') for row in model.objects.values()
+            )
+            for model in ROLLUP_MODELS
+        }
+
+    #the incrementally maintained rollups must equal a rebuild from the order tables
+    def assertRollupsRebuildable(self):
+        maintained = self.rollups()
+        rebuild_rollups(batch_size=3)
+        self.assertEqual(maintained, self.rollups())
+
+    def test_rebuild_counts_every_order(self):
+        today = timezone.localdate()
+        sales = DailySales.objects.get(day=today)
+        self.assertEqual((sales.orders, sales.items, sales.revenue, sales.delivered), (self.ROWS, 2 * self.ROWS, 10 * self.ROWS, 0))
+        self.assertEqual(DailyMenuItemSales.objects.filter(day=today).count(), self.ROWS)
+        self.assertEqual(DailyCategorySales.objects.aggregate(quantity=Sum('quantity'))['quantity'], 2 * self.ROWS)
+        self.assertEqual(DailyCrewSales.objects.get(day=today, delivery_crew=self.crew).orders, self.ROWS)
+
+    def test_order_writes_keep_the_rollups_current(self):
+        response = self.client_for(self.customer).post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(DailySales.objects.get(day=timezone.localdate()).orders, self.ROWS + 1)
+        self.assertRollupsRebuildable()
+
+        order = self.orders[0]
+        manager = self.client_for(self.manager)
+        manager.patch(f'/api/orders/{order.pk}', {'delivery_crew': None}, format='json')
+        self.assertRollupsRebuildable()
+        manager.patch(f'/api/orders/{order.pk}', {'delivery_crew': self.crew.pk, 'total': '12.50'}, format='json')
+        self.client_for(self.crew).patch(f'/api/orders/{order.pk}', {'status': 1}, format='json')
+        self.assertEqual(DailyCrewSales.objects.get(delivery_crew=self.crew).delivered, 1)
+        self.assertRollupsRebuildable()
+
+        #moving an order to another day moves its items along
+        manager.patch(f'/api/orders/{order.pk}', {'date': (timezone.now() - timedelta(days=3)).isoformat()}, format='json')
+        self.assertEqual(DailySales.objects.count(), 2)
+        self.assertRollupsRebuildable()
+
+        manager.delete(f'/api/orders/{self.orders[1].pk}')
+        self.assertRollupsRebuildable()
+
+    def test_reports(self):
+        old = self.orders[0]
+        Order.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=10))
+        rebuild_rollups()
+        client = self.client_for(self.manager)
+        today = timezone.localdate().isoformat()
+
+        revenue = client.get('/api/reports/revenue').data
+        self.assertEqual(len(revenue['days']), 2)
+        self.assertEqual(revenue['totals'], {'orders': self.ROWS, 'items': 2 * self.ROWS, 'revenue': f'{10 * self.ROWS}.00', 'delivered': 0})
+        revenue = client.get(f'/api/reports/revenue?from={today}&to={today}').data
+        self.assertEqual(revenue['totals']['orders'], self.ROWS - 1)
+
+        Order.objects.filter(pk=self.orders[1].pk).update(total=0)
+        OrderItem.objects.filter(order=self.orders[1]).update(quantity=5, price=25)
+        rebuild_rollups()
+        top = client.get('/api/reports/top-items?limit=3').data
+        self.assertEqual(len(top), 3)
+        self.assertEqual(top[0], {'menuitem': self.menu_items[1].pk, 'title': 'Dish 1', 'quantity': 5, 'revenue': '25.00'})
+
+        mix = client.get(f'/api/reports/category-mix?to={today}').data
+        self.assertEqual([category['category'] for category in mix], [self.categories[1].pk, self.categories[0].pk, self.categories[2].pk])
+        self.assertEqual(sum(Decimal(category['share']) for category in mix), 100)
+
+        crew = client.get('/api/reports/crew-throughput').data
+        self.assertEqual(crew, [{'delivery_crew': self.crew.pk, 'username': 'crew', 'orders': self.ROWS, 'delivered': 0}])
+
+    def test_reports_are_for_managers(self):
+        for path in ('revenue', 'top-items', 'category-mix', 'crew-throughput'):
+            self.assertEqual(self.client_for(self.customer).get(f'/api/reports/{path}').status_code, 403)
+            self.assertEqual(self.client_for(self.crew).get(f'/api/reports/{path}').status_code, 403)
+        client = self.client_for(self.manager)
+        self.assertEqual(client.get('/api/reports/revenue?from=yesterday').status_code, 400)
+        self.assertEqual(client.get('/api/reports/top-items?limit=0').status_code, 400)
+
+
+class OrderExportTests(LittleLemonTestCase):
+
+    def export(self, query='', user=None):
+        response = self.client_for(user or self.manager).get(f'/api/orders/export{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_streams_every_order_with_its_items(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([line['id'] for line in lines], [order.pk for order in self.orders])
+        self.assertEqual(lines[0]['items'], [
+            {'menuitem': self.menu_items[0].pk, 'title': 'Dish 0', 'quantity': 2, 'unit_price': '5.00', 'price': '10.00'},
+        ])
+        self.assertEqual(lines[0]['delivery_crew'], {'id': self.crew.pk, 'username': 'crew'})
+        self.assertEqual(lines[0]['date'], OrderSerializer(self.orders[0]).data['date'])
+
+    def test_csv_has_one_row_per_item(self):
+        Order.objects.create(user=self.customer, total=0)
+        rows = list(csv.reader(StringIO(self.export('?output=csv'))))
+        self.assertEqual(rows[0][:3], ['order_id', 'user_id', 'username'])
+        self.assertEqual(len(rows), 1 + self.ROWS + 1)
+        self.assertEqual(rows[1][-5:], [str(self.menu_items[0].pk), 'Dish 0', '2', '5.00', '10.00'])
+        self.assertEqual(rows[-1][-5:], [''] * 5)
+
+    def test_filters(self):
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:3]]).update(status=True)
+        Order.objects.filter(pk=self.orders[0].pk).update(date=timezone.now() - timedelta(days=10))
+        self.assertEqual(len(self.export('?status=1').splitlines()), 3)
+        self.assertEqual(len(self.export('?status=0&output=csv').splitlines()), 1 + self.ROWS - 3)
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.export(f'?status=1&from={today}').splitlines()), 2)
+        client = self.client_for(self.manager)
+        self.assertEqual(client.get('/api/orders/export?status=maybe').status_code, 400)
+        self.assertEqual(client.get('/api/orders/export?output=xml').status_code, 400)
+        self.assertEqual(self.client_for(self.customer).get('/api/orders/export').status_code, 403)
+        self.assertEqual(self.client_for(self.crew).get('/api/orders/export').status_code, 403)
+
+    @patch('LittlelemonAPI.export.EXPORT_CHUNK_SIZE', 10)
+    def test_items_are_read_once_per_chunk(self):
+        response = self.client_for(self.manager).get('/api/orders/export')
+        #the orders query and one items query for each of the two chunks
+        with self.assertNumQueries(3):
+            body = b''.join(response.streaming_content)
+        self.assertEqual(len(body.splitlines()), self.ROWS)
+
+    def test_asgi_streams_the_same_bytes(self):
+        token = Token.objects.create(user=self.manager)
+        expected = self.export('?output=csv')
+        response = async_to_sync(AsyncClient().get)('/api/orders/export?output=csv', headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join(async_to_sync(self.collect)(response)).decode(), expected)
+
+    async def collect(self, response):
+        return [chunk async for chunk in response.streaming_content]
+
+
+class MenuImportTests(LittleLemonTestCase):
+
+    def test_json_import_upserts_items_and_categories(self):
+        version = get_menu_version()
+        rows = [
+            {'title': 'Dish 0', 'price': '9.50', 'featured': True, 'category': 'Category 1'},
+            {'title': 'Lemon tart', 'price': '6.00', 'category': 'Summer Desserts'},
+            {'title': 'Granita', 'price': '4.00', 'featured': False, 'category': 'summer-desserts'},
+            {'title': 'Dish 1', 'price': '6.00', 'featured': False, 'category': 'Category 1'},  #unchanged
+        ]
+        with self.assertNumQueries(9):
+            response = self.client_for(self.manager).post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 2, 'updated': 1, 'categories_created': 1, 'errors': []})
+        self.assertNotEqual(get_menu_version(), version)
+
+        dish = MenuItem.objects.get(pk=self.menu_items[0].pk)
+        self.assertEqual((dish.price, dish.featured, dish.category_id), (Decimal('9.50'), True, self.categories[1].pk))
+        desserts = Category.objects.get(slug='summer-desserts')
+        self.assertEqual(desserts.title, 'Summer Desserts')
+        self.assertEqual(set(MenuItem.objects.filter(category=desserts).values_list('title', flat=True)), {'Lemon tart', 'Granita'})
+        self.assertFalse(MenuItem.objects.get(title='Lemon tart').featured)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = [
+            {'title': 'Soup', 'price': '1.00', 'category': 'Starters'},
+            {'title': 'Bread', 'price': '3.00'},
+            {'title': 'Salad', 'price': '5.00', 'category': 'Starters'},
+            {'title': 'Salad', 'price': '6.00', 'category': 'Starters'},
+            {'title': 'Olives', 'price': '3.00', 'category': '!!!'},
+            'not a row',
+        ]
+        response = self.client_for(self.manager).post('/api/menu-items/import', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2, 4, 5, 6])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        self.assertEqual(MenuItem.objects.get(title='Salad').price, Decimal('5.00'))
+        self.assertEqual(self.client_for(self.manager).post('/api/menu-items/import', {'title': 'Soup'}, format='json').status_code, 400)
+
+    def test_csv_import(self):
+        body = 'title,price,featured,category\nDish 2,12.00,,Category 2\nFlatbread,7.25,true,Breads\n'
+        response = self.client_for(self.manager).post('/api/menu-items/import', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 1, 'updated': 1, 'categories_created': 1, 'errors': []})
+        self.assertFalse(MenuItem.objects.get(pk=self.menu_items[2].pk).featured)
+        self.assertTrue(MenuItem.objects.get(title='Flatbread', category__slug='breads').featured)
+
+    def test_managers_only(self):
+        rows = [{'title': 'Soup', 'price': '5.00', 'category': 'Starters'}]
+        self.assertEqual(self.client_for(self.customer).post('/api/menu-items/import', rows, format='json').status_code, 403)
+        self.assertFalse(MenuItem.objects.filter(title='Soup').exists())
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write('title,price,category\nSoup,5.00,Starters\nBread,1,Starters\n')
+        self.addCleanup(os.remove, source.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_menu', source.name, stdout=out, stderr=err)
+        self.assertIn('Created 1 and updated 0 menu items, created 1 categories, skipped 1 rows.', out.getvalue())
+        self.assertIn('row 2:', err.getvalue())
+
+
+@patch('LittlelemonAPI.dispatch.MAX_OPEN_DELIVERIES', 3)
+class DispatchTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        #the fixture's orders are all assigned to the crew member; five more wait in the queue, oldest first
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:18]]).update(status=True)
+        self.queued = [
+            Order.objects.create(user=self.customer, total=10, date=timezone.now() - timedelta(minutes=10 - i))
+            for i in range(5)
+        ]
+        rebuild_rollups()
+        self.second_crew = User.objects.create_user('crew2')
+        Group.objects.get(name='delivery-crew').user_set.add(self.second_crew)
+
+    def assertRollupsRebuildable(self):
+        maintained = RollupTests.rollups(self)
+        rebuild_rollups()
+        self.assertEqual(maintained, RollupTests.rollups(self))
+
+    def test_queue_is_read_from_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plans are checked against SQLite')
+        plan = dispatch_queue().values_list('id', 'date', 'status')[:5].explain()
+        self.assertRegex(plan, r'SEARCH LittlelemonAPI_order USING|SCAN LittlelemonAPI_order USING (COVERING )?INDEX')
+        self.assertEqual(list(dispatch_queue().values_list('id', flat=True)), [order.pk for order in self.queued])
+
+    def test_claims_take_the_oldest_orders_up_to_the_limit(self):
+        client = self.client_for(self.second_crew)
+        response = client.post('/api/deliveries/claim', {'count': 2}, format='json')
+        self.assertEqual([order['id'] for order in response.data], [order.pk for order in self.queued[:2]])
+        response = client.post('/api/deliveries/claim', {'count': 5}, format='json')
+        self.assertEqual([order['id'] for order in response.data], [self.queued[2].pk])
+        self.assertEqual(client.post('/api/deliveries/claim').data, [])
+        #the fixture crew member already holds two open orders
+        response = self.client_for(self.crew).post('/api/deliveries/claim', {'count': 5}, format='json')
+        self.assertEqual([order['id'] for order in response.data], [self.queued[3].pk])
+        self.assertEqual(self.client_for(self.customer).post('/api/deliveries/claim').status_code, 403)
+        self.assertEqual(client.post('/api/deliveries/claim', {'count': 0}, format='json').status_code, 400)
+        self.assertRollupsRebuildable()
+
+    def test_my_deliveries(self):
+        client = self.client_for(self.crew)
+        with self.assertNumQueries(2):
+            response = client.get('/api/deliveries')
+        self.assertEqual([order['id'] for order in response.data], [order.pk for order in self.orders[18:]])
+        self.assertEqual(self.client_for(self.second_crew).get('/api/deliveries').data, [])
+        self.assertEqual(self.client_for(self.manager).get('/api/deliveries').status_code, 403)
+
+    def test_dispatch_balances_the_load(self):
+        response = self.client_for(self.manager).post('/api/dispatch', format='json')
+        self.assertEqual(response.status_code, 200)
+        #crew holds 2 of 3 and takes one, crew2 takes three
+        self.assertEqual(response.data['assigned'], 4)
+        assigned = {row['delivery_crew']: row['orders'] for row in response.data['assignments']}
+        self.assertEqual(len(assigned[self.crew.pk]), 1)
+        self.assertEqual(len(assigned[self.second_crew.pk]), 3)
+        self.assertEqual(list(dispatch_queue().values_list('id', flat=True)), [self.queued[-1].pk])
+        self.assertEqual(self.client_for(self.manager).post('/api/dispatch').data['assigned'], 0)
+        self.assertEqual(self.client_for(self.crew).post('/api/dispatch').status_code, 403)
+        self.assertRollupsRebuildable()
+
+    def test_command(self):
+        out = StringIO()
+        call_command('dispatch_orders', '--limit', '2', stdout=out)
+        self.assertIn('Assigned 2 orders.', out.getvalue())
+        self.assertEqual(dispatch_queue().count(), 3)
+
+
+class SharedThrottleTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'throttle.sqlite3')
+        self.store = ThrottleStore(self.path)
+
+    def test_burst_then_one_request_per_interval(self):
+        results = [self.store.acquire('user_1', 10, 60, now=1000) for _ in range(11)]
+        self.assertEqual([allowed for allowed, _ in results], [True] * 10 + [False])
+        self.assertEqual(results[-1][1], 6)
+        self.assertFalse(self.store.acquire('user_1', 10, 60, now=1005.9)[0])
+        self.assertTrue(self.store.acquire('user_1', 10, 60, now=1006)[0])
+        self.assertFalse(self.store.acquire('user_1', 10, 60, now=1006)[0])
+        self.assertTrue(self.store.acquire('user_2', 10, 60, now=1006)[0])
+
+    def test_state_is_shared_between_connections(self):
+        #a second store on the same file stands in for another worker process
+        other = ThrottleStore(self.path)
+        for i in range(5):
+            self.assertTrue(self.store.acquire('user_1', 10, 60, now=1000)[0])
+            self.assertTrue(other.acquire('user_1', 10, 60, now=1000)[0])
+        self.assertFalse(other.acquire('user_1', 10, 60, now=1000)[0])
+        self.assertEqual(len(self.store), 1)
+
+    @patch('LittlelemonAPI.throttling.PURGE_EVERY', 3)
+    def test_recovered_keys_are_purged(self):
+        self.store.acquire('user_1', 10, 60, now=1000)
+        self.store.acquire('user_2', 10, 60, now=1000)
+        self.store.acquire('user_3', 10, 60, now=2000)
+        self.assertEqual(len(self.store), 1)
+
+    def test_views_are_throttled_across_workers(self):
+        client = self.client_for(self.customer)
+        statuses = [client.get('/api/throttle').status_code for _ in range(10)]
+        self.assertEqual(statuses, [200] * 10)
+        #the throttle state is in the store, not in this process's cache
+        cache.clear()
+        response = client.get('/api/throttle')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '6')
+
+
+class IdempotencyKeyTests(LittleLemonTestCase):
+
+    def place_order(self, user, key, data=None):
+        return self.client_for(user).post('/api/orders', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.place_order(self.customer, 'checkout-1')
+        self.assertEqual(first.status_code, 201)
+        orders = Order.objects.count()
+        with self.assertNumQueries(1):
+            retry = self.place_order(self.customer, 'checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), orders)
+        #a new key is a new checkout, of an empty cart by now; that answer is kept too
+        self.assertEqual(self.place_order(self.customer, 'checkout-2').status_code, 400)
+        Cart.objects.create(user=self.customer, menuitem=self.menu_items[0], quantity=1)
+        rebuild_cart_summaries()
+        self.assertEqual(self.place_order(self.customer, 'checkout-2').status_code, 400)
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_keys_belong_to_a_user_and_a_request(self):
+        self.assertEqual(self.place_order(self.customer, 'same').status_code, 201)
+        #the manager may not place orders at all; the key of another user does not replay
+        self.assertEqual(self.place_order(self.manager, 'same').status_code, 403)
+        self.assertEqual(self.place_order(self.customer, 'same', {'note': 'other'}).status_code, 422)
+        self.assertEqual(self.place_order(self.customer, 'x' * 256).status_code, 400)
+
+    def test_failed_requests_leave_the_key_free(self):
+        client = self.client_for(self.customer)
+        client.raise_request_exception = False
+        with patch('LittlelemonAPI.views.checkout_cart', side_effect=RuntimeError):
+            self.assertEqual(client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='retry').status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.place_order(self.customer, 'retry').status_code, 201)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_keys_expire(self):
+        first = self.place_order(self.customer, 'old')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+        Cart.objects.create(user=self.customer, menuitem=self.menu_items[0], quantity=1)
+        rebuild_cart_summaries()
+        second = self.place_order(self.customer, 'old')
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.data['id'], first.data['id'])
+
+
+class OrderEventTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.customer).key
+        previous = order_events.backend
+        order_events.backend = LocalEventBackend(order_events)
+        self.addCleanup(setattr, order_events, 'backend', previous)
+
+    def patch_order(self, user, order, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(user).patch(f'/api/orders/{order.pk}', data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    async def read(self, chunks):
+        return await asyncio.wait_for(chunks.__anext__(), 5)
+
+    def test_subscribers_get_the_changes_of_their_orders(self):
+        order = self.orders[0]
+
+        async def stream():
+            response = await AsyncClient().get('/api/orders/events', headers={'Authorization': f'Token {self.token}'})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(await self.read(chunks), b'retry: 3000\n\n')
+            self.assertEqual(len(order_events), 1)
+            await sync_to_async(self.patch_order)(self.crew, order, {'status': 1})
+            await sync_to_async(self.patch_order)(self.manager, order, {'delivery_crew': None})
+            events = [await self.read(chunks), await self.read(chunks)]
+            await chunks.aclose()
+            return events
+
+        delivered, unassigned = async_to_sync(stream)()
+        self.assertEqual(delivered, f'id: 1\nevent: order\ndata: {{"id":{order.pk},"status":true,"delivery_crew":{self.crew.pk}}}\n\n'.encode())
+        self.assertIn(b'"delivery_crew":null', unassigned)
+        self.assertEqual(len(order_events), 0)
+
+    def test_channels(self):
+        order = self.orders[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            Order.objects.get(pk=order.pk).save()
+        self.assertEqual(len(callbacks), 1)
+        event = order_event(order.pk, self.customer.pk, None, False, previous_crew_id=self.crew.pk, deleted=True)
+        self.assertEqual(event['event'], 'order_deleted')
+        self.assertEqual(event['channels'], ['managers', f'user:{self.crew.pk}', f'user:{self.customer.pk}'])
+
+    def test_reassigned_orders_are_reported_to_the_previous_crew_member(self):
+        order = self.orders[0]
+        crew = User.objects.create_user('crew2')
+        with patch.object(order_events, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.manager).patch(f'/api/orders/{order.pk}', {'delivery_crew': crew.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        [event], = publish.call_args.args
+        self.assertEqual(event['channels'], sorted(['managers', *(user_channel(user.pk) for user in (self.crew, crew, self.customer))]))
+
+    def test_archival_and_disabled_backend_publish_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            list(archive_orders(timezone.now() + timedelta(days=1)))
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Order.objects.exists())
+
+        with override_settings(ORDER_EVENTS_BACKEND=None), self.captureOnCommitCallbacks() as callbacks:
+            Order.objects.create(user=self.customer, total=10)
+        self.assertEqual(callbacks, [])
+
+    def test_slow_subscribers_are_told_to_resync(self):
+        async def stream():
+            subscription = order_events.subscribe(user_channel(self.customer.pk))
+            chunks = event_stream(subscription, keepalive=0.01)
+            await self.read(chunks)
+            self.assertEqual(await self.read(chunks), ': keepalive\n\n')
+            for _ in range(MAX_PENDING + 1):
+                order_events.publish([order_event(1, self.customer.pk, None, False)])
+            await asyncio.sleep(0)
+            first, second = await self.read(chunks), await self.read(chunks)
+            await chunks.aclose()
+            return first, second
+
+        first, second = async_to_sync(stream)()
+        self.assertEqual(first, 'event: resync\ndata: {}\n\n')
+        self.assertTrue(second.startswith('id: 1\n'))
+
+    def test_events_stay_in_process_by_default(self):
+        self.assertEqual(settings.ORDER_EVENTS_BACKEND, 'LittlelemonAPI.events.LocalEventBackend')
+        self.assertIsInstance(OrderEventBroker().backend, LocalEventBackend)
+
+    def test_sqlite_backend_reaches_other_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'events.sqlite3')
+        #two brokers on the same file stand in for two worker processes
+        publisher, subscriber = OrderEventBroker(), OrderEventBroker()
+        publisher.backend = SQLiteEventBackend(publisher, path)
+        subscriber.backend = SQLiteEventBackend(subscriber, path)
+        self.addCleanup(subscriber.backend.stop)
+
+        async def stream():
+            subscription = subscriber.subscribe(MANAGERS)
+            publisher.publish([order_event(7, self.customer.pk, None, True)])
+            event = await asyncio.wait_for(subscription.queue.get(), 5)
+            subscription.close()
+            return event
+
+        event = async_to_sync(stream)()
+        self.assertEqual(event['data'], {'id': 7, 'status': True, 'delivery_crew': None})
+
+    def test_wsgi_requests_are_not_streamed(self):
+        self.assertEqual(self.client_for(self.customer).get('/api/orders/events').status_code, 501)
+
+
+class ConditionalRequestTests(LittleLemonTestCase):
+
+    def test_unchanged_resources_answer_304_without_serializing(self):
+        item, order = self.menu_items[0], self.orders[0]
+        for user, path, serializer in (
+            (self.customer, f'/api/menu-items/{item.pk}', 'MenuItemSerializer'),
+            (self.customer, f'/api/category/{self.categories[0].pk}', 'CategorySerializer'),
+            (self.crew, f'/api/orders/{order.pk}', 'OrderSerializer'),
+        ):
+            with self.subTest(path=path):
+                client = self.client_for(user)
+                response = client.get(path)
+                self.assertEqual(response.status_code, 200)
+                with patch(f'LittlelemonAPI.views.{serializer}') as mock, self.assertNumQueries(2):
+                    self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+                    self.assertEqual(client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+                mock.assert_not_called()
+                self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+        #another user's order is still refused, whatever the validators
+        etag = self.client_for(self.customer).get(f'/api/orders/{order.pk}')['ETag']
+        other = User.objects.create_user('another')
+        self.assertEqual(self.client_for(other).get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+    def test_validators_change_with_the_representation(self):
+        item = self.menu_items[0]
+        client = self.client_for(self.manager)
+        etag = client.get(f'/api/menu-items/{item.pk}')['ETag']
+        #renaming the category changes the item's representation, so its ETag
+        client.patch(f'/api/category/{item.category_id}', {'title': 'Renamed'}, format='json')
+        self.assertEqual(client.get(f'/api/menu-items/{item.pk}', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        #dispatch assigns orders with QuerySet.update()
+        order = Order.objects.create(user=self.customer, total=10)
+        etag = client.get(f'/api/orders/{order.pk}')['ETag']
+        crew = User.objects.create_user('crew2')
+        Group.objects.get(name='delivery-crew').user_set.add(crew)
+        self.assertEqual(self.client_for(crew).post('/api/deliveries/claim').data[0]['id'], order.pk)
+        self.assertEqual(client.get(f'/api/orders/{order.pk}', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_match_prevents_lost_updates(self):
+        item = self.menu_items[0]
+        first, second = self.client_for(self.manager), self.client_for(self.manager)
+        etag = first.get(f'/api/menu-items/{item.pk}')['ETag']
+        response = first.patch(f'/api/menu-items/{item.pk}', {'price': '9.50'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = second.patch(f'/api/menu-items/{item.pk}', {'price': '1.00'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        item.refresh_from_db()
+        self.assertEqual(item.price, Decimal('9.50'))
+        self.assertEqual(second.delete(f'/api/menu-items/{item.pk}', HTTP_IF_MATCH=etag).status_code, 412)
+
+        order = self.orders[0]
+        etag = first.get(f'/api/orders/{order.pk}')['ETag']
+        self.assertEqual(first.patch(f'/api/orders/{order.pk}', {'status': 1}, format='json', HTTP_IF_MATCH=etag).status_code, 200)
+        self.assertEqual(second.patch(f'/api/orders/{order.pk}', {'status': 0}, format='json', HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(self.client_for(self.crew).patch(
+            f'/api/orders/{order.pk}', {'status': 0}, format='json', HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(second.patch(f'/api/orders/{order.pk}', {'status': 0}, format='json', HTTP_IF_MATCH='*').status_code, 200)
+
+        category = self.categories[1]
+        etag = first.get(f'/api/category/{category.pk}')['ETag']
+        first.patch(f'/api/category/{category.pk}', {'title': 'First'}, format='json')
+        self.assertEqual(second.put(f'/api/category/{category.pk}', {'title': 'Second'}, format='json', HTTP_IF_MATCH=etag).status_code, 412)
+
+    def test_async_views_send_the_same_validators(self):
+        token = Token.objects.create(user=self.customer).key
+        path = f'/api/menu-items/{self.menu_items[0].pk}'
+        etag = self.client_for(self.customer).get(path)['ETag']
+        response = async_to_sync(AsyncClient().get)(path, headers={'Authorization': f'Token {token}'})
+        self.assertEqual(response['ETag'], etag)
+        response = async_to_sync(AsyncClient().get)(path, headers={'Authorization': f'Token {token}', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class RenderingTests(LittleLemonTestCase):
+
+    def test_fast_renderer_matches_drf(self):
+        data = [{
+            'price': Decimal('5.50'), 'date': timezone.now(), 'day': timezone.localdate(), 'text': 'caf\u00e9\u2028',
+            1: None, 'big': 2 ** 70, 'items': (1, 2.5),
+        }]
+        for media_type in (None, 'application/json; indent=4'):
+            self.assertEqual(FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+        response = self.client_for(self.manager).get('/api/orders')
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_large_responses_are_compressed(self):
+        client = self.client_for(self.manager)
+        plain = client.get('/api/orders')
+        self.assertGreater(len(plain.content), COMPRESSION_MIN_SIZE)
+        response = client.get('/api/orders', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertFalse(client.get('/api/orders', HTTP_ACCEPT_ENCODING='gzip;q=0, identity').has_header('Content-Encoding'))
+        #small responses are not worth it
+        small = client.get(f'/api/menu-items/{self.menu_items[0].pk}', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+    def test_weak_etags_of_compressed_responses_satisfy_if_match(self):
+        client = self.client_for(self.manager)
+        path = f'/api/menu-items/{self.menu_items[0].pk}'
+        with patch('LittlelemonAPI.compression.COMPRESSION_MIN_SIZE', 0):
+            etag = client.get(path, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(client.patch(path, {'price': '7.00'}, format='json', HTTP_IF_MATCH=etag).status_code, 200)
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding('identity, deflate'))
+        self.assertIsNone(negotiate_encoding('*;q=0'))
+        self.assertIsNone(negotiate_encoding(''))
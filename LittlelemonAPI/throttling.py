@@ -0,0 +1,90 @@
+import time
+
+from rest_framework import throttling
+
+from .sqlite_files import SharedSQLiteFile
+
+#Rate limiting shared by every worker process of a host.
+#DRF's throttles keep a list of request timestamps per key in the default cache, read, trimmed and
+#pickled back on every request; with the locmem cache each worker also counts only its own requests.
+#The throttles below keep a single number per key instead, the GCRA "theoretical arrival time": a key
+#with a rate of N requests per period P may run ahead of the clock by at most P, and every request
+#moves it on by P/N. The state lives in a small SQLite file (THROTTLE_STORE_PATH, read when a connection is
+#opened so tests and benchmarks can point it elsewhere) that all workers on the host open, and each check is
+#one UPSERT statement, so it is O(1) and atomic across processes.
+#A burst of N requests is allowed, after which requests are let through one every P/N seconds.
+
+_MICROSECONDS = 1_000_000
+#keys that have fully recovered carry no information; they are purged every this many checks per process
+PURGE_EVERY = 1000
+
+_SCHEMA = 'CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat INTEGER NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID'
+#every expression of DO UPDATE sees the old row, so `allowed` and `tat` are decided from the same state
+_ACQUIRE = '''
+    INSERT INTO throttle (key, tat, allowed) VALUES (:key, :now + :interval, 1)
+    ON CONFLICT (key) DO UPDATE SET
+        allowed = max(tat, :now) + :interval - :now <= :period,
+        tat = CASE WHEN max(tat, :now) + :interval - :now <= :period THEN max(tat, :now) + :interval ELSE tat END
+    RETURNING allowed, tat
+'''
+
+
+class ThrottleStore:
+
+    #without a path, the store follows the THROTTLE_STORE_PATH setting
+    def __init__(self, path=None):
+        self._file = SharedSQLiteFile(path, 'THROTTLE_STORE_PATH', 'littlelemon-throttle.sqlite3', _SCHEMA)
+        self._checks = 0
+
+    @property
+    def path(self):
+        return self._file.path
+
+    def _connection(self):
+        return self._file.connection()
+
+    #records a request for `key` against `num_requests` per `duration` seconds at time `now`;
+    #returns (allowed, seconds until the next request would be allowed)
+    def acquire(self, key, num_requests, duration, now=None):
+        now = int((time.time() if now is None else now) * _MICROSECONDS)
+        period = duration * _MICROSECONDS
+        interval = period // num_requests
+        connection = self._connection()
+        allowed, tat = connection.execute(_ACQUIRE, {'key': key, 'now': now, 'interval': interval, 'period': period}).fetchone()
+        self._checks += 1
+        if self._checks % PURGE_EVERY == 0:
+            connection.execute('DELETE FROM throttle WHERE tat < ?', (now,))
+        return bool(allowed), max(0, tat + interval - period - now) / _MICROSECONDS
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM throttle').fetchone()[0]
+
+
+throttle_store = ThrottleStore()
+
+
+class SharedRateThrottleMixin:
+    #DRF's cache key, scope and rate parsing, with the state in throttle_store
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self._wait = throttle_store.acquire(self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class AnonRateThrottle(SharedRateThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SharedRateThrottleMixin, throttling.UserRateThrottle):
+    pass
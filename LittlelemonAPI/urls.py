@@ -5,20 +5,39 @@ from rest_framework.authtoken.views import obtain_auth_token
 urlpatterns=[
      # throttle check
     path('throttle', views.throttle_check),
+
+    # profiling (admin only)
+    path('profiling', views.profiling_report),
     
     path('category',views.item_category),
     path('category/<int:id>', views.category_single),
 
+    path('menu',views.menu_snapshot),
     path('menu-items/',views.menu_items),
+    path('menu-items/import',views.menu_import),
     path('menu-items/<int:id>',views.menu_single),
 
     path('groups/<str:group_name>/users', views.group_users),
     path('groups/<str:group_name>/users/<int:userId>', views.group_user_detail),
     
     path('cart/menu-items',views.cart_management),
+    path('cart/menu-items/batch',views.cart_batch),
+    path('cart/summary',views.cart_summary),
     
     path('orders',views.order_management),
+    path('orders/archive',views.order_archive),
+    path('orders/export',views.order_export),
+    path('orders/events',views.order_event_stream),
     path('orders/<int:orderId>',views.order_detail),
 
+    path('deliveries',views.my_deliveries),
+    path('deliveries/claim',views.claim_deliveries),
+    path('dispatch',views.dispatch),
+
+    path('reports/revenue',views.report_revenue),
+    path('reports/top-items',views.report_top_items),
+    path('reports/category-mix',views.report_category_mix),
+    path('reports/crew-throughput',views.report_crew_throughput),
+
     path('api-token-auth/',obtain_auth_token), #admin: "token": "1f5ba40d017278c8292172e9063bb2fc94a54fe4"  #adrian:"token": "3c3589b0086bb93a2a7452ad39d2e010c7d01fe6"  #mario:"token": "b60885157331f37c6b2f3b64cc655fbb7af64e23"
 ]                                           
\ No newline at end of file
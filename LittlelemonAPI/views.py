@@ -1,20 +1,42 @@
 from django.shortcuts import render
 from django.contrib.auth.models import User,Group
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 
 # Create your views here.
 from rest_framework import generics
 from rest_framework.response import Response
-from rest_framework.decorators import api_view,permission_classes,throttle_classes
+from rest_framework.decorators import api_view,parser_classes,permission_classes,throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import IsAdminUser
 from rest_framework import status
-from rest_framework.throttling import AnonRateThrottle,UserRateThrottle
+from rest_framework.parsers import JSONParser
 from django.db import transaction
-from django.core.paginator import Paginator,EmptyPage
-
-from .models import MenuItem,Category,Cart,Order,OrderItem
-from .serializers import MenuItemSerializer,UserSerializer,CategorySerializer,CartSerializer,OrderSerializer,OrderItemSerializer
+from django.db.models import F,Sum
+from decimal import Decimal
+from django.core.paginator import Paginator,EmptyPage,PageNotAnInteger
+from django.core.cache import cache
+from django.http import HttpResponse,StreamingHttpResponse
+import json
+
+from .models import MenuItem,Category,Cart,Order,OrderItem,ArchivedOrder,DailySales,DailyMenuItemSales,DailyCategorySales,DailyCrewSales
+from .archive import filter_date_range,get_order_or_archived
+from .dispatch import claim_orders,dispatch_orders,open_deliveries
+from .conditional import category_validators,conditional_get,for_update,if_match,menu_item_validators,order_validators,precondition_failed_response,validator_headers
+from .idempotency import idempotent
+from .export import CONTENT_TYPES,export_csv,export_ndjson,filter_export,streaming_content
+from .rollups import locked_order_state,parse_day_range,record_new_order,record_order_change,record_order_removal
+from .serializers import CART_SUBTOTAL_MAX,MenuItemSerializer,UserSerializer,CategorySerializer,CartSerializer,CartBatchItemSerializer,CartSummarySerializer,OrderSerializer,OrderItemSerializer,DailySalesSerializer,SalesTotalsSerializer,TopItemSerializer,CategoryMixSerializer,CrewThroughputSerializer
+from .fast_serializers import CART_VALUES,MENU_ITEM_VALUES,ORDER_VALUES,serialize_cart,serialize_menu_items,serialize_orders
+from .cart_summary import apply_cart_delta,cart_rows_totals,clear_cart_summary,get_cart_summary,lock_cart_summary
+from .menu_cache import MENU_CACHE_TIMEOUT,etag_matches,listing_cache_key
+from .menu_import import CSVParser,import_menu_items
+from .menu_snapshot import FEATURED,FULL,category_slice,get_menu_snapshot,snapshot_etag
+from .pagination import CURSOR_PARAM,paginate_by_cursor,parse_page_size
+from .filters import filter_menu_items,order_menu_items
+from .throttling import AnonRateThrottle,UserRateThrottle
+from .roles import DELIVERY_CREW,MANAGER,has_role,is_delivery_crew,is_manager
+from .profiling import clear_records,get_records,serializer_data,summarize_records
 from django.contrib.auth.models import User, Group
 
 
@@ -24,6 +46,20 @@ from django.contrib.auth.models import User, Group
 def throttle_check(request):
     return Response({"message": "Throttle check."})
 
+# Profiling: per-view breakdown of the sampled requests in this process's ring buffer
+# ?raw=1 returns the records themselves; DELETE empties the buffer
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def profiling_report(request):
+    if request.method == 'DELETE':
+        clear_records()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    records = get_records()
+    data = {'sample_rate': settings.PROFILING_SAMPLE_RATE, 'views': summarize_records(records)}
+    if request.query_params.get('raw'):
+        data['records'] = records
+    return Response(data)
+
 #start of user & group management
 
 #manager can add perosn to specific group
@@ -38,7 +74,7 @@ def group_users(request, group_name):
     if request.method == 'GET':
         users_in_group = group.user_set.all()
         serialized_users = UserSerializer(users_in_group, many=True)
-        return Response(serialized_users.data)
+        return Response(serializer_data(serialized_users))
 
     elif request.method == 'POST':
         username = request.data.get('username')
@@ -61,7 +97,7 @@ def group_user_detail(request, group_name, userId):
     except User.DoesNotExist:
         return Response({"message": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    if user in group.user_set.all():
+    if group.user_set.filter(pk=user.pk).exists():
         group.user_set.remove(user)
         message = f'User is removed from {group_name} group'
         return Response({"message": message}, status=status.HTTP_200_OK)
@@ -83,14 +119,14 @@ def item_category(request):
     if request.method=='GET':
         categories=Category.objects.all()
         serialized_item=CategorySerializer(categories,many=True)
-        return Response(serialized_item.data,status.HTTP_200_OK)
+        return Response(serializer_data(serialized_item),status.HTTP_200_OK)
     
     # Check if the user is either a Manager or an Admin (superuser)
-    if request.method == 'POST' and (request.user.groups.filter(name='Manager').exists() or request.user.is_superuser):
+    if request.method == 'POST' and (is_manager(request.user) or request.user.is_superuser):
         serialized_item = CategorySerializer(data=request.data)
         serialized_item.is_valid(raise_exception=True)
         serialized_item.save()
-        return Response(serialized_item.data, status=status.HTTP_201_CREATED)
+        return Response(serializer_data(serialized_item), status=status.HTTP_201_CREATED)
 
     return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
 
@@ -105,33 +141,38 @@ def item_category(request):
 def category_single(request, id):
     item = get_object_or_404(Category, pk=id)
     
-    # Handle GET request
+    # Handle GET request: 304 if the client's copy is current (see conditional.py)
     if request.method == 'GET':
-        serialized_item = CategorySerializer(item)
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        return conditional_get(request, category_validators(item), lambda: serializer_data(CategorySerializer(item)))
     
     # Authorization check for Managers or Admins for PUT, PATCH, DELETE
-    if not (request.user.groups.filter(name='Manager').exists() or request.user.is_superuser):
+    if not (is_manager(request.user) or request.user.is_superuser):
         return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
 
-    # Handle PUT request
-    if request.method == 'PUT':
-        serialized_item = CategorySerializer(item, data=request.data)
-        serialized_item.is_valid(raise_exception=True)
-        serialized_item.save()
-        return Response(serialized_item.data, status.HTTP_200_OK)
+    # If-Match is checked against the locked row, so concurrent managers cannot overwrite each other's changes
+    with transaction.atomic():
+        item = for_update(request, Category.objects, item)
+        if not if_match(request, category_validators(item)):
+            return precondition_failed_response(category_validators(item))
 
-    # Handle PATCH request
-    if request.method == 'PATCH':
-        serialized_item = CategorySerializer(item, data=request.data, partial=True)
-        serialized_item.is_valid(raise_exception=True)
-        serialized_item.save()
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        # Handle PUT request
+        if request.method == 'PUT':
+            serialized_item = CategorySerializer(item, data=request.data)
+            serialized_item.is_valid(raise_exception=True)
+            serialized_item.save()
+            return Response(serializer_data(serialized_item), status.HTTP_200_OK, headers=validator_headers(category_validators(item)))
 
-    # Handle DELETE request
-    if request.method == 'DELETE':
-        item.delete()
-        return Response(status.HTTP_204_NO_CONTENT)
+        # Handle PATCH request
+        if request.method == 'PATCH':
+            serialized_item = CategorySerializer(item, data=request.data, partial=True)
+            serialized_item.is_valid(raise_exception=True)
+            serialized_item.save()
+            return Response(serializer_data(serialized_item), status.HTTP_200_OK, headers=validator_headers(category_validators(item)))
+
+        # Handle DELETE request
+        if request.method == 'DELETE':
+            item.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
 # end of cataegories  
 
@@ -148,41 +189,103 @@ def category_single(request, id):
 @throttle_classes([AnonRateThrottle, UserRateThrottle])
 def menu_items(request):
     if request.method=='GET':
-        items=MenuItem.objects.select_related('category').all()
+        #the listing is the same for every user, so whole pages are cached per menu version and query
+        cache_key,etag=listing_cache_key(request.query_params)
+        if etag_matches(request,etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,headers={'ETag':etag})
+        data=cache.get(cache_key)
+        if data is not None:
+            return Response(data,status.HTTP_200_OK,headers={'ETag':etag})
+
         #start of seraching,filtering and pagination
-        category_name=request.query_params.get('category')
-        to_price=request.query_params.get('to_price')
-        search=request.query_params.get('to_price')
-        ordering=request.query_params.get('ordering')
-        perpage=request.query_params.get('perpage',default=2)
-        page=request.query_params.get('page',default=1)
-        if category_name:
-            items=items.filter(category__title=category_name) #double underscore is used to filter linked models
-        if to_price:
-            items=items.filter(price__lte=to_price)
-        if search:
-            items=items.filter(title__istartwith=search)
-        if ordering:
-            ordering_fields=ordering.split(",")
-            items=items.order_by(*ordering_fields)
-        paginator=Paginator(items,per_page=perpage)
+        items,ordering,perpage,page=menu_listing(request.query_params)
+        if CURSOR_PARAM in request.query_params:
+            #keyset mode: walks (price, id) on the price index, no COUNT and no OFFSET
+            if ordering not in (None,'price','-price'):
+                return Response({"message": "Cursor pagination only supports ordering by price or -price."}, status.HTTP_400_BAD_REQUEST)
+            items,next_link=paginate_by_cursor(request,items.values(*MENU_ITEM_VALUES),ordering or 'price',perpage)
+            data={'results':serialize_menu_items(items),'next':next_link}
+            cache.set(cache_key,data,MENU_CACHE_TIMEOUT)
+            return Response(data,status.HTTP_200_OK,headers={'ETag':etag})
+        items=order_menu_items(items,ordering)
+        #the page is read as plain rows and rendered by the read-only fast path (see fast_serializers.py)
+        paginator=Paginator(items.values(*MENU_ITEM_VALUES),per_page=perpage)
         try:
             items=paginator.page(number=page)
         except EmptyPage:
             items=[]
+        except PageNotAnInteger:
+            return Response({"page": ["A valid integer is required."]}, status.HTTP_400_BAD_REQUEST)
         #end of seraching,filtering and pagination
-        serialized_item=MenuItemSerializer(items,many=True)
-        return Response(serialized_item.data,status.HTTP_200_OK)
+        data=serialize_menu_items(items)
+        cache.set(cache_key,data,MENU_CACHE_TIMEOUT)
+        return Response(data,status.HTTP_200_OK,headers={'ETag':etag})
     
     # Check if the user is either a Manager or an Admin (superuser)
-    if request.method == 'POST' and (request.user.groups.filter(name='Manager').exists() or request.user.is_superuser):
+    if request.method == 'POST' and (is_manager(request.user) or request.user.is_superuser):
         serialized_item = MenuItemSerializer(data=request.data)
         serialized_item.is_valid(raise_exception=True)
         serialized_item.save()
-        return Response(serialized_item.data, status=status.HTTP_201_CREATED)
+        return Response(serializer_data(serialized_item), status=status.HTTP_201_CREATED)
 
     return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
 
+#endpoint: /api/menu-items/import
+#managers and admins load a whole menu in one request: a JSON list or a text/csv body of
+#title, price, featured, category rows (see menu_import.py); menu items are matched by title and
+#categories by slug, both created when missing. Invalid rows are reported by number and skipped.
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+@parser_classes([JSONParser,CSVParser])
+def menu_import(request):
+    if not (is_manager(request.user) or request.user.is_superuser):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    return Response(import_menu_items(request.data),status=status.HTTP_200_OK)
+
+#filtered listing queryset plus the ordering, page size and page asked for; shared with async_views.menu_items
+def menu_listing(query_params):
+    perpage=parse_page_size(query_params.get('perpage',default=2))
+    items=filter_menu_items(MenuItem.objects.select_related('category').all(),query_params)
+    return items,query_params.get('ordering'),perpage,query_params.get('page',default=1)
+
+
+#endpoint: /api/menu
+#the whole menu in one response: {"categories": [...], "menu_items": [...]}
+#?category=<title> returns that category's items, ?featured=true the featured items.
+#Served from the pre-serialized snapshot (see menu_snapshot.py), no ORM or serializer work per request
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AnonRateThrottle, UserRateThrottle])
+def menu_snapshot(request):
+    name,error=menu_snapshot_slice(request.query_params)
+    if error:
+        return Response({"message": error}, status.HTTP_400_BAD_REQUEST)
+    version,snapshot=get_menu_snapshot()
+    etag=snapshot_etag(version,name)
+    if etag_matches(request,etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED,headers={'ETag':etag})
+    #a category without items, or one that does not exist, has an empty slice like the listing filter
+    body=snapshot.get(name,b'[]')
+    if request.accepted_renderer.format!='json':
+        return Response(json.loads(body),status.HTTP_200_OK,headers={'ETag':etag})
+    return HttpResponse(body,content_type='application/json',headers={'ETag':etag})
+
+
+#(snapshot slice asked for by the query params, error message); shared with async_views.menu_snapshot
+def menu_snapshot_slice(query_params):
+    category=query_params.get('category')
+    featured=query_params.get('featured')
+    if category and featured:
+        return None,"Filter by either category or featured, not both."
+    if category:
+        return category_slice(category),None
+    if featured:
+        if featured.lower() not in ('true','1'):
+            return None,"featured only accepts true."
+        return FEATURED,None
+    return FULL,None
+
 
 # endpoint: /api/menu-items/{menuItem}
 # allow GET for all users
@@ -194,35 +297,41 @@ def menu_items(request):
 @permission_classes([IsAuthenticated])
 @throttle_classes([AnonRateThrottle, UserRateThrottle])
 def menu_single(request, id):
-    item = get_object_or_404(MenuItem, pk=id)
+    items = MenuItem.objects.select_related('category')
+    item = get_object_or_404(items, pk=id)
     
-    # Handle GET request
+    # Handle GET request: 304 if the client's copy is current (see conditional.py)
     if request.method == 'GET':
-        serialized_item = MenuItemSerializer(item)
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        return conditional_get(request, menu_item_validators(item), lambda: serializer_data(MenuItemSerializer(item)))
     
     # Authorization check for Managers or Admins for PUT, PATCH, DELETE
-    if not (request.user.groups.filter(name='Manager').exists() or request.user.is_superuser):
+    if not (is_manager(request.user) or request.user.is_superuser):
         return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
 
-    # Handle PUT request
-    if request.method == 'PUT':
-        serialized_item = MenuItemSerializer(item, data=request.data)
-        serialized_item.is_valid(raise_exception=True)
-        serialized_item.save()
-        return Response(serialized_item.data, status.HTTP_200_OK)
+    # If-Match is checked against the locked row, so concurrent managers cannot overwrite each other's changes
+    with transaction.atomic():
+        item = for_update(request, items, item)
+        if not if_match(request, menu_item_validators(item)):
+            return precondition_failed_response(menu_item_validators(item))
 
-    # Handle PATCH request
-    if request.method == 'PATCH':
-        serialized_item = MenuItemSerializer(item, data=request.data, partial=True)
-        serialized_item.is_valid(raise_exception=True)
-        serialized_item.save()
-        return Response(serialized_item.data, status.HTTP_200_OK)
+        # Handle PUT request
+        if request.method == 'PUT':
+            serialized_item = MenuItemSerializer(item, data=request.data)
+            serialized_item.is_valid(raise_exception=True)
+            serialized_item.save()
+            return Response(serializer_data(serialized_item), status.HTTP_200_OK, headers=validator_headers(menu_item_validators(item)))
 
-    # Handle DELETE request
-    if request.method == 'DELETE':
-        item.delete()
-        return Response(status.HTTP_204_NO_CONTENT)
+        # Handle PATCH request
+        if request.method == 'PATCH':
+            serialized_item = MenuItemSerializer(item, data=request.data, partial=True)
+            serialized_item.is_valid(raise_exception=True)
+            serialized_item.save()
+            return Response(serializer_data(serialized_item), status.HTTP_200_OK, headers=validator_headers(menu_item_validators(item)))
+
+        # Handle DELETE request
+        if request.method == 'DELETE':
+            item.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
 #end of menu-items
 
@@ -241,33 +350,171 @@ def cart_management(request):
     current_user = request.user
 
     # Ensure the user is not part of 'Manager' or 'Delivery crew' groups
-    if current_user.groups.filter(name__in=['manager', 'delivery-crew']).exists() or current_user.is_superuser:
+    if has_role(current_user, MANAGER, DELIVERY_CREW) or current_user.is_superuser:
         return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
 
     # GET: Return current items in the cart for the current user token
     if request.method == 'GET':
-        cart_items = Cart.objects.filter(user=current_user)
-        serialized_items = CartSerializer(cart_items, many=True)
-        return Response(serialized_items.data, status.HTTP_200_OK)
+        return Response(cart_listing(current_user), status.HTTP_200_OK, headers=cart_summary_headers(current_user))
 
     # POST: Add the menu item to the cart
     if request.method == 'POST':
         serialized_item = CartSerializer(data=request.data, context={'request': request})
         if serialized_item.is_valid():
-            serialized_item.save()
-            return Response(serialized_item.data, status=status.HTTP_201_CREATED)
+            with transaction.atomic():
+                lock_cart_summary(current_user.pk)
+                cart_item = serialized_item.save()
+                apply_cart_delta(current_user.pk, cart_item.quantity, cart_item.price)
+            return Response(serializer_data(serialized_item), status=status.HTTP_201_CREATED)
         return Response(serialized_item.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    # DELETE: Deletes all menu items created by the current user token
+    # DELETE: Deletes all menu items created by the current user token, or only ?menuitem=<id>
     if request.method == 'DELETE':
         cart_items = Cart.objects.filter(user=current_user)
-        cart_items.delete()
+        menuitem = request.query_params.get('menuitem')
+        if menuitem:
+            if not menuitem.isdigit():
+                return Response({"menuitem": ["A valid integer is required."]}, status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                lock_cart_summary(current_user.pk)
+                cart_items = cart_items.filter(menuitem_id=menuitem)
+                item_count, subtotal = cart_rows_totals(cart_items)
+                cart_items.delete()
+                apply_cart_delta(current_user.pk, -item_count, -subtotal)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            lock_cart_summary(current_user.pk)
+            cart_items.delete()
+            clear_cart_summary(current_user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+#endpoint: /api/cart/summary
+#item count and subtotal of the current user's cart, read from the maintained summary row (cart badge)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def cart_summary(request):
+    return Response(serializer_data(CartSummarySerializer(get_cart_summary(request.user))), status.HTTP_200_OK)
+
+
+#the user's cart as CartSerializer renders it, read in one query with the relations it shows (user,
+#menuitem and its category) as plain rows
+def cart_listing(user):
+    return serialize_cart(Cart.objects.filter(user=user).values(*CART_VALUES))
+
+
+def cart_summary_headers(user):
+    summary = get_cart_summary(user)
+    return {'X-Cart-Item-Count': str(summary.item_count), 'X-Cart-Subtotal': str(summary.subtotal)}
+
+
+#endpoint: /api/cart/menu-items/batch
+#customers add, update and remove several cart items in one request:
+#POST [{"menuitem": 1, "quantity": 2}, {"menuitem": 5, "quantity": 0}, ...]
+#sets the quantity of every listed item (0 removes it) and returns the whole cart.
+#The batch is validated with one menu item query and written with one upsert and one delete
+#inside a single transaction, so it either applies completely or not at all.
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def cart_batch(request):
+    current_user = request.user
+
+    # Ensure the user is not part of 'Manager' or 'Delivery crew' groups
+    if has_role(current_user, MANAGER, DELIVERY_CREW) or current_user.is_superuser:
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+
+    serialized_batch = CartBatchItemSerializer(data=request.data, many=True, allow_empty=False)
+    serialized_batch.is_valid(raise_exception=True)
+    entries = serialized_batch.validated_data
+
+    upserts = [
+        Cart(
+            user=current_user,
+            menuitem_id=entry['menuitem'],
+            quantity=entry['quantity'],
+            unit_price=entry['unit_price'],
+            price=entry['quantity'] * entry['unit_price'],
+        )
+        for entry in entries if entry['quantity']
+    ]
+    removals = [entry['menuitem'] for entry in entries if not entry['quantity']]
+
+    with transaction.atomic():
+        summary = lock_cart_summary(current_user.pk)
+        #the rows being replaced or removed are subtracted from the cart summary, the new ones added
+        old_count, old_subtotal = cart_rows_totals(
+            Cart.objects.filter(user=current_user, menuitem_id__in=[entry['menuitem'] for entry in entries]))
+        new_subtotal = sum((cart.price for cart in upserts), Decimal('0.00'))
+        #the batch alone fits (see CartBatchListSerializer), with the rest of the cart it may not
+        if summary.subtotal - old_subtotal + new_subtotal > CART_SUBTOTAL_MAX:
+            return Response({"message": f"The cart subtotal would exceed {CART_SUBTOTAL_MAX}."}, status.HTTP_400_BAD_REQUEST)
+        if upserts:
+            #Cart.save() is bypassed, so unit_price and price are derived above from the validated prices
+            Cart.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['menuitem', 'user'],
+                update_fields=['quantity', 'unit_price', 'price'],
+            )
+        if removals:
+            Cart.objects.filter(user=current_user, menuitem_id__in=removals).delete()
+        apply_cart_delta(
+            current_user.pk,
+            sum(cart.quantity for cart in upserts) - old_count,
+            new_subtotal - old_subtotal,
+        )
+
+    return Response(cart_listing(current_user), status.HTTP_200_OK, headers=cart_summary_headers(current_user))
+
+
 #end of cart-management
 
 #start of order
+
+#turns the user's cart into one Order plus its OrderItems with a fixed number of queries,
+#whatever the size of the cart: the cart rows are read once as plain values, under the lock of the
+#user's cart summary so concurrent cart writes and checkouts wait, and the total is summed from them (the
+#summary is only a cache); the order items are written with a single bulk insert and the
+#cart is cleared with a single delete. The daily sales rollups (rollups.py) are updated in the same
+#transaction from the rows already read. Returns None when the cart is empty.
+def checkout_cart(user):
+    with transaction.atomic():  #to ensure database operations for creating an order and clearing the cart happen atomically. If one fails, none of the changes inside the block will be committed to the database.
+        cart_items = Cart.objects.filter(user=user)
+        lock_cart_summary(user.pk)
+        items = list(cart_items.values('menuitem_id', 'quantity', 'unit_price', 'price', category_id=F('menuitem__category_id')))
+        if not items:
+            return None
+
+        order = Order.objects.create(user=user, total=sum((item['price'] for item in items), Decimal('0.00')))
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menuitem_id=item['menuitem_id'],
+                quantity=item['quantity'],
+                unit_price=item['unit_price'],
+                price=item['price'],
+            )
+            for item in items
+        ])
+        cart_items.delete()
+        clear_cart_summary(user.pk)
+        record_new_order(order, items)
+    return order
+
+#the orders `user` may list: all of them for managers, the assigned ones for delivery crew, their own for customers;
+#`orders` is the hot Order table unless given (the archive)
+def orders_for(user,orders=None):
+    #both users an order renders come from the same query: joined by select_related for instances,
+    #and by the ORDER_VALUES lookups when the listing reads rows
+    orders=(Order.objects if orders is None else orders).select_related('user','delivery_crew')
+    if is_manager(user):
+        return orders.all()
+    elif is_delivery_crew(user):
+        return orders.filter(delivery_crew=user)
+    return orders.filter(user=user)
+
 #endpoint: /api/orders
 #Customers can see,post all orders that are created by them
 #Managers can see all orders that are created by all users
@@ -280,41 +527,38 @@ def order_management(request):
     user=request.user
     # For GET requests
     if request.method=='GET':
-        if request.user.groups.filter(name='manager').exists():
-            orders=Order.objects.all()
-        elif request.user.groups.filter(name='delivery-crew').exists(): 
-            orders = Order.objects.filter(delivery_crew=user)
-        else:
-            orders = Order.objects.filter(user=user)
-
-        serializer=OrderSerializer(orders,many=True)
-        return Response(serializer.data,status=status.HTTP_200_OK) 
+        orders=orders_for(user)
+
+        #opt-in keyset pagination over (date, id) on the date index; ordering=-date gives newest first
+        if CURSOR_PARAM in request.query_params:
+            ordering=request.query_params.get('ordering')
+            if ordering not in (None,'date','-date'):
+                return Response({"message": "Cursor pagination only supports ordering by date or -date."}, status.HTTP_400_BAD_REQUEST)
+            perpage=parse_page_size(request.query_params.get('perpage',default=20))
+            orders,next_link=paginate_by_cursor(request,orders.values(*ORDER_VALUES),ordering or 'date',perpage)
+            return Response({'results':serialize_orders(orders),'next':next_link},status=status.HTTP_200_OK)
+
+        return Response(serialize_orders(orders.values(*ORDER_VALUES)),status=status.HTTP_200_OK) 
     
     #Customer POST
     elif request.method=='POST':
     # Ensure the user is not part of 'Manager' or 'Delivery crew' groups
-        if user.groups.filter(name__in=['manager', 'delivery-crew']).exists() or user.is_superuser:
+        if has_role(user, MANAGER, DELIVERY_CREW) or user.is_superuser:
             return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
-        cart_items = Cart.objects.filter(user=user)
-        if not cart_items.exists():
-            return Response({"message": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        with transaction.atomic():  #to ensure database operations for creating an order and clearing the cart happen atomically. If one fails, none of the changes inside the block will be committed to the database.
-            order = Order(user=user, total=sum([item.price for item in cart_items]))
-            order.save()
-
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    menuitem=item.menuitem,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price,
-                    price=item.price
-                )
-            cart_items.delete()
+        #clients retrying after a timeout send an Idempotency-Key; a repeated key replays the first response
+        return idempotent(request, lambda: place_order(user))
 
-        serialized_order = OrderSerializer(order)
-        return Response(serialized_order.data, status=status.HTTP_201_CREATED)
+#checks out the cart of `user` as the response of an order POST
+def place_order(user):
+    order = checkout_cart(user)
+    if order is None:
+        return Response({"message": "Your cart is empty."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serialized_order = OrderSerializer(order)
+    return Response(serializer_data(serialized_order), status=status.HTTP_201_CREATED)
+
+#how order_detail reads an order (see archive.get_order_or_archived)
+ORDER_DETAIL_QUERYSET=Order.objects.select_related('user','delivery_crew')
 
 #endpoint: /api/orders/{orderID}
 #Customers can see their orders,delivery crew and order status
@@ -325,54 +569,232 @@ def order_management(request):
 @permission_classes([IsAuthenticated])
 @throttle_classes([UserRateThrottle])
 def order_detail(request, orderId):
-    # Fetch the order
-    order = get_object_or_404(Order, pk=orderId)
+    # Fetch the order, archived orders included
+    order = get_order_or_archived(orderId)
 
     # Ensure the current user is the one making the request
     current_user = request.user
 
+    # Archived orders are read-only
+    if isinstance(order, ArchivedOrder) and request.method != 'GET':
+        return Response({"error": "Archived orders cannot be changed."}, status=status.HTTP_409_CONFLICT)
+
+    # GETs answer 304 if the client's copy is current (see conditional.py)
     if request.method=='GET' and order.user==current_user:
-        serializer=OrderSerializer(order)
-        return Response(serializer.data)
+        return conditional_get(request,order_validators(order),lambda: serializer_data(OrderSerializer(order)))
     
     # GET for managers to see the orders of users
-    elif request.method == 'GET' and current_user.groups.filter(name="manager").exists():
-            serializer = OrderSerializer(order)
-            return Response(serializer.data)
+    elif request.method == 'GET' and is_manager(current_user):
+            return conditional_get(request, order_validators(order), lambda: serializer_data(OrderSerializer(order)))
 
     # GET for Delivery Crew to see the orders assigned to them
-    elif request.method == 'GET' and current_user.groups.filter(name="delivery-crew").exists():
+    elif request.method == 'GET' and is_delivery_crew(current_user):
         if order.delivery_crew == current_user:
-            serializer = OrderSerializer(order)
-            return Response(serializer.data)
+            return conditional_get(request, order_validators(order), lambda: serializer_data(OrderSerializer(order)))
         else:
             return Response({"error": "This order is not assigned to you."}, status=status.HTTP_403_FORBIDDEN)
 
     # PUT and PATCH for Manager
-    elif request.method in ['PUT', 'PATCH'] and current_user.groups.filter(name="manager").exists():
+    elif request.method in ['PUT', 'PATCH'] and is_manager(current_user):
         serializer = OrderSerializer(order, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            # the daily rollups move with the order's date, total, status and crew
+            with transaction.atomic():
+                # If-Match is checked against the locked row, so concurrent managers cannot overwrite each other's changes
+                order = serializer.instance = for_update(request, ORDER_DETAIL_QUERYSET, order)
+                if not if_match(request, order_validators(order)):
+                    return precondition_failed_response(order_validators(order))
+                before = locked_order_state(order)
+                # the crew member losing the order is told as well (see signals.publish_order_event)
+                order._event_crew_id = before[3]
+                serializer.save()
+                record_order_change(before, order)
+            return Response(serializer_data(serializer), headers=validator_headers(order_validators(order)))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     # DELETE for Manager
-    elif request.method == 'DELETE' and current_user.groups.filter(name="manager").exists():
-        order.delete()
+    elif request.method == 'DELETE' and is_manager(current_user):
+        with transaction.atomic():
+            order = for_update(request, ORDER_DETAIL_QUERYSET, order)
+            if not if_match(request, order_validators(order)):
+                return precondition_failed_response(order_validators(order))
+            record_order_removal(order)
+            order.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     # PATCH for Delivery Crew
-    elif request.method == 'PATCH' and current_user.groups.filter(name="delivery-crew").exists():
+    elif request.method == 'PATCH' and is_delivery_crew(current_user):
         if "status" in request.data and request.data["status"] in [0, 1]:
-            order.status = request.data["status"]
-            order.save()
-            return Response(OrderSerializer(order).data)
+            with transaction.atomic():
+                order = for_update(request, ORDER_DETAIL_QUERYSET, order)
+                if not if_match(request, order_validators(order)):
+                    return precondition_failed_response(order_validators(order))
+                before = locked_order_state(order)
+                order.status = request.data["status"]
+                order.save()
+                record_order_change(before, order)
+            return Response(serializer_data(OrderSerializer(order)), headers=validator_headers(order_validators(order)))
         else:
             return Response({"error": "Invalid or missing order status."}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"error": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
 
 
+#endpoint: /api/orders/archive
+#archived orders (see archive.py) visible to the user, same roles as /api/orders, newest first by default
+#?from=<date or date-time>&to=<date or date-time> bounds the range (inclusive), keyset pagination over (date, id)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def order_archive(request):
+    ordering=request.query_params.get('ordering','-date')
+    if ordering not in ('date','-date'):
+        return Response({"ordering": ["Must be one of: date, -date."]}, status.HTTP_400_BAD_REQUEST)
+    perpage=parse_page_size(request.query_params.get('perpage',default=20))
+    orders=filter_date_range(orders_for(request.user,ArchivedOrder.objects),request.query_params)
+    orders,next_link=paginate_by_cursor(request,orders.values(*ORDER_VALUES),ordering,perpage)
+    return Response({'results':serialize_orders(orders),'next':next_link},status=status.HTTP_200_OK)
+
+
+#endpoint: /api/orders/export
+#managers only: every order with its items, streamed as NDJSON (default) or ?output=csv
+#?from=<date or date-time>&to=<date or date-time>&status=<0|1> filter the orders; the response is written
+#chunk by chunk while the orders are read (see export.py), so memory does not grow with the number of orders
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def order_export(request):
+    if not (is_manager(request.user) or request.user.is_superuser):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    output=request.query_params.get('output','ndjson')
+    if output not in CONTENT_TYPES:
+        return Response({"output": ["Must be one of: ndjson, csv."]}, status.HTTP_400_BAD_REQUEST)
+    orders=filter_export(Order.objects.all(),request.query_params)
+    chunks=export_csv(orders) if output=='csv' else export_ndjson(orders)
+    response=StreamingHttpResponse(streaming_content(request._request,chunks),content_type=CONTENT_TYPES[output])
+    response['Content-Disposition']=f'attachment; filename="orders.{output}"'
+    return response
+
+
+#endpoint: /api/orders/events
+#server-sent events of the user's order changes (see events.py), served by the ASGI application only:
+#a WSGI worker would be held for as long as the client stays connected
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def order_event_stream(request):
+    return Response({"message": "The order event stream is served by the ASGI application."}, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+#endpoint: /api/deliveries
+#delivery crew only: their open (undelivered) orders, oldest first, read from the (delivery_crew, status) index
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def my_deliveries(request):
+    if not is_delivery_crew(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    orders=open_deliveries(request.user).select_related('user','delivery_crew').order_by('date','id')
+    return Response(serialize_orders(orders.values(*ORDER_VALUES)),status=status.HTTP_200_OK)
+
+#endpoint: /api/deliveries/claim
+#delivery crew only: takes the oldest unassigned orders of the dispatch queue, {"count": n} of them (1 by default),
+#as long as the crew member stays within DISPATCH_MAX_OPEN_DELIVERIES open deliveries; returns the claimed orders
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def claim_deliveries(request):
+    if not is_delivery_crew(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    count=parse_page_size(request.data.get('count',1),'count')
+    ids=claim_orders(request.user,count)
+    orders=Order.objects.filter(id__in=ids).select_related('user','delivery_crew').order_by('date','id')
+    return Response(serialize_orders(orders.values(*ORDER_VALUES)),status=status.HTTP_200_OK)
+
+#endpoint: /api/dispatch
+#managers only: assigns queued orders to the least loaded delivery crew members, {"limit": n} at most
+#(everything that fits by default); returns the assignments
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def dispatch(request):
+    if not (is_manager(request.user) or request.user.is_superuser):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    limit=request.data.get('limit')
+    assignments=dispatch_orders(None if limit is None else parse_page_size(limit,'limit'))
+    return Response({
+        'assigned':sum(len(ids) for ids in assignments.values()),
+        'assignments':[{'delivery_crew':pk,'orders':ids} for pk,ids in assignments.items()],
+    },status=status.HTTP_200_OK)
+
+
 #end of order
 
 
+#start of reports
+#Sales reports for managers, read from the daily rollups maintained with every order write (see rollups.py),
+#so a report costs one query over O(days) rows whatever the number of orders.
+#Every report takes ?from=<date>&to=<date> (inclusive, both optional); days count from the order date.
+
+def can_see_reports(user):
+    return is_manager(user) or user.is_superuser
+
+#endpoint: /api/reports/revenue
+#the orders, items sold, revenue and deliveries of each day of the range, and their totals
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def report_revenue(request):
+    if not can_see_reports(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    days=list(DailySales.objects.filter(**parse_day_range(request.query_params)).order_by('day'))
+    totals={field:sum(getattr(day,field) for day in days) for field in ('orders','items','revenue','delivered')}
+    return Response({'totals':serializer_data(SalesTotalsSerializer(totals)),'days':serializer_data(DailySalesSerializer(days,many=True))})
+
+#endpoint: /api/reports/top-items
+#the best selling menu items of the range by quantity, ?limit= of them (10 by default)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def report_top_items(request):
+    if not can_see_reports(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    limit=parse_page_size(request.query_params.get('limit',default=10),'limit')
+    items=(DailyMenuItemSales.objects.filter(**parse_day_range(request.query_params))
+        .values('menuitem_id','menuitem__title')
+        .annotate(quantity=Sum('quantity'),revenue=Sum('revenue'))
+        .order_by('-quantity','-revenue','menuitem_id')[:limit])
+    return Response(serializer_data(TopItemSerializer(items,many=True)))
+
+#endpoint: /api/reports/category-mix
+#quantity and revenue of every category over the range, with its share of the revenue in percent
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def report_category_mix(request):
+    if not can_see_reports(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    categories=list(DailyCategorySales.objects.filter(**parse_day_range(request.query_params))
+        .values('category_id','category__slug','category__title')
+        .annotate(quantity=Sum('quantity'),revenue=Sum('revenue'))
+        .order_by('-revenue','category_id'))
+    revenue=sum(category['revenue'] for category in categories)
+    for category in categories:
+        category['share']=(category['revenue']*100/revenue if revenue else Decimal(0)).quantize(Decimal('0.01'))
+    return Response(serializer_data(CategoryMixSerializer(categories,many=True)))
+
+#endpoint: /api/reports/crew-throughput
+#orders assigned to and delivered by every delivery crew member over the range
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([UserRateThrottle])
+def report_crew_throughput(request):
+    if not can_see_reports(request.user):
+        return Response({"message": "You are not authorized."}, status.HTTP_403_FORBIDDEN)
+    crew=(DailyCrewSales.objects.filter(**parse_day_range(request.query_params))
+        .values('delivery_crew_id','delivery_crew__username')
+        .annotate(orders=Sum('orders'),delivered=Sum('delivered'))
+        .order_by('-delivered','-orders','delivery_crew_id'))
+    return Response(serializer_data(CrewThroughputSerializer(crew,many=True)))
+
+#end of reports
@@ -0,0 +1,16 @@
+"""
+URL configuration used for requests served through Restaurant/asgi.py.
+
+Same routes as Restaurant/urls.py; the LittlelemonAPI routes come from LittlelemonAPI.async_urls,
+which serves the read-heavy endpoints with async views.
+"""
+from django.contrib import admin
+from django.urls import path,include
+
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('api/',include('LittlelemonAPI.async_urls')),
+    path('api/',include('djoser.urls')),          #users registration
+    path('api/',include('djoser.urls.authtoken')),  #users token generation
+]
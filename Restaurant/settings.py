@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittlelemonAPI.profiling.ProfilingMiddleware',
+    'LittlelemonAPI.async_views.asgi_urlconf_middleware',
+    'LittlelemonAPI.compression.compression_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +61,10 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'Restaurant.urls'
 
+# URLconf of requests served through ASGI (Restaurant/asgi.py): the read-heavy endpoints get async
+# views there. Set to None to serve ASGI requests with ROOT_URLCONF as well.
+ASGI_URLCONF = 'Restaurant.asgi_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -77,14 +87,132 @@ WSGI_APPLICATION = 'Restaurant.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# LITTLELEMON_DB selects the database profile: 'sqlite' (default) or 'postgres'.
+
+DATABASE_PROFILE = os.environ.get('LITTLELEMON_DB', 'sqlite')
+
+# The development database committed to the repository. It keeps SQLite's rollback journal: switching it
+# to WAL rewrites its header, a change git would report after every command. Set LITTLELEMON_SQLITE_PATH
+# to a database file of your own to run with WAL.
+TRACKED_SQLITE_DATABASE = BASE_DIR / 'db.sqlite3'
+
+if DATABASE_PROFILE == 'postgres':
+    # Requires the psycopg driver. Connections are kept open between requests for CONN_MAX_AGE
+    # seconds; set LITTLELEMON_DB_POOL_SIZE to use Django's psycopg connection pool instead
+    # (Django 5.1+, needs psycopg[pool]).
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('LITTLELEMON_DB_NAME', 'littlelemon'),
+            'USER': os.environ.get('LITTLELEMON_DB_USER', 'littlelemon'),
+            'PASSWORD': os.environ.get('LITTLELEMON_DB_PASSWORD', ''),
+            'HOST': os.environ.get('LITTLELEMON_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('LITTLELEMON_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('LITTLELEMON_DB_POOL_SIZE'):
+        # a pool replaces persistent connections, Django refuses to combine them
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': 2,
+                'max_size': int(os.environ['LITTLELEMON_DB_POOL_SIZE']),
+                'timeout': 10,
+            }
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('LITTLELEMON_SQLITE_PATH') or TRACKED_SQLITE_DATABASE,
+            'OPTIONS': {
+                # seconds a connection waits on a locked database before "database is locked"
+                'timeout': 20,
+            },
+        }
     }
+    if django.VERSION >= (5, 1):
+        # take the write lock when the transaction starts; a deferred transaction that reads the
+        # cart and then writes the order fails at once instead of waiting for the busy timeout
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Applied to every new SQLite connection (see LittlelemonAPI/signals.py), journal_mode except on
+# TRACKED_SQLITE_DATABASE. WAL lets readers run alongside the single writer, and synchronous=NORMAL is
+# durable across application crashes in WAL mode.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local-memory by default, which only suits a single worker process: the menu version (see
+# LittlelemonAPI/menu_cache.py) is then per process, and a menu change only reaches the other workers when
+# their cached menu expires. Set LITTLELEMON_CACHE_DIR to use a file-based cache that is shared by every
+# worker process on the host.
+
+if os.environ.get('LITTLELEMON_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['LITTLELEMON_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached menu_items page and the menu snapshot are kept; menu changes invalidate them earlier.
+# With the local-memory cache a change only invalidates them in the worker that made it, so the others
+# serve the old menu (and ETag) for up to this long: it is kept short there
+MENU_CACHE_TIMEOUT = 60 * 60 if os.environ.get('LITTLELEMON_CACHE_DIR') else 30
+
+
+# Orders older than this many days are moved to the archive tables by `manage.py archive_orders`
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+# Seconds the response of a request sent with an Idempotency-Key is replayed for
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Open (undelivered) orders a delivery crew member can hold; dispatch and claims stop at this many
+DISPATCH_MAX_OPEN_DELIVERIES = 5
+
+
+# SQLite file holding the throttle state shared by the worker processes of this host
+# (see LittlelemonAPI/throttling.py); defaults to littlelemon-throttle.sqlite3 in the temp directory
+THROTTLE_STORE_PATH = os.environ.get('LITTLELEMON_THROTTLE_STORE')
+
+# How order events (the /api/orders/events stream, see LittlelemonAPI/events.py) reach the worker
+# processes: LocalEventBackend, the default, keeps them in the process that published them, which is
+# enough for a single ASGI worker. With several ASGI workers set LITTLELEMON_EVENTS_BACKEND to
+# LittlelemonAPI.events.SQLiteEventBackend, which shares them between the processes of this host through
+# ORDER_EVENTS_STORE_PATH (littlelemon-events.sqlite3 in the temp directory by default). Deployments
+# without ASGI workers set LITTLELEMON_EVENTS_BACKEND to an empty value: no events are published then
+ORDER_EVENTS_BACKEND = os.environ.get('LITTLELEMON_EVENTS_BACKEND', 'LittlelemonAPI.events.LocalEventBackend') or None
+ORDER_EVENTS_STORE_PATH = os.environ.get('LITTLELEMON_EVENTS_STORE')
+
+
+# Token lookups kept in each worker's in-process LRU (entries, seconds)
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 60
+
+
+# Fraction of requests profiled per view by ProfilingMiddleware (0 turns it off) and the
+# number of records kept in each process's ring buffer, see /api/profiling
+PROFILING_SAMPLE_RATE = float(os.environ.get('LITTLELEMON_PROFILING_SAMPLE_RATE', 0))
+PROFILING_BUFFER_SIZE = 1000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -127,9 +255,20 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Responses of at least this many bytes are gzip (or, with the optional brotli package, brotli) compressed
+# when the client accepts it (see LittlelemonAPI/compression.py and "Optional speedups" in README.md)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+
 REST_FRAMEWORK={
+    #orjson when the optional package is installed (see README.md), the same bytes as DRF's JSONRenderer
+    #(see LittlelemonAPI/renderers.py)
+    'DEFAULT_RENDERER_CLASSES':(
+        'LittlelemonAPI.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES':(
-        'rest_framework.authentication.TokenAuthentication',
+        'LittlelemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_THROTTLE_RATES':{